@@ -0,0 +1,156 @@
+"""
+Connection pool for the dashboard
+
+Same idea as db_manager.DatabasePool in the scraper, but built for gunicorn:
+  - one pool per worker process, created lazily after the fork
+  - connections idle for longer than DB_POOL_HEALTHCHECK_IDLE seconds are
+    checked with SELECT 1 before being handed out
+  - connections older than DB_POOL_MAX_LIFETIME seconds are closed and replaced
+  - the connection is always returned to the pool (rolled back first), even
+    when the request raises
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+# Load environment variables from a .env file
+load_dotenv()
+
+POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.getenv('DB_POOL_MAX', '5'))
+MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))
+HEALTHCHECK_IDLE = float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', '30'))
+CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '10'))
+
+
+class DashboardPool:
+    def __init__(self, dsn, minconn=POOL_MIN, maxconn=POOL_MAX,
+                 max_lifetime=MAX_LIFETIME, healthcheck_idle=HEALTHCHECK_IDLE):
+        self._pool = ThreadedConnectionPool(minconn=minconn, maxconn=maxconn, dsn=dsn)
+        # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+        self._slots = BoundedSemaphore(maxconn)
+        self._lock = Lock()
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.healthcheck_idle = healthcheck_idle
+
+        self._created_at = {}   # id(conn) -> when it was opened
+        self._last_used = {}    # id(conn) -> when it was last returned
+        self._counters = {
+            "checkouts": 0,
+            "in_use": 0,
+            "recycled": 0,
+            "failed_health_checks": 0,
+            "checkout_timeouts": 0,
+            "wait_seconds": 0.0
+        }
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created_at.pop(id(conn), None)
+            self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _healthy(self, conn):
+        """SELECT 1 on a connection that has been idle for a while."""
+        if conn.closed:
+            return False
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0)
+        if idle_for < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._lock:
+                self._counters["failed_health_checks"] += 1
+            return False
+
+    def _checkout(self):
+        # A broken or expired connection is replaced; bounded so a dead database fails fast
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            now = time.monotonic()
+            with self._lock:
+                created_at = self._created_at.setdefault(id(conn), now)
+            if now - created_at > self.max_lifetime:
+                with self._lock:
+                    self._counters["recycled"] += 1
+                self._discard(conn)
+                continue
+            if not self._healthy(conn):
+                self._discard(conn)
+                continue
+            return conn
+        raise psycopg2.OperationalError("Could not get a healthy connection from the pool")
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block."""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=CHECKOUT_TIMEOUT):
+            with self._lock:
+                self._counters["checkout_timeouts"] += 1
+            raise psycopg2.OperationalError("Timed out waiting for a database connection")
+
+        conn = None
+        try:
+            conn = self._checkout()
+            with self._lock:
+                self._counters["checkouts"] += 1
+                self._counters["in_use"] += 1
+                self._counters["wait_seconds"] += time.monotonic() - start
+            yield conn
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._counters["in_use"] -= 1
+                try:
+                    # Dashboard queries are read-only; end the transaction so nothing sits idle in it
+                    conn.rollback()
+                    with self._lock:
+                        self._last_used[id(conn)] = time.monotonic()
+                    self._pool.putconn(conn)
+                except psycopg2.Error:
+                    self._discard(conn)
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["open_connections"] = len(self._created_at)
+        stats["max_connections"] = self.maxconn
+        stats["pid"] = os.getpid()
+        return stats
+
+    def close_all(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = Lock()
+
+
+def get_pool():
+    """The current worker's pool; a forked worker never reuses its parent's sockets."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = DashboardPool(os.getenv('DATABASE_URL'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@contextmanager
+def get_connection():
+    with get_pool().connection() as conn:
+        yield conn
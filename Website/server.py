@@ -1,15 +1,20 @@
-from flask import Flask, render_template, request, Response
-import psycopg2
+from flask import Flask, render_template, request, Response, jsonify
 import os
+import base64
+import csv
 import datetime
+import io
+import json
+import zlib
 from dotenv import load_dotenv
 import pytz
 
+from db import get_connection, get_pool
+
 app = Flask(__name__)
 
 # Load environment variables from a .env file
 load_dotenv()
-CONN_STR = os.getenv('DATABASE_URL')
 USER = os.getenv('USERNAME')
 PW = os.getenv('PASSWORD')
 
@@ -33,27 +38,92 @@ def requires_auth(f):
     return decorated
 
 
-# Get all data from the table
-def get_data():
-    # Connect to your database using the connection string.
-    conn = psycopg2.connect(CONN_STR)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM DailyVideoData;")
-    rows = cursor.fetchall()
-    headers = [desc[0] for desc in cursor.description]
-    cursor.close()
-    conn.close()
-    return headers, rows
+# Columns the /api/videos endpoint can return
+VIDEO_COLUMNS = ['id', 'post_url', 'creator_username', 'marketing_associate', 'app', 'view_count',
+                 'comment_count', 'caption', 'create_time', 'log_time', 'num_likes']
+
+# Sortable columns -> SQL sort expression. Nullable columns are COALESCEd so keyset comparisons never see NULL.
+# Each (expression, id) pair has a matching VideoSnapshots index (db_manager migrations 13 and 15), so a
+# page is an index range read; create_time lives on Posts and can't share an index with the snapshot id.
+SORT_EXPRESSIONS = {
+    'id': "id",
+    'log_time': "log_time",
+    'view_count': "COALESCE(view_count, -1)",
+    'comment_count': "COALESCE(comment_count, -1)",
+    'num_likes': "COALESCE(num_likes, -1)",
+}
+TIMESTAMP_SORTS = ['log_time']
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime.datetime):
+        sort_value = sort_value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode()).decode()
 
 
+def decode_cursor(cursor, sort):
+    """Returns (sort value, row id); raises ValueError unless both have the sort column's type."""
+    sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if sort in TIMESTAMP_SORTS:
+        if not isinstance(sort_value, str):
+            raise ValueError("cursor sort value must be a timestamp")
+        sort_value = datetime.datetime.fromisoformat(sort_value)
+    elif type(sort_value) is not int:
+        raise ValueError("cursor sort value must be an integer")
+    if type(row_id) is not int:
+        raise ValueError("cursor id must be an integer")
+    return sort_value, row_id
+
+
+def get_video_page(fields, sort, descending, limit, cursor=None):
+    """
+    One keyset-paginated page of DailyVideoData.
+    Returns (rows as dicts, next cursor or None).
+    """
+    sort_expression = SORT_EXPRESSIONS[sort]
+    direction = "DESC" if descending else "ASC"
+    comparison = "<" if descending else ">"
+
+    # id and the sort key are always selected so the next cursor can be built
+    select_list = ", ".join(fields)
+    query = f"SELECT {select_list}, {sort_expression} AS sort_key, id AS row_id FROM DailyVideoData"
+    params = []
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort)
+        query += f" WHERE ({sort_expression}, id) {comparison} (%s, %s)"
+        params += [sort_value, row_id]
+    query += f" ORDER BY {sort_expression} {direction}, id {direction} LIMIT %s;"
+    params.append(limit + 1)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+
+    page = []
+    for row in rows:
+        record = {}
+        for field, value in zip(fields, row):
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()
+            record[field] = value
+        page.append(record)
+    return page, next_cursor
 
 
 # GET
 @app.route('/')
 @requires_auth
 def index():
-    headers, rows = get_data()
-    return render_template('index.html', headers=headers, rows=rows)
+    return render_template('index.html')
 
 @app.route('/trial_upticks')
 @requires_auth
@@ -63,18 +133,16 @@ def trial_upticks():
     Each row is clickable and links to the detailed video metrics for that event.
     """
     try:
-        conn = psycopg2.connect(CONN_STR)
-        cursor = conn.cursor()
-        # Select id, event_time, current_delta, and app (adjust columns as needed)
-        query = """
-            SELECT id, event_time, current_delta, app
-            FROM TrialTriggerEvents
-            ORDER BY event_time DESC;
-        """
-        cursor.execute(query)
-        events = cursor.fetchall()  # Each event is a tuple: (id, event_time, current_delta, app)
-        cursor.close()
-        conn.close()
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Select id, event_time, current_delta, and app (adjust columns as needed)
+                query = """
+                    SELECT id, event_time, current_delta, app
+                    FROM TrialTriggerEvents
+                    ORDER BY event_time DESC;
+                """
+                cursor.execute(query)
+                events = cursor.fetchall()  # Each event is a tuple: (id, event_time, current_delta, app)
     except Exception as e:
         print(f"Error fetching trial trigger events: {str(e)}")
         events = []
@@ -86,23 +154,21 @@ def trial_upticks():
 def video_metrics(event_id):
     """
     Query the VideoMetricDeltas table for the given trial trigger event ID,
-    sort the results by the sum of the absolute changes in views, comments, and likes (largest first),
-    and display the associated video metric delta rows.
+    largest net change (views + comments + likes) first, and display the rows.
+    The order comes from the (trial_trigger_event_id, net_delta DESC, id) index.
     """
     try:
-        conn = psycopg2.connect(CONN_STR)
-        cursor = conn.cursor()
-        query = """
-            SELECT *
-            FROM VideoMetricDeltas
-            WHERE trial_trigger_event_id = %s
-            ORDER BY id ASC;
-        """
-        cursor.execute(query, (event_id,))
-        rows = cursor.fetchall()
-        headers = [desc[0] for desc in cursor.description]
-        cursor.close()
-        conn.close()
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                query = """
+                    SELECT *
+                    FROM VideoMetricDeltas
+                    WHERE trial_trigger_event_id = %s
+                    ORDER BY net_delta DESC, id ASC;
+                """
+                cursor.execute(query, (event_id,))
+                rows = cursor.fetchall()
+                headers = [desc[0] for desc in cursor.description]
     except Exception as e:
         print(f"Error fetching video metric deltas for event {event_id}: {str(e)}")
         rows = []
@@ -111,13 +177,7 @@ def video_metrics(event_id):
     # Convert rows to a list of dictionaries.
     video_metrics = [dict(zip(headers, row)) for row in rows]
 
-    # sort by delta (pos and neg accounted for) descending
-    def total_net_delta(metric):
-        return (metric.get('delta_views') or 0) + (metric.get('delta_comments') or 0) + (metric.get('delta_likes') or 0)
-
-    video_metrics_sorted = sorted(video_metrics, key=total_net_delta, reverse=True)
-
-    return render_template('video_metrics.html', event_id=event_id, video_metrics=video_metrics_sorted)
+    return render_template('video_metrics.html', event_id=event_id, video_metrics=video_metrics)
 
 
 @app.route('/search', methods=['GET'])
@@ -125,137 +185,509 @@ def video_metrics(event_id):
 def search():
     category = request.args.get('category')
     value = request.args.get('value')
-    headers, rows = None, None
+    latest = request.args.get('latest') == '1'
+    match = request.args.get('match', 'exact')
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    headers, rows, has_next, error = None, None, False, None
     if category and value:
-        headers, rows = search_data(category, value)
-    return render_template('search.html', headers=headers, rows=rows, category=category, value=value)
+        if match == 'exact':
+            result = search_data(category, value, latest, page)
+            if result is None:
+                # An unparseable date, or a category (caption) only the text searches support
+                error = "Dates must be m/d/Y or Y-m-d" if category in DATE_COLUMNS else TEXT_SEARCH_HELP
+        else:
+            result = search_text(category, value, match, page)
+            if result is None:
+                error = TEXT_SEARCH_HELP
+        if result is not None:
+            headers, rows, has_next = result
+    return render_template(
+        'search.html', headers=headers, rows=rows, category=category, value=value, latest=latest,
+        match=match, page=page, has_next=has_next, error=error
+    )
 
 @app.route('/trials', methods=['GET'])
 @requires_auth
 def trials():
     app_name = request.args.get('trial_option')
+    # Optional date range; unparseable dates are ignored
+    start_date = parse_date(request.args.get('start_date') or '')
+    end_date = parse_date(request.args.get('end_date') or '')
     results = None
     if app_name:
-        results = search_trials(app_name)
+        results = search_trials(app_name, start_date, end_date)
 
-    return render_template('trials.html', data=results, trial_option=app_name)
+    return render_template('trials.html', data=results, trial_option=app_name,
+                           start_date=start_date, end_date=end_date)
 
 @app.route('/other')
 @requires_auth
 def other():
-    headers, rows = get_data()
-    return render_template('other.html', headers=headers, rows=rows)
+    # The table is filled page by page from /api/videos
+    return render_template('other.html', columns=VIDEO_COLUMNS, sortable=list(SORT_EXPRESSIONS))
+
+@app.route('/api/videos')
+@requires_auth
+def api_videos():
+    """
+    Keyset-paginated DailyVideoData.
+    Query params: fields (comma separated), sort, order (asc|desc), limit, cursor (from next_cursor)
+    """
+    fields = [f for f in request.args.get('fields', ','.join(VIDEO_COLUMNS)).split(',') if f]
+    sort = request.args.get('sort', 'id')
+    order = request.args.get('order', 'desc').lower()
+    cursor = request.args.get('cursor')
+
+    if not fields or any(f not in VIDEO_COLUMNS for f in fields):
+        return jsonify(error=f"fields must be a subset of {VIDEO_COLUMNS}"), 400
+    if sort not in SORT_EXPRESSIONS:
+        return jsonify(error=f"sort must be one of {list(SORT_EXPRESSIONS)}"), 400
+    if order not in ('asc', 'desc'):
+        return jsonify(error="order must be asc or desc"), 400
+    try:
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE_DEFAULT)), 1), PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify(error="limit must be an integer"), 400
+
+    try:
+        rows, next_cursor = get_video_page(fields, sort, order == 'desc', limit, cursor)
+    except (ValueError, TypeError):
+        return jsonify(error="invalid cursor"), 400
+
+    return jsonify(rows=rows, next_cursor=next_cursor)
 
 @app.route('/graph', methods=['GET', 'POST'])
 @requires_auth
 def graph():
     if request.method == 'POST':
-        url = request.form.get('url')
-        headers, rows = search_data('post_url', url)
-        
-        # Determine column indices.
-        try:
-            date_index = headers.index("log_time")
-            views_index = headers.index("view_count")
-            likes_index = headers.index("num_likes")
-            comments_index = headers.index("comment_count")
-        except ValueError:
-            return render_template('graph.html', error="Required columns not found", data=None, url=url)
-        
-        time_series = []
-        for row in rows:
-            date_val = row[date_index]
-            if isinstance(date_val, datetime.datetime):
-                dt = date_val
-            else:
-                try:
-                    dt = datetime.datetime.strptime(date_val, "%Y-%m-%d")
-                except ValueError:
-                    continue  # Skip rows with bad date formats.
-            try:
-                views = float(row[views_index])
-            except (ValueError, TypeError):
-                views = 0
-            try:
-                likes = float(row[likes_index])
-            except (ValueError, TypeError):
-                likes = 0
-            try:
-                comments = float(row[comments_index])
-            except (ValueError, TypeError):
-                comments = 0
-            
-            time_series.append({
-                'date': dt.strftime("%m/%d/%Y"),
-                'views': views,
-                'likes': likes,
-                'comments': comments
-            })
-        
-        time_series.sort(key=lambda x: datetime.datetime.strptime(x['date'], "%m/%d/%Y"))
-        
-        return render_template('graph.html', data=time_series, url=url)
+        url = request.form.get('url') or ''
+        resolution = request.form.get('resolution', 'day')
+        metric = request.form.get('metric', 'views')
+        if resolution not in GRAPH_RESOLUTIONS or metric not in GRAPH_METRICS:
+            return render_template('graph.html', error="Invalid resolution or metric", data=None, url=url)
+
+        # One or more URLs, separated by whitespace or commas, overlaid on one chart
+        urls = list(dict.fromkeys(u for u in url.replace(',', ' ').split() if u))
+        if not urls:
+            return render_template('graph.html', error="Enter at least one URL", data=None, url=url)
+        series = get_time_series(urls, resolution)
+
+        # Shared x axis: every bucket any URL has a point in
+        label_format = "%m/%d/%Y %H:00" if resolution == 'hour' else "%m/%d/%Y"
+        buckets = sorted({point['bucket'] for points in series.values() for point in points})
+        labels = [bucket.strftime(label_format) for bucket in buckets]
+        positions = {bucket: i for i, bucket in enumerate(buckets)}
+
+        datasets = []
+        for post_url in urls:
+            points = series.get(post_url, [])
+            if not points:
+                continue
+            # A single URL shows all three counters; several URLs overlay the chosen metric
+            metrics = ['views', 'likes', 'comments'] if len(urls) == 1 else [metric]
+            for name in metrics:
+                values = [None] * len(labels)
+                for point in points:
+                    values[positions[point['bucket']]] = point[name]
+                datasets.append({'label': f"{name} - {post_url}" if len(urls) > 1 else name, 'data': values})
+
+        data = {'labels': labels, 'datasets': datasets} if datasets else None
+        return render_template('graph.html', data=data, url=url, resolution=resolution, metric=metric)
     else:
-        return render_template('graph.html')
+        return render_template('graph.html', resolution='day', metric='views')
 
 
+GRAPH_RESOLUTIONS = ['hour', 'day', 'week']
+GRAPH_METRICS = ['views', 'likes', 'comments', 'views_delta', 'likes_delta', 'comments_delta']
 
-# Search for rows that match a specific value
-def search_data(category, value):
-    # Allowed columns to search on.
-    allowed_columns = ['post_url', 'creator_username', 'marketing_associate', 'app', 'create_time', 'log_time']
-    if category not in allowed_columns:
-        return None, None
 
-    conn = psycopg2.connect(CONN_STR)
-    cursor = conn.cursor()
+def get_time_series(urls, resolution):
+    """
+    One point per URL per hour/day/week: the last snapshot in that bucket,
+    plus the change since the previous bucket. Aggregated in SQL off the
+    (post_url, log_time) index so only the few needed columns come back.
+    Returns {post_url: [point, ...]} ordered by bucket.
+    """
+    query = """
+    WITH last_in_bucket AS (
+        SELECT DISTINCT ON (post_url, date_trunc(%(resolution)s, log_time))
+            post_url,
+            date_trunc(%(resolution)s, log_time) AS bucket,
+            COALESCE(view_count, 0) AS views,
+            COALESCE(num_likes, 0) AS likes,
+            COALESCE(comment_count, 0) AS comments
+        FROM DailyVideoHistory
+        WHERE post_url = ANY(%(urls)s) AND log_time IS NOT NULL
+        ORDER BY post_url, date_trunc(%(resolution)s, log_time), log_time DESC
+    )
+    SELECT post_url, bucket, views, likes, comments,
+           views - LAG(views) OVER w,
+           likes - LAG(likes) OVER w,
+           comments - LAG(comments) OVER w
+    FROM last_in_bucket
+    WINDOW w AS (PARTITION BY post_url ORDER BY bucket)
+    ORDER BY post_url, bucket;
+    """
 
-    # For date columns, convert user input and adjust the query.
-    if category in ['create_time', 'log_time']:
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, {'resolution': resolution, 'urls': urls})
+            rows = cursor.fetchall()
+
+    series = {}
+    for post_url, bucket, views, likes, comments, views_delta, likes_delta, comments_delta in rows:
+        series.setdefault(post_url, []).append({
+            'bucket': bucket,
+            'views': views,
+            'likes': likes,
+            'comments': comments,
+            'views_delta': views_delta,
+            'likes_delta': likes_delta,
+            'comments_delta': comments_delta
+        })
+    return series
+
+
+# Columns search_data / export can filter on
+SEARCH_COLUMNS = ['post_url', 'creator_username', 'marketing_associate', 'app', 'create_time', 'log_time']
+DATE_COLUMNS = ['create_time', 'log_time']
+# LatestVideoMetrics has one row per post and associate; its log_time is the last time the post was logged
+LATEST_COLUMNS = {'log_time': 'last_seen_at'}
+LATEST_RESULT_COLUMNS = (
+    "post_url, creator_username, marketing_associate, app, caption, create_time, view_count, comment_count, "
+    "num_likes, delta_views, delta_comments, delta_likes, first_seen_at, last_seen_at"
+)
+
+# Substring / fuzzy / full-text search over LatestVideoMetrics, backed by the
+# pg_trgm and tsvector indexes from db_manager's migrations
+TEXT_SEARCH_COLUMNS = ['caption', 'creator_username']
+TEXT_MATCH_MODES = ['contains', 'fuzzy', 'fulltext']
+TEXT_SEARCH_HELP = "contains / fuzzy search caption or creator username; fulltext searches captions"
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '500'))
+
+
+def parse_date(value):
+    """Parse a user supplied date ("m/d/Y" or "Y-m-d"); returns None if it's neither."""
+    for fmt in ("%m/%d/%Y", "%Y-%m-%d"):
         try:
-            # Convert user input from "m/d/Y" format to a datetime object.
-            dt = datetime.datetime.strptime(value, "%m/%d/%Y")
+            return datetime.datetime.strptime(value, fmt).date()
         except ValueError:
-            # If the conversion fails, return no results.
-            return None, None
+            continue
+    return None
+
 
-        # Format the date as YYYY-MM-DD.
-        formatted_value = dt.strftime("%Y-%m-%d")
+def build_search_filter(category, value, latest=False):
+    """
+    Returns (where clause, params) for a category/value search,
+    or None if the category isn't searchable or a date value doesn't parse.
+    latest: filter LatestVideoMetrics instead of DailyVideoHistory
+    """
+    if category not in SEARCH_COLUMNS:
+        return None
+    column = LATEST_COLUMNS.get(category, category) if latest else category
+
+    # For date columns, convert user input and adjust the query.
+    if category in DATE_COLUMNS:
+        day = parse_date(value)
+        if day is None:
+            return None
         # Use the DATE() function to extract the date part from the timestamp.
-        query = f"SELECT * FROM DailyVideoData WHERE DATE({category}) = %s;"
-        cursor.execute(query, (formatted_value,))
+        return f"DATE({column}) = %s", [day.isoformat()]
+
+    # For non-date columns, use a simple equality check.
+    return f"{column} = %s", [value]
+
+
+def fetch_search_page(query, params, page):
+    """
+    One page of a search query (ordered, without LIMIT): SEARCH_PAGE_SIZE rows a page
+    and at most SEARCH_MAX_RESULTS rows over all pages.
+    Returns (headers, rows, has_next page).
+    """
+    offset = (page - 1) * SEARCH_PAGE_SIZE
+    limit = min(SEARCH_PAGE_SIZE, SEARCH_MAX_RESULTS - offset)
+    if limit <= 0:
+        return [], [], False
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            # One extra row tells whether there's a next page
+            cursor.execute(f"{query} LIMIT %s OFFSET %s;", params + [limit + 1, offset])
+            rows = cursor.fetchall()
+            headers = [desc[0] for desc in cursor.description]
+
+    has_next = len(rows) > limit and offset + limit < SEARCH_MAX_RESULTS
+    return headers, rows[:limit], has_next
+
+
+# Search for rows that match a specific value, most recently logged first
+# Reads DailyVideoHistory: raw snapshots plus the rolled-up history of dropped partitions,
+# or with latest, LatestVideoMetrics: one row per post and associate with its current counts and last change
+def search_data(category, value, latest=False, page=1):
+    """Returns (headers, rows, has_next page) or None for an unsupported search."""
+    search_filter = build_search_filter(category, value, latest)
+    if search_filter is None:
+        return None
+    clause, params = search_filter
+    if latest:
+        query = (f"SELECT {LATEST_RESULT_COLUMNS} FROM LatestVideoMetrics WHERE {clause} "
+                 "ORDER BY last_seen_at DESC, post_key, marketing_associate")
     else:
-        # For non-date columns, use a simple equality check.
-        query = f"SELECT * FROM DailyVideoData WHERE {category} = %s;"
-        cursor.execute(query, (value,))
+        query = (f"SELECT * FROM DailyVideoHistory WHERE {clause} "
+                 "ORDER BY log_time DESC, post_url, marketing_associate, id")
+    return fetch_search_page(query, params, page)
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_text_search(category, value, match):
+    """
+    Returns (where clause, rank expression, params) for a text search,
+    or None if the category / match mode combination isn't supported.
+    params are in query order: the rank expression's, then the where clause's.
+    """
+    if category not in TEXT_SEARCH_COLUMNS or match not in TEXT_MATCH_MODES:
+        return None
+
+    if match == 'fulltext':
+        if category != 'caption':
+            return None
+        query = "websearch_to_tsquery('english', %s)"
+        return f"caption_tsv @@ {query}", f"ts_rank_cd(caption_tsv, {query})", [value, value]
+
+    if match == 'contains':
+        return f"{category} ILIKE %s", f"similarity({category}, %s)", [value, f"%{escape_like(value)}%"]
+
+    # fuzzy: trigram similarity above pg_trgm's thresholds; captions match on their most similar words
+    if category == 'caption':
+        return "%s <%% caption", "word_similarity(%s, caption)", [value, value]
+    return "creator_username %% %s", "similarity(creator_username, %s)", [value, value]
+
+
+# Ranked text search, one row per post and associate, SEARCH_PAGE_SIZE rows a page and
+# at most SEARCH_MAX_RESULTS rows over all pages
+def search_text(category, value, match, page=1):
+    """Returns (headers, rows, has_next page) or None for an unsupported search."""
+    text_search = build_text_search(category, value, match)
+    if text_search is None:
+        return None
+    clause, rank, params = text_search
+
+    query = f"""
+        SELECT {LATEST_RESULT_COLUMNS}, ROUND({rank}::NUMERIC, 3) AS rank
+        FROM LatestVideoMetrics
+        WHERE {clause}
+        ORDER BY rank DESC, last_seen_at DESC, post_key, marketing_associate
+    """
+    return fetch_search_page(query, params, page)
+
 
-    rows = cursor.fetchall()
-    headers = [desc[0] for desc in cursor.description]
-    cursor.close()
-    conn.close()
-    return headers, rows
+EXPORT_BATCH_SIZE = 2000
 
 
-# Search for trials. Eventually we will pass in a date range, and we want to return the num trials for each day in that range
+def stream_export(query, params, export_format):
+    """
+    Yield the query's rows as CSV or NDJSON text, EXPORT_BATCH_SIZE rows at a time,
+    from a server-side (named) cursor so memory stays flat however many rows match.
+    The pooled connection is held until the client finishes or disconnects.
+    """
+    with get_connection() as conn:
+        with conn.cursor(name='dailyvideodata_export') as cursor:
+            cursor.itersize = EXPORT_BATCH_SIZE
+            cursor.execute(query, params)
+            headers = None
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if headers is None:
+                    headers = [desc[0] for desc in cursor.description]
+                    if export_format == 'csv':
+                        yield _csv_lines([headers])
+                if not rows:
+                    break
+                if export_format == 'csv':
+                    yield _csv_lines(rows)
+                else:
+                    yield "".join(
+                        json.dumps(dict(zip(headers, row)), default=_json_default) + "\n"
+                        for row in rows
+                    )
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def gzip_stream(chunks):
+    """Gzip a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31)  # 31 -> gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@app.route('/export', methods=['GET'])
+@requires_auth
+def export():
+    """
+    Stream DailyVideoHistory as CSV or NDJSON.
+    Query params: category + value (same as /search), start / end (log_time date range, inclusive),
+    format (csv|ndjson), gzip (1 to compress)
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return Response("format must be csv or ndjson", 400)
+
+    clauses, params = [], []
+    category = request.args.get('category')
+    value = request.args.get('value')
+    if category and value:
+        search_filter = build_search_filter(category, value)
+        if search_filter is None:
+            return Response("invalid category or value", 400)
+        clauses.append(search_filter[0])
+        params += search_filter[1]
+
+    for arg, operator in (('start', '>='), ('end', '<=')):
+        if request.args.get(arg):
+            day = parse_date(request.args[arg])
+            if day is None:
+                return Response(f"{arg} must be a date (m/d/Y or Y-m-d)", 400)
+            clauses.append(f"DATE(log_time) {operator} %s")
+            params.append(day.isoformat())
+
+    query = "SELECT * FROM DailyVideoHistory"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    # No ORDER BY: rows start flowing immediately instead of after a sort of the whole result
+    query += ";"
+
+    body = stream_export(query, params, export_format)
+    filename = f"dailyvideodata.{export_format}"
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    if request.args.get('gzip') == '1':
+        body = gzip_stream(body)
+        filename += ".gz"
+        mimetype = 'application/gzip'
+
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+
+# Stage groups shown on /runs; any other stage is left out of the breakdown
+RUN_STAGE_GROUPS = {
+    'apify_actor': 'Apify actor',
+    'apify_dataset': 'Apify dataset',
+    'sheets_': 'Sheets',
+    'db_': 'Database',
+}
+RUNS_LIMIT_DEFAULT = 50
+
+
+def stage_breakdown(summary):
+    """
+    Busy seconds per stage group, summed over every worker that stored a summary
+    for the run ({worker id: StageStats.summary()}, see run_apify_update.finish_run).
+    """
+    totals = {label: 0.0 for label in RUN_STAGE_GROUPS.values()}
+    for worker_summary in (summary or {}).values():
+        for stage, stats in worker_summary.get('stages', {}).items():
+            for prefix, label in RUN_STAGE_GROUPS.items():
+                if stage.startswith(prefix):
+                    totals[label] += stats.get('total_seconds', 0.0)
+                    break
+    return {label: round(seconds, 1) for label, seconds in totals.items()}
+
+
+@app.route('/runs')
+@requires_auth
+def runs():
+    """Recent scrape runs: duration over time and where each run spent its time."""
+    limit = min(max(request.args.get('limit', RUNS_LIMIT_DEFAULT, type=int), 1), 500)
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, scope, status, started_at, finished_at, summary
+                    FROM ScrapeRuns
+                    ORDER BY id DESC
+                    LIMIT %s;
+                """, (limit,))
+                rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Error fetching scrape runs: {str(e)}")
+        rows = []
+
+    run_rows = []
+    for run_id, scope, status, started_at, finished_at, summary in rows:
+        duration = (finished_at - started_at).total_seconds() / 60 if finished_at else None
+        # Errors over every stage of every worker
+        calls = errors = 0
+        for worker_summary in (summary or {}).values():
+            for stats in worker_summary.get('stages', {}).values():
+                calls += stats.get('calls', 0)
+                errors += stats.get('errors', 0)
+        run_rows.append({
+            'id': run_id,
+            'scope': scope,
+            'status': status,
+            'started_at': started_at.strftime('%Y-%m-%d %H:%M'),
+            'duration_minutes': round(duration, 1) if duration is not None else None,
+            'workers': len(summary or {}),
+            'error_rate': round(errors / calls * 100, 2) if calls else None,
+            'stages': stage_breakdown(summary),
+        })
+
+    # Oldest first for the charts
+    chart_runs = list(reversed(run_rows))
+    chart = {
+        'labels': [f"#{run['id']} {run['started_at']}" for run in chart_runs],
+        'duration': [run['duration_minutes'] for run in chart_runs],
+        'stages': {
+            label: [run['stages'][label] for run in chart_runs] for label in RUN_STAGE_GROUPS.values()
+        },
+    }
+    return render_template('runs.html', runs=run_rows, chart=chart, limit=limit)
+
+
+# Search for trials. Returns the num trials for each day in the (optional) date range
 # so that we can graph it alongside the URL
-def search_trials(app_name):
+def search_trials(app_name, start_date=None, end_date=None):
     """
-    Retrieve daily trial counts for the specified app.
-    The query groups by a date column (assumed to be 'original_purchase_date_dt').
+    Retrieve daily trial counts for the specified app, optionally limited to
+    start_date..end_date (inclusive). Reads the pre-aggregated DailyTrialCounts
+    table (kept current from NewTrials by db_manager) with an (app_name, date) range scan.
     """
-    conn = psycopg2.connect(CONN_STR)
-    cursor = conn.cursor()
-    
     query = """
-    SELECT DATE(original_purchase_date_dt) AS date, COUNT(*) AS trial_count
-    FROM NewTrials
+    SELECT date, trial_count
+    FROM DailyTrialCounts
     WHERE app_name = %s
-    GROUP BY DATE(original_purchase_date_dt)
-    ORDER BY DATE(original_purchase_date_dt);
+      AND date >= COALESCE(%s, '-infinity'::date)
+      AND date <= COALESCE(%s, 'infinity'::date)
+    ORDER BY date;
     """
 
-    cursor.execute(query, (app_name,))
-    rows = cursor.fetchall()
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, (app_name, start_date, end_date))
+            rows = cursor.fetchall()
     
     # Convert rows into a list of dictionaries with ISO-formatted dates.
     data = []
@@ -265,13 +697,18 @@ def search_trials(app_name):
         if isinstance(date_value, datetime.date):
             date_value = date_value.isoformat()
         data.append({"date": date_value, "trial_count": row[1]})
-    
-    cursor.close()
-    conn.close()
+
     return data
 
 
 
+# Internal: connection pool stats for this gunicorn worker, used to size DB_POOL_MAX
+@app.route('/internal/pool_stats')
+@requires_auth
+def pool_stats():
+    return jsonify(get_pool().stats())
+
+
 # HELPER FUNCTIONS
 @app.template_filter('datetimeformat')
 def datetimeformat(value, format='%b %d, %Y %I:%M %p'):
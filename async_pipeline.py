@@ -0,0 +1,219 @@
+"""
+Asyncio execution mode for run_apify_update (python run_apify_update.py --mode async)
+
+Actor runs are started with ApifyClientAsync and awaited together under a
+semaphore instead of each one parking a thread while the client polls for
+completion. Dataset items are streamed as they are read: each matched item is
+logged to the DB writer straight away, and a workbook's tabs are written back
+together (one batched request) as soon as its last chunk finishes.
+
+gspread and psycopg2 are blocking, so Sheets calls and DB writes run in worker
+threads via asyncio.to_thread (Sheets calls are also bounded by a semaphore).
+
+The scraper module is passed in rather than imported, so this works when
+run_apify_update is running as __main__.
+"""
+
+import asyncio
+import time
+
+from apify_client import ApifyClientAsync
+
+from retry_policy import ActorRunFailed, PostNotReturned, ScrapeFailed, is_transient
+from scheduler import StageStats, report_failed_writes
+
+
+class AsyncScrapeRun:
+    def __init__(self, scraper, api_key, apify_concurrency=25, sheets_concurrency=4, stats=None):
+        self.scraper = scraper
+        self.client = ApifyClientAsync(api_key)
+        self.apify_sem = asyncio.Semaphore(apify_concurrency)
+        self.sheets_sem = asyncio.Semaphore(sheets_concurrency)
+        self.stats = stats or StageStats()
+        self.failed_writes = []   # (workbook title, [tab titles], error)
+
+    # ----------------------------
+    # HELPERS
+    # ----------------------------
+    async def _sheets_call(self, stage, fn, *args):
+        """Run a blocking Sheets call in a thread, bounded by the Sheets semaphore."""
+        async with self.sheets_sem:
+            start = time.monotonic()
+            error = False
+            try:
+                return await asyncio.to_thread(fn, *args)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.stats.record(stage, time.monotonic() - start, error=error)
+
+    async def _log(self, workbook, url, record):
+        # DailyVideoDataWriter.add can trigger a flush, so keep it off the event loop
+        await asyncio.to_thread(self.scraper.log_record, workbook, url, record)
+
+    # ----------------------------
+    # APIFY
+    # ----------------------------
+    async def _run_actor(self, workbook, platform, owned, results):
+        """
+        Actor runs for every url in owned ({url: cache key}) until they all match or
+        retries run out. Items are matched and logged as they stream out of the dataset;
+        matched urls are removed from owned, so a retry only asks for what is left.
+        Returns the ScrapeFailed error if the run never succeeded, else None.
+        """
+        scraper = self.scraper
+        url_for_key = {}
+        for url in owned:
+            for key in scraper.PLATFORMS.url_match_keys(url, platform):
+                url_for_key.setdefault(key, url)
+
+        async def attempt():
+            urls = list(owned)
+            async with self.apify_sem:
+                with self.stats.timed("apify_actor", items=len(urls)):
+                    run = await self.client.actor(platform.actor_id).call(
+                        run_input=platform.build_run_input(urls)
+                    )
+                    if not run or run.get("status") != "SUCCEEDED":
+                        raise ActorRunFailed(run)
+                # Includes logging the matched items, which happens as they stream in
+                with self.stats.timed("apify_dataset"):
+                    async for item in self.client.dataset(run["defaultDatasetId"]).iterate_items():
+                        url = next(
+                            (url_for_key[key] for key in scraper.PLATFORMS.item_match_keys(item, platform)
+                             if key in url_for_key and url_for_key[key] in owned),
+                            None
+                        )
+                        if url is None:
+                            continue
+                        record = platform.parse_item(item)
+                        scraper.SCRAPE_CACHE.resolve(owned.pop(url), record)
+                        results[url] = record["view_count"]
+                        await self._log(workbook, url, record)
+
+        try:
+            await scraper.RETRY_POLICY.call_async(attempt, f"{platform.name} run for {workbook.title}")
+        except ScrapeFailed as e:
+            print(f"Error processing {platform.name} run of {len(owned)} urls for {workbook.title} "
+                  f"after {e.attempts} attempt(s): {e}")
+            return e
+        return None
+
+    async def _scrape_chunk(self, workbook, urls):
+        """Async counterpart of hit_apify_batch for one scheduler unit. Returns {url: views or None}."""
+        scraper = self.scraper
+        platform = scraper.PLATFORMS.detect(urls[0])
+        if platform is None:
+            print(f"URL '{urls[0]}' does not match {scraper.PLATFORMS.labels}. Skipping.")
+            return {url: 0 for url in urls}
+
+        results = {}
+        owned = {}     # url -> cache key this run must fetch
+        waiting = []   # (url, future) for keys another task is fetching
+        for url in urls:
+            key = await asyncio.to_thread(scraper.PLATFORMS.canonical_key, url)
+            record, future, owner = scraper.SCRAPE_CACHE.claim(key)
+            if record is not None:
+                results[url] = record["view_count"]
+                await self._log(workbook, url, record)
+            elif owner:
+                owned[url] = key
+            else:
+                waiting.append((url, future))
+
+        try:
+            batch_failure = await self._run_actor(workbook, platform, owned, results) if owned else None
+            for url in list(owned):
+                if batch_failure is not None and is_transient(batch_failure.error):
+                    # Single runs would hit the same outage; leave it to the re-drive
+                    failure = batch_failure
+                else:
+                    # Anything the run didn't return gets one single-URL run of its own
+                    print(f"No batch result for {url}, falling back to a single scrape")
+                    single = {url: owned[url]}
+                    failure = await self._run_actor(workbook, platform, single, results)
+                    if not single:
+                        owned.pop(url)
+                        continue
+                    failure = failure or ScrapeFailed(PostNotReturned(url), 1)
+                scraper.record_failure(url, failure)
+                scraper.SCRAPE_CACHE.resolve(owned.pop(url), None)
+                results[url] = None
+        finally:
+            for url, key in owned.items():
+                scraper.SCRAPE_CACHE.resolve(key, None)
+
+        for url, future in waiting:
+            record = await asyncio.wrap_future(future)
+            if record is not None:
+                results[url] = record["view_count"]
+                await self._log(workbook, url, record)
+            else:
+                results[url] = None
+        return results
+
+    # ----------------------------
+    # SHEETS
+    # ----------------------------
+    async def _tab(self, workbook, urls_data):
+        scraper = self.scraper
+        urls = list(dict.fromkeys(row[0] for row in urls_data if row and row[0]))
+        to_scrape, results = await asyncio.to_thread(scraper.plan_refresh, urls)
+
+        chunk_results = await asyncio.gather(
+            *(self._scrape_chunk(workbook, chunk) for chunk in scraper.chunk_urls(to_scrape))
+        )
+        for chunk_result in chunk_results:
+            results.update(chunk_result)
+        return results
+
+    async def _workbook(self, open_fn):
+        started_at = time.monotonic()
+        workbook = await self._sheets_call("open_workbook", open_fn)
+        if workbook is None:
+            return
+        try:
+            await self._workbook_tabs(workbook)
+        finally:
+            self.stats.record_workbook(workbook.title, time.monotonic() - started_at)
+
+    async def _workbook_tabs(self, workbook):
+        scraper = self.scraper
+        sheets = await self._sheets_call("list_tabs", scraper.run_tabs, workbook)
+        if not sheets:
+            return
+        tab_rows = await self._sheets_call("read_tabs", scraper.read_tabs, workbook, sheets)
+        sheets = [sheet for sheet in sheets if sheet.title in tab_rows]
+
+        results = await asyncio.gather(
+            *(self._tab(workbook, tab_rows[sheet.title][0]) for sheet in sheets), return_exceptions=True
+        )
+        tab_results = []
+        for sheet, result in zip(sheets, results):
+            if isinstance(result, Exception):
+                print(f"Error processing tab {sheet.title}: {result}")
+                continue
+            urls_data, last_filled_row = tab_rows[sheet.title]
+            tab_results.append((sheet, urls_data, result, last_filled_row))
+        if not tab_results:
+            return
+
+        try:
+            await self._sheets_call("write_tabs", scraper.write_tab_results, workbook, tab_results)
+        except Exception as e:
+            titles = [sheet.title for sheet, _, _, _ in tab_results]
+            self.failed_writes.append((workbook.title, titles, e))
+            print(f"ERROR: write-back failed for {workbook.title} tabs {titles}: {e}")
+            return
+        for sheet, _, _, _ in tab_results:
+            print(f"Finished processing tab: {sheet.title}")
+
+    async def run(self, workbook_openers):
+        results = await asyncio.gather(*(self._workbook(open_fn) for open_fn in workbook_openers), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error processing workbook: {result}")
+        self.stats.report()
+        report_failed_writes(self.failed_writes)
+        return self.stats
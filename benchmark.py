@@ -0,0 +1,626 @@
+"""
+Offline benchmark for the scrape pipeline
+
+Runs run_apify_update's orchestration (threaded or async mode) against fakes,
+so orchestration changes can be measured without Apify credits or live sheets:
+  - ApifyClient / ApifyClientAsync replay recorded dataset items (or built-in
+    samples) for the requested URLs, with lognormal actor latency, FAILED runs
+    and posts missing from the dataset at configurable rates
+  - gspread serves generated workbooks, with per-request latency and 429s
+  - DailyVideoDataDB is an in-memory substitute, or a real (local!) Postgres
+    with --database-url
+
+Every simulated wait (fake latencies, the Sheets quota, retry backoff) is
+multiplied by --time-scale, so a 0.01 scale runs an hour-long scrape in ~36s.
+Reported times are scaled back up to simulated seconds.
+
+Usage:
+  python benchmark.py --scenario small                    # 10 workbooks
+  python benchmark.py --scenario large --mode async       # 1000 workbooks
+  python benchmark.py --scenario medium --output base.json
+  python benchmark.py --scenario medium --baseline base.json
+  python benchmark.py --payloads items.jsonl              # replay recorded actor items (one per line)
+
+Each run is a separate process, since run_apify_update's state is module-global.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from threading import Lock
+
+import apify_client
+import google.oauth2.service_account
+import gspread
+import requests
+
+# (workbooks, tabs per workbook, urls per tab)
+SCENARIOS = {
+    "small": (10, 3, 20),
+    "medium": (100, 5, 20),
+    "large": (1000, 5, 20)
+}
+
+PROJECT_COUNT = 10
+
+# Where a replayed item carries its post ID and URL, per platform
+REPLAY_FIELDS = {
+    "tiktok": ("id", ("webVideoUrl", "inputUrl")),
+    "instagram": ("shortCode", ("url", "inputUrl")),
+    "youtube": ("id", ("url", "input"))
+}
+
+SAMPLE_ITEMS = [
+    {
+        "id": "7300000000000000000",
+        "webVideoUrl": "https://www.tiktok.com/@creator/video/7300000000000000000",
+        "playCount": 15400,
+        "commentCount": 32,
+        "diggCount": 1200,
+        "text": "sample caption #app",
+        "createTimeISO": "2024-10-22T18:09:31.000Z",
+        "authorMeta": {"name": "creator"}
+    },
+    {
+        "shortCode": "C0000000000",
+        "url": "https://www.instagram.com/reel/C0000000000/",
+        "videoPlayCount": 8800,
+        "commentsCount": 12,
+        "likesCount": 640,
+        "caption": "sample caption",
+        "timestamp": "2024-10-22T18:09:31.000Z",
+        "ownerUsername": "creator"
+    }
+]
+
+
+class Counters:
+    def __init__(self):
+        self._lock = Lock()
+        self.values = {}
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+
+class Latency:
+    """Lognormal delay with the given mean (simulated seconds), scaled to real time."""
+
+    def __init__(self, rng, mean, sigma, time_scale):
+        self.rng = rng
+        self.mean = mean
+        self.sigma = sigma
+        self.time_scale = time_scale
+
+    def seconds(self, mean=None):
+        mean = self.mean if mean is None else mean
+        if mean <= 0:
+            return 0.0
+        mu = math.log(mean) - self.sigma ** 2 / 2
+        return self.rng.lognormvariate(mu, self.sigma) * self.time_scale
+
+    def sleep(self, mean=None):
+        time.sleep(self.seconds(mean))
+
+    async def sleep_async(self, mean=None):
+        await asyncio.sleep(self.seconds(mean))
+
+
+# ----------------------------
+# FAKE APIFY
+# ----------------------------
+class ReplayItems:
+    """Dataset items for any post URL, rewritten from recorded templates."""
+
+    def __init__(self, platforms, templates, rng):
+        self.platforms = platforms
+        self.rng = rng
+        self.templates = {}
+        for item in templates:
+            platform = next(
+                (platform for platform in (self.platforms.detect(url or "") for url in self._item_urls(item)) if platform),
+                None
+            )
+            if platform is not None:
+                self.templates.setdefault(platform.name, []).append(item)
+
+    def _item_urls(self, item):
+        return [item.get(field) for _, fields in REPLAY_FIELDS.values() for field in fields]
+
+    def item_for(self, url):
+        platform = self.platforms.detect(url)
+        templates = self.templates.get(platform.name) if platform else None
+        if not templates:
+            return None
+        item = json.loads(json.dumps(self.rng.choice(templates)))
+        id_field, url_fields = REPLAY_FIELDS[platform.name]
+        item[id_field] = platform.post_id(url)
+        for field in url_fields:
+            item[field] = url
+        # Vary the counts so the rows aren't all identical
+        for key in ("view_count", "likes_count", "comment_count"):
+            field = platform.field_keys[key]
+            if isinstance(item.get(field), int):
+                item[field] = int(item[field] * self.rng.uniform(0.5, 1.5))
+        return item
+
+
+class FakeApify:
+    """State shared by the sync and async fake clients."""
+
+    def __init__(self, replay, counters, latency, per_url_latency, failure_rate, missing_rate, rng):
+        self.replay = replay
+        self.counters = counters
+        self.latency = latency
+        self.per_url_latency = per_url_latency
+        self.failure_rate = failure_rate
+        self.missing_rate = missing_rate
+        self.rng = rng
+        self._lock = Lock()
+        self._datasets = {}
+        self._runs = 0
+
+    def start(self, actor_id, run_input):
+        """Returns (run, simulated actor seconds)."""
+        urls = run_input.get("postURLs") or run_input.get("directUrls") or [
+            start_url["url"] for start_url in run_input.get("startUrls", [])
+        ]
+        self.counters.add("apify_actor_calls")
+        self.counters.add("apify_urls_requested", len(urls))
+        with self._lock:
+            failed = self.rng.random() < self.failure_rate
+            items = [] if failed else [
+                item for item in (self.replay.item_for(url) for url in urls)
+                if item is not None and self.rng.random() >= self.missing_rate
+            ]
+            self._runs += 1
+            dataset_id = f"dataset-{self._runs}"
+            self._datasets[dataset_id] = items
+        if failed:
+            self.counters.add("apify_failed_runs")
+        run = {"id": f"run-{dataset_id}", "status": "FAILED" if failed else "SUCCEEDED", "defaultDatasetId": dataset_id}
+        return run, self.latency.mean + self.per_url_latency * len(urls)
+
+    def items(self, dataset_id):
+        self.counters.add("apify_dataset_reads")
+        with self._lock:
+            items = self._datasets.pop(dataset_id, [])
+        self.counters.add("apify_items", len(items))
+        return items
+
+
+class _Actor:
+    def __init__(self, fake, actor_id):
+        self.fake = fake
+        self.actor_id = actor_id
+
+    def call(self, run_input=None, **kwargs):
+        run, mean = self.fake.start(self.actor_id, run_input)
+        self.fake.latency.sleep(mean)
+        return run
+
+
+class _Dataset:
+    def __init__(self, fake, dataset_id):
+        self.fake = fake
+        self.dataset_id = dataset_id
+
+    def iterate_items(self):
+        items = self.fake.items(self.dataset_id)
+        self.fake.latency.sleep(0.1 * self.fake.latency.mean)
+        yield from items
+
+
+class FakeApifyClient:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def actor(self, actor_id):
+        return _Actor(self.fake, actor_id)
+
+    def dataset(self, dataset_id):
+        return _Dataset(self.fake, dataset_id)
+
+
+class _AsyncActor(_Actor):
+    async def call(self, run_input=None, **kwargs):
+        run, mean = self.fake.start(self.actor_id, run_input)
+        await self.fake.latency.sleep_async(mean)
+        return run
+
+
+class _AsyncDataset(_Dataset):
+    async def iterate_items(self):
+        items = self.fake.items(self.dataset_id)
+        await self.fake.latency.sleep_async(0.1 * self.fake.latency.mean)
+        for item in items:
+            yield item
+
+
+class FakeApifyClientAsync(FakeApifyClient):
+    def actor(self, actor_id):
+        return _AsyncActor(self.fake, actor_id)
+
+    def dataset(self, dataset_id):
+        return _AsyncDataset(self.fake, dataset_id)
+
+
+# ----------------------------
+# FAKE GOOGLE SHEETS
+# ----------------------------
+def _quota_error():
+    response = requests.Response()
+    response.status_code = 429
+    response._content = b'{"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}}'
+    return gspread.exceptions.APIError(response)
+
+
+def _title_of(a1_range):
+    return a1_range.rsplit("!", 1)[0][1:-1].replace("''", "'")
+
+
+class FakeSheet:
+    def __init__(self, sheet_id, title, rows):
+        self.id = sheet_id
+        self.title = title
+        self.rows = rows   # [[url, views]]
+
+
+class FakeSheets:
+    """Sheets API behaviour: latency per request and 429s at error_rate."""
+
+    def __init__(self, counters, latency, error_rate, rng):
+        self.counters = counters
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng
+        self._lock = Lock()
+
+    def request(self, method):
+        self.counters.add(f"sheets_{method}")
+        self.latency.sleep()
+        with self._lock:
+            limited = self.rng.random() < self.error_rate
+        if limited:
+            self.counters.add("sheets_429")
+            raise _quota_error()
+
+
+class FakeWorkbook:
+    def __init__(self, fake, title, sheets):
+        self.fake = fake
+        self.title = title
+        self.sheets = sheets
+
+    def worksheets(self):
+        self.fake.request("worksheets")
+        return list(self.sheets)
+
+    def values_batch_get(self, ranges, params=None):
+        self.fake.request("values_batch_get")
+        by_title = {sheet.title: sheet for sheet in self.sheets}
+        return {"valueRanges": [
+            {"range": a1_range, "values": [list(row) for row in by_title[_title_of(a1_range)].rows]}
+            for a1_range in ranges
+        ]}
+
+    def values_batch_update(self, body):
+        self.fake.request("values_batch_update")
+        by_title = {sheet.title: sheet for sheet in self.sheets}
+        for data in body["data"]:
+            sheet = by_title[_title_of(data["range"])]
+            for row, values in zip(sheet.rows, data["values"]):
+                row[1:] = values
+
+    def batch_update(self, body):
+        self.fake.request("batch_update")
+
+
+class FakeSheetsClient:
+    def __init__(self, fake, workbooks):
+        self.fake = fake
+        self.workbooks = workbooks
+
+    def open(self, name):
+        self.fake.request("open")
+        if name not in self.workbooks:
+            raise gspread.exceptions.SpreadsheetNotFound(name)
+        return self.workbooks[name]
+
+
+# ----------------------------
+# IN-MEMORY DailyVideoDataDB
+# ----------------------------
+class MemoryVideoDB:
+    """The DailyVideoDataDB methods a scrape run uses, kept in memory."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.rows = []
+        self.runs = {}
+        self.run_urls = {}
+        self.run_tabs = set()
+        self.dead_letters = {}
+
+    def ensure_table_exists(self, force=False):
+        pass
+
+    def insert_rows(self, rows, run_id=None):
+        with self._lock:
+            self.rows.extend(rows)
+            if run_id is not None:
+                self.run_urls.update({(run_id, row[0]): row[4] for row in rows})
+
+    def get_refresh_stats(self, urls=None, since_days=None, lookback_days=7):
+        return {}
+
+    def add_dead_letters(self, rows):
+        with self._lock:
+            for row in rows:
+                self.dead_letters[row[:3]] = row
+
+    def resolve_dead_letters(self):
+        return 0
+
+    def get_dead_letters(self, workbook=None):
+        with self._lock:
+            return [
+                {"post_url": post_url, "workbook": title, "tab": tab}
+                for post_url, title, tab in self.dead_letters
+                if workbook is None or title == workbook
+            ]
+
+    def start_run(self, scope, resume_within_hours=20):
+        with self._lock:
+            run_id = len(self.runs) + 1
+            self.runs[run_id] = {"scope": scope, "status": "running", "summary": {}}
+        return run_id, False
+
+    def get_run_progress(self, run_id):
+        with self._lock:
+            done_tabs = {(title, tab) for rid, title, tab in self.run_tabs if rid == run_id}
+            url_views = {url: views for (rid, url), views in self.run_urls.items() if rid == run_id}
+        return done_tabs, url_views
+
+    def record_run_tabs(self, run_id, workbook, tabs):
+        with self._lock:
+            self.run_tabs.update((run_id, workbook, tab) for tab in tabs)
+
+    def finish_run(self, run_id, worker_id=None, summary=None):
+        with self._lock:
+            self.runs[run_id]["status"] = "finished"
+            if summary is not None:
+                self.runs[run_id]["summary"][worker_id] = json.loads(summary)
+
+
+class CountingDB:
+    """Counts (and delays) every call made on a DailyVideoDataDB, except the in-process schema check."""
+
+    def __init__(self, db, counters, latency):
+        self._db = db
+        self._counters = counters
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attribute = getattr(self._db, name)
+        if not callable(attribute) or name == "ensure_table_exists":
+            return attribute
+
+        def call(*args, **kwargs):
+            self._counters.add(f"db_{name}")
+            self._latency.sleep()
+            return attribute(*args, **kwargs)
+        return call
+
+
+# ----------------------------
+# SCENARIO
+# ----------------------------
+def synthetic_url(rng, index, instagram_share):
+    if rng.random() < instagram_share:
+        alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-"
+        shortcode, n = "", index + 1
+        while n:
+            n, digit = divmod(n, len(alphabet))
+            shortcode += alphabet[digit]
+        return f"https://www.instagram.com/reel/C{shortcode}/"
+    return f"https://www.tiktok.com/@creator{index % 500}/video/{7300000000000000000 + index}"
+
+
+def build_workbooks(fake_sheets, workbook_count, tabs, urls_per_tab, instagram_share, duplicate_rate, rng):
+    """Returns ({project: [associates]}, {title: FakeWorkbook}, url count)."""
+    projects, workbooks, seen = {}, {}, []
+    sheet_id = 0
+    for index in range(workbook_count):
+        project, associate = f"App{index % PROJECT_COUNT}", f"Associate{index // PROJECT_COUNT}"
+        projects.setdefault(project, []).append(associate)
+        sheets = []
+        for tab in range(tabs):
+            rows = []
+            for _ in range(urls_per_tab):
+                # The same post in several tabs/workbooks is what the scrape cache is for
+                if seen and rng.random() < duplicate_rate:
+                    url = rng.choice(seen)
+                else:
+                    url = synthetic_url(rng, len(seen), instagram_share)
+                    seen.append(url)
+                rows.append([url, rng.randint(0, 100000)])
+            sheet_id += 1
+            sheets.append(FakeSheet(sheet_id, f"creator {tab + 1}", rows))
+        title = f"{project} - Influencer Management - {associate}"
+        workbooks[title] = FakeWorkbook(fake_sheets, title, sheets)
+    return projects, workbooks, workbook_count * tabs * urls_per_tab
+
+
+def load_scraper(args, counters, rng):
+    """Installs the fakes, then imports run_apify_update against them."""
+    os.environ.setdefault("GCLOUD_PRIVATE_KEY", "")
+    os.environ.setdefault("APIFY_API_KEY", "benchmark")
+    os.environ["REFRESH_MODE"] = args.refresh_mode
+    os.environ["APIFY_BATCH_MODE"] = args.batch_mode
+    os.environ["APIFY_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["SHEETS_CONCURRENCY"] = str(args.sheets_concurrency)
+    os.environ["APIFY_CONCURRENCY"] = str(args.apify_concurrency)
+    os.environ.pop("SCRAPE_CACHE_PATH", None)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    fake_sheets = FakeSheets(
+        counters, Latency(rng, args.sheets_latency, args.sigma, args.time_scale), args.sheets_error_rate, rng
+    )
+    workbook_count, tabs, urls_per_tab = SCENARIOS[args.scenario]
+    projects, workbooks, url_count = build_workbooks(
+        fake_sheets, args.workbooks or workbook_count, args.tabs or tabs, args.urls or urls_per_tab,
+        args.instagram_share, args.duplicate_rate, rng
+    )
+    sheets_client = FakeSheetsClient(fake_sheets, workbooks)
+    google.oauth2.service_account.Credentials.from_service_account_info = staticmethod(lambda *a, **k: None)
+    gspread.authorize = lambda credentials: sheets_client
+
+    import platforms
+    templates = SAMPLE_ITEMS
+    if args.payloads:
+        with open(args.payloads) as f:
+            templates = [json.loads(line) for line in f if line.strip()]
+    fake_apify = FakeApify(
+        ReplayItems(platforms.default_registry(), templates, rng), counters,
+        Latency(rng, args.apify_latency, args.sigma, args.time_scale), args.apify_per_url_latency,
+        args.apify_failure_rate, args.apify_missing_rate, rng
+    )
+    apify_client.ApifyClient = lambda *a, **k: FakeApifyClient(fake_apify)
+    apify_client.ApifyClientAsync = lambda *a, **k: FakeApifyClientAsync(fake_apify)
+
+    import run_apify_update as scraper
+    from sheets_io import TokenBucket
+
+    scraper.PROJECTS = projects
+    db = MemoryVideoDB() if not args.database_url else None
+    if db is None:
+        scraper.DB_WRITER.ensure_schema()
+        db = scraper.DB_WRITER.db
+    scraper.DB_WRITER.db = CountingDB(db, counters, Latency(rng, args.db_latency, args.sigma, args.time_scale))
+
+    # The Sheets quota and retry backoff run on the same scaled clock as the fakes
+    scraper.SHEETS.bucket = TokenBucket(
+        scraper.SHEETS_REQUESTS_PER_MINUTE, per=60.0 * args.time_scale, capacity=scraper.SHEETS.bucket.capacity
+    )
+    scraper.SHEETS.base_delay *= args.time_scale
+    scraper.SHEETS.max_delay *= args.time_scale
+    scraper.RETRY_POLICY.base_delay *= args.time_scale
+    scraper.RETRY_POLICY.max_delay *= args.time_scale
+    return scraper, url_count
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    counters = Counters()
+    scraper, url_count = load_scraper(args, counters, rng)
+
+    output = open(os.devnull, "w") if not args.verbose else sys.stdout
+    started_at = time.monotonic()
+    with contextlib.redirect_stdout(output):
+        if args.mode == "async":
+            scraper.orchestrate_all_scraping_async(resume=False)
+        else:
+            scraper.orchestrate_all_scraping(resume=False)
+    real_seconds = time.monotonic() - started_at
+
+    simulated_seconds = real_seconds / args.time_scale
+    summary = scraper.RUN_STATS.summary()
+    calls = dict(sorted(counters.values.items()))
+    return {
+        "config": {key: value for key, value in sorted(vars(args).items()) if key not in ("baseline", "output")},
+        "urls": url_count,
+        "workbooks": sum(len(associates) for associates in scraper.PROJECTS.values()),
+        "real_seconds": round(real_seconds, 3),
+        "wall_clock_seconds": round(simulated_seconds, 1),
+        "urls_per_second": round(url_count / simulated_seconds, 3) if simulated_seconds else 0.0,
+        "rows_written": scraper.DB_WRITER.rows_written,
+        "scrape_cache": dict(scraper.SCRAPE_CACHE.counters),
+        "sheets_io": dict(scraper.SHEETS.counters),
+        "calls": calls,
+        "stages": summary["stages"]
+    }
+
+
+# ----------------------------
+# REPORTING
+# ----------------------------
+COMPARED_METRICS = ["wall_clock_seconds", "urls_per_second", "rows_written"]
+
+
+def report(result, baseline=None):
+    print("========== BENCHMARK ==========")
+    config = result["config"]
+    print(f"Scenario: {config['scenario']} ({result['workbooks']} workbooks, {result['urls']} urls), "
+          f"mode={config['mode']}, batch={config['batch_mode']}/{config['batch_size']}, time scale {config['time_scale']}")
+    print(f"Wall clock: {result['wall_clock_seconds']:.1f}s simulated ({result['real_seconds']:.1f}s real)")
+    print(f"Throughput: {result['urls_per_second']:.2f} urls/s, {result['rows_written']} rows written")
+    print(f"Scrape cache: {result['scrape_cache']}")
+    print("External calls:")
+    for name, count in result["calls"].items():
+        print(f"  {name:<28} {count}")
+    print("Stages (simulated seconds):")
+    for stage, stats in result["stages"].items():
+        scale = config["time_scale"]
+        print(f"  {stage:<28} calls={stats['calls']:<7} errors={stats['errors']:<5} "
+              f"p50={stats['p50'] / scale:.2f}s p95={stats['p95'] / scale:.2f}s max={stats['max'] / scale:.2f}s")
+
+    if baseline is not None:
+        print("---------- vs baseline ----------")
+        metrics = [(metric, baseline.get(metric), result.get(metric)) for metric in COMPARED_METRICS]
+        names = sorted(set(baseline.get("calls", {})) | set(result["calls"]))
+        metrics += [(name, baseline.get("calls", {}).get(name, 0), result["calls"].get(name, 0)) for name in names]
+        for name, before, after in metrics:
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"  {name:<28} {before!s:>12} -> {after!s:<12} {change}")
+    print("===============================")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scrape pipeline against fake Apify / Sheets / DB.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="small")
+    parser.add_argument("--workbooks", type=int, help="override the scenario's workbook count")
+    parser.add_argument("--tabs", type=int, help="override the scenario's tabs per workbook")
+    parser.add_argument("--urls", type=int, help="override the scenario's urls per tab")
+    parser.add_argument("--mode", choices=["threaded", "async"], default="threaded")
+    parser.add_argument("--batch-mode", choices=["off", "tab", "workbook"], default="tab")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--sheets-concurrency", type=int, default=4)
+    parser.add_argument("--apify-concurrency", type=int, default=25)
+    parser.add_argument("--refresh-mode", choices=["adaptive", "all"], default="all")
+    parser.add_argument("--instagram-share", type=float, default=0.4, help="fraction of instagram urls")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="fraction of urls repeated from other tabs")
+    parser.add_argument("--payloads", help="JSON lines of recorded actor dataset items to replay")
+    parser.add_argument("--apify-latency", type=float, default=20.0, help="mean seconds per actor run")
+    parser.add_argument("--apify-per-url-latency", type=float, default=0.5, help="extra mean seconds per url in a run")
+    parser.add_argument("--apify-failure-rate", type=float, default=0.02, help="fraction of runs that end FAILED")
+    parser.add_argument("--apify-missing-rate", type=float, default=0.01, help="fraction of posts missing from a dataset")
+    parser.add_argument("--sheets-latency", type=float, default=0.4, help="mean seconds per Sheets request")
+    parser.add_argument("--sheets-error-rate", type=float, default=0.02, help="fraction of Sheets requests that get a 429")
+    parser.add_argument("--db-latency", type=float, default=0.05, help="mean seconds per DB call")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal spread of every latency")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="real seconds per simulated second")
+    parser.add_argument("--database-url", help="use this Postgres instead of the in-memory DB (rows are really written)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the result as JSON (use as a later --baseline)")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the scraper's own output")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True, default=str)
@@ -3,12 +3,17 @@ Interact with the DailyVideoData table
 """
 
 import os
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta
 from contextlib import contextmanager
+from psycopg2 import DataError, IntegrityError
+from psycopg2.extras import execute_values
 from psycopg2.pool import ThreadedConnectionPool
-from threading import Lock
+from threading import BoundedSemaphore, Lock
 from dotenv import load_dotenv
 
+from platforms import PlatformRegistry, TikTokAdapter, InstagramAdapter, YouTubeShortsAdapter
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -16,6 +21,8 @@ class DatabasePool:
     _instance = None
     _lock = Lock()
     _pool = None
+    # Opened on first use with at most maxconn connections (DB_POOL_SIZE, or configure() before then)
+    maxconn = int(os.getenv('DB_POOL_SIZE', '20'))
 
     def __new__(cls):
         with cls._lock:
@@ -24,40 +31,849 @@ class DatabasePool:
                 cls._instance._initialize_pool()
             return cls._instance
 
+    @classmethod
+    def configure(cls, maxconn):
+        """Set the pool size; only possible before the pool is first used."""
+        with cls._lock:
+            if cls._instance is not None:
+                print(f"WARNING: database pool already open with {cls.maxconn} connections; size unchanged")
+                return
+            cls.maxconn = maxconn
+
     def _initialize_pool(self):
         """Initialize the connection pool"""
         if self._pool is None:
             DATABASE_URL = os.getenv('DATABASE_URL')
-            # Maintain minimum 1 connection, maximum 20 connections
+            # Maintain minimum 1 connection, maximum maxconn connections
             self._pool = ThreadedConnectionPool(
                 minconn=1,
-                maxconn=20,
+                maxconn=self.maxconn,
                 dsn=DATABASE_URL
             )
+            # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+            self._slots = BoundedSemaphore(self.maxconn)
 
     @contextmanager
     def get_connection(self):
         """Get a connection from the pool"""
-        conn = None
-        try:
-            conn = self._pool.getconn()
-            yield conn
-        finally:
-            if conn:
-                self._pool.putconn(conn)
+        with self._slots:
+            conn = None
+            try:
+                conn = self._pool.getconn()
+                yield conn
+            finally:
+                if conn:
+                    self._pool.putconn(conn)
 
     def close_all(self):
         """Close all connections in the pool"""
         if self._pool:
             self._pool.closeall()
 
-# Database operations class
-class DailyVideoDataDB:
-    def __init__(self):
-        self.db_pool = DatabasePool()
+# ----------------------------
+# PARTITIONING / ROLLUPS
+# VideoSnapshots (DailyVideoData before it was normalized, see NORMALIZED
+# STORAGE) is range-partitioned on log_time, one partition per month
+# (videosnapshots_pYYYYMM) plus a default partition for rows outside those months.
+# Partitions older than the retention window are compacted into DailyVideoRollup
+# (last snapshot per post per day or week) and dropped. DailyVideoHistory is a
+# view over both that the dashboard reads from.
+# ----------------------------
+SNAPSHOT_TABLE = "VideoSnapshots"
+ROLLUP_GRANULARITIES = ("day", "week")
+
+DAILY_VIDEO_DATA_INDEXES = """
+    -- post_url lookups (search + graph) use the composite index's leading column
+    CREATE INDEX IF NOT EXISTS idx_dailyvideodata_post_url_log_time ON DailyVideoData (post_url, log_time);
+    CREATE INDEX IF NOT EXISTS idx_dailyvideodata_creator_username ON DailyVideoData (creator_username);
+    CREATE INDEX IF NOT EXISTS idx_dailyvideodata_marketing_associate ON DailyVideoData (marketing_associate);
+    CREATE INDEX IF NOT EXISTS idx_dailyvideodata_app ON DailyVideoData (app);
+    -- search_data filters on DATE(col) = %s, so index the expression itself
+    CREATE INDEX IF NOT EXISTS idx_dailyvideodata_create_date ON DailyVideoData ((DATE(create_time)));
+    CREATE INDEX IF NOT EXISTS idx_dailyvideodata_log_date ON DailyVideoData ((DATE(log_time)));
+"""
+
+DAILY_VIDEO_HISTORY_VIEW = """
+    -- Raw snapshots plus compacted history, shaped like DailyVideoData (rollup rows have no id)
+    CREATE OR REPLACE VIEW DailyVideoHistory AS
+        SELECT id, post_url, creator_username, marketing_associate, app, view_count,
+               comment_count, caption, create_time, log_time, num_likes
+        FROM DailyVideoData
+        UNION ALL
+        SELECT NULL::INTEGER, post_url, creator_username, marketing_associate, app, view_count,
+               comment_count, caption, create_time, log_time, num_likes
+        FROM DailyVideoRollup;
+"""
+
+
+def _month_start(day, offset=0):
+    """First day of the month `offset` months after day's month."""
+    month_index = day.year * 12 + (day.month - 1) + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _partition_prefix(parent):
+    return f"{parent.lower()}_p"
+
+
+def _create_month_partition(cur, month, parent=SNAPSHOT_TABLE):
+    """Create the partition of parent covering the month starting at `month`."""
+    name = f"{_partition_prefix(parent)}{month:%Y%m}"
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} "
+        f"FOR VALUES FROM (%s) TO (%s);",
+        (month, _month_start(month, 1))
+    )
+
+
+def ensure_partitions(cur, months_ahead=2, parent=SNAPSHOT_TABLE):
+    """Create this month's partition and the next months_ahead ones if they're missing."""
+    this_month = _month_start(date.today())
+    for offset in range(months_ahead + 1):
+        _create_month_partition(cur, _month_start(this_month, offset), parent)
+
+
+def _create_partitions_since(cur, oldest, parent=SNAPSHOT_TABLE):
+    """Monthly partitions from oldest's month (today's if None) through the upcoming ones."""
+    month = _month_start(oldest.date() if oldest else date.today())
+    while month <= _month_start(date.today()):
+        _create_month_partition(cur, month, parent)
+        month = _month_start(month, 1)
+    ensure_partitions(cur, parent=parent)
+
+
+def list_partitions(cur, parent=SNAPSHOT_TABLE):
+    """Returns [(partition name, month start)] for the monthly partitions of parent."""
+    cur.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s;
+    """, (parent.lower(),))
+    prefix = _partition_prefix(parent)
+    partitions = []
+    for (name,) in cur.fetchall():
+        if name.startswith(prefix):
+            suffix = name[len(prefix):]
+            partitions.append((name, date(int(suffix[:4]), int(suffix[4:6]), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _partition_daily_video_data(cur):
+    """
+    Rebuild an empty DailyVideoData as a partitioned table, keeping the id sequence.
+    A table that already has rows is left as it is: copying them here would block
+    writers for the whole copy, and migration 13 moves them into the partitioned
+    VideoSnapshots anyway, batch by batch (normalize_snapshots).
+    """
+    cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'dailyvideodata'::regclass;")
+    if cur.fetchone():
+        return
+    cur.execute("SELECT EXISTS (SELECT 1 FROM DailyVideoData);")
+    if cur.fetchone()[0]:
+        print("DailyVideoData has rows; they are partitioned when migration 13 normalizes them")
+        return
+
+    cur.execute("ALTER TABLE DailyVideoData RENAME TO DailyVideoData_unpartitioned;")
+    cur.execute("""
+        SELECT indexname FROM pg_indexes
+        WHERE tablename = 'dailyvideodata_unpartitioned' AND indexname LIKE 'idx_dailyvideodata_%';
+    """)
+    for (index_name,) in cur.fetchall():
+        cur.execute(f"DROP INDEX {index_name};")
+
+    # The partition key has to be part of the primary key
+    cur.execute("""
+        CREATE TABLE DailyVideoData (
+            id INTEGER NOT NULL DEFAULT nextval('dailyvideodata_id_seq'),
+            post_url TEXT,
+            creator_username TEXT,
+            marketing_associate TEXT,
+            app TEXT,
+            view_count INTEGER,
+            comment_count INTEGER,
+            caption TEXT,
+            create_time TIMESTAMP,
+            log_time TIMESTAMP,
+            num_likes INTEGER
+        ) PARTITION BY RANGE (log_time);
+    """)
+    cur.execute("CREATE TABLE IF NOT EXISTS DailyVideoData_default PARTITION OF DailyVideoData DEFAULT;")
+    ensure_partitions(cur, parent="DailyVideoData")
+
+    cur.execute("ALTER SEQUENCE dailyvideodata_id_seq OWNED BY DailyVideoData.id;")
+    cur.execute("DROP TABLE DailyVideoData_unpartitioned;")
+
+    # Indexes on the partitioned parent are created on every partition
+    cur.execute("ALTER TABLE DailyVideoData ADD PRIMARY KEY (id, log_time);")
+    cur.execute(DAILY_VIDEO_DATA_INDEXES)
+
+
+def _rollup_snapshots(cur, source, granularity, before=None):
+    """
+    Upsert the last snapshot per post per bucket of source (a VideoSnapshots
+    partition), optionally only its rows logged before `before`, into DailyVideoRollup.
+    Every post is kept, including those stored without a url (post_url '').
+    Returns the number of buckets written.
+    """
+    where = "WHERE s.log_time < %(before)s" if before is not None else ""
+    cur.execute(f"""
+        INSERT INTO DailyVideoRollup
+            (post_url, marketing_associate, granularity, bucket, creator_username, app,
+             view_count, comment_count, caption, create_time, log_time, num_likes, snapshots)
+        SELECT DISTINCT ON (s.post_id, DATE(date_trunc(%(granularity)s, s.log_time)))
+            p.post_url,
+            p.marketing_associate,
+            %(granularity)s,
+            DATE(date_trunc(%(granularity)s, s.log_time)),
+            p.creator_username, p.app, s.view_count, s.comment_count, p.caption, p.create_time, s.log_time, s.num_likes,
+            COUNT(*) OVER (PARTITION BY s.post_id, DATE(date_trunc(%(granularity)s, s.log_time)))
+        FROM {source} s
+        JOIN Posts p ON p.id = s.post_id
+        {where}
+        ORDER BY s.post_id, DATE(date_trunc(%(granularity)s, s.log_time)), s.log_time DESC
+        ON CONFLICT (post_url, marketing_associate, granularity, bucket) DO UPDATE SET
+            creator_username = EXCLUDED.creator_username,
+            app = EXCLUDED.app,
+            view_count = EXCLUDED.view_count,
+            comment_count = EXCLUDED.comment_count,
+            caption = EXCLUDED.caption,
+            create_time = EXCLUDED.create_time,
+            log_time = EXCLUDED.log_time,
+            num_likes = EXCLUDED.num_likes,
+            snapshots = DailyVideoRollup.snapshots + EXCLUDED.snapshots
+        WHERE EXCLUDED.log_time > DailyVideoRollup.log_time;
+    """, {"granularity": granularity, "before": before})
+    return cur.rowcount
+
+
+def rollup_partitions(cur, retention_days=90, granularity="day"):
+    """
+    Compact every monthly partition that lies entirely before the retention
+    window into DailyVideoRollup (last snapshot per post/associate per bucket),
+    then detach and drop it. Rows of the default partition that are older than
+    the window are compacted too and deleted from it.
+    Returns the names of the dropped partitions.
+    """
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"granularity must be one of {ROLLUP_GRANULARITIES}")
+
+    cutoff = _month_start(date.today() - timedelta(days=retention_days))
+    dropped = []
+    for name, month in list_partitions(cur):
+        if _month_start(month, 1) > cutoff:
+            continue
+
+        buckets = _rollup_snapshots(cur, name, granularity)
+        print(f"Rolled up {buckets} {granularity} buckets from {name}")
+
+        cur.execute(f"ALTER TABLE {SNAPSHOT_TABLE} DETACH PARTITION {name};")
+        cur.execute(f"DROP TABLE {name};")
+        dropped.append(name)
+
+    # The default partition holds rows outside the monthly partitions; it stays, minus its old rows
+    default = f"{SNAPSHOT_TABLE}_default"
+    buckets = _rollup_snapshots(cur, default, granularity, before=cutoff)
+    cur.execute(f"DELETE FROM {default} WHERE log_time < %s;", (cutoff,))
+    if cur.rowcount:
+        print(f"Rolled up {buckets} {granularity} buckets from {cur.rowcount} rows of {default}")
+    return dropped
+
+
+# ----------------------------
+# TRIAL COUNTS
+# DailyTrialCounts holds trials per app per day so the dashboard reads a few
+# indexed rows instead of aggregating NewTrials. NewTrials is written by
+# another service; a trigger keeps today's counts current as rows arrive and
+# refresh_trial_counts re-aggregates a recent window to pick up edits/deletes.
+# ----------------------------
+def _newtrials_exists(cur):
+    cur.execute("SELECT to_regclass('newtrials') IS NOT NULL;")
+    return cur.fetchone()[0]
+
+
+def ensure_trial_count_trigger(cur):
+    """Install the NewTrials insert trigger. Returns False if NewTrials doesn't exist yet."""
+    if not _newtrials_exists(cur):
+        return False
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION bump_daily_trial_count() RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO DailyTrialCounts (app_name, date, trial_count)
+            VALUES (NEW.app_name, DATE(NEW.original_purchase_date_dt), 1)
+            ON CONFLICT (app_name, date) DO UPDATE
+                SET trial_count = DailyTrialCounts.trial_count + 1, refreshed_at = NOW();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS newtrials_daily_count ON NewTrials;")
+    cur.execute("""
+        CREATE TRIGGER newtrials_daily_count
+        AFTER INSERT ON NewTrials
+        FOR EACH ROW
+        WHEN (NEW.original_purchase_date_dt IS NOT NULL)
+        EXECUTE FUNCTION bump_daily_trial_count();
+    """)
+    # Lets refresh_trial_counts read only its window
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_newtrials_purchase_date ON NewTrials (original_purchase_date_dt);")
+    return True
+
+
+def refresh_trial_counts(cur, days=None):
+    """
+    Recompute DailyTrialCounts from NewTrials for the last `days` days
+    (everything when days is None). Returns the number of (app, day) rows written.
+    """
+    if not _newtrials_exists(cur):
+        print("NewTrials does not exist; nothing to refresh")
+        return 0
+
+    since = date.today() - timedelta(days=days) if days is not None else date.min
+    cur.execute("DELETE FROM DailyTrialCounts WHERE date >= %s;", (since,))
+    cur.execute("""
+        INSERT INTO DailyTrialCounts (app_name, date, trial_count)
+        SELECT app_name, DATE(original_purchase_date_dt), COUNT(*)
+        FROM NewTrials
+        WHERE original_purchase_date_dt >= %s
+        GROUP BY app_name, DATE(original_purchase_date_dt);
+    """, (since,))
+    return cur.rowcount
+
+
+def _create_daily_trial_counts(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS DailyTrialCounts (
+            app_name TEXT NOT NULL,
+            date DATE NOT NULL,
+            trial_count INTEGER NOT NULL,
+            refreshed_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (app_name, date)
+        );
+    """)
+    if ensure_trial_count_trigger(cur):
+        refresh_trial_counts(cur)
+    else:
+        print("NewTrials not found; run 'python db_manager.py trials' once it exists")
+
+
+# ----------------------------
+# TRIAL UPTICKS AND VIDEO METRIC DELTAS
+# A trial uptick is a finished day on which an app's trial count rose by at
+# least `threshold` over the day before (LAG over DailyTrialCounts, days with
+# no trials counted as 0). Each new uptick gets a TrialTriggerEvents row and,
+# in VideoMetricDeltas, one row per post of that app created within
+# window_days of it: how far its views / comments / likes moved that day,
+# from the snapshot before the day's first one (LAG over post_url ORDER BY
+# log_time) to the day's last snapshot.
+# Days after the DeltaEngineWatermarks watermark are processed once; the
+# events, their deltas and the new watermark are committed together.
+# ----------------------------
+TRIAL_UPTICK_WATERMARK = "trial_upticks"
+
+
+def compute_trial_upticks(cur, threshold, window_days=14, since_days=30, settle_hours=1):
+    """
+    Detect upticks on the days after the watermark and write their video deltas.
+    since_days: how far back the first run (no watermark yet) starts
+    settle_hours: a day is only processed this long after it ends, so late trials and snapshots are in
+    Returns the ids of the new TrialTriggerEvents.
+    """
+    cur.execute("""
+        INSERT INTO DeltaEngineWatermarks (name, watermark) VALUES (%s, CURRENT_DATE - %s)
+        ON CONFLICT (name) DO NOTHING;
+    """, (TRIAL_UPTICK_WATERMARK, since_days + 1))
+    # Row lock: a second engine run waits here, then sees the advanced watermark
+    cur.execute("""
+        SELECT watermark, (NOW() - make_interval(hours => %s))::date - 1
+        FROM DeltaEngineWatermarks WHERE name = %s FOR UPDATE;
+    """, (settle_hours, TRIAL_UPTICK_WATERMARK))
+    watermark, through = cur.fetchone()
+    if through <= watermark:
+        return []
+
+    cur.execute("""
+        WITH days AS (
+            SELECT generate_series(%(watermark)s::date, %(through)s::date, interval '1 day')::date AS date
+        ),
+        apps AS (
+            SELECT DISTINCT app_name FROM DailyTrialCounts WHERE date BETWEEN %(watermark)s AND %(through)s
+        ),
+        daily AS (
+            SELECT apps.app_name, days.date,
+                   COALESCE(c.trial_count, 0)
+                       - LAG(COALESCE(c.trial_count, 0)) OVER (PARTITION BY apps.app_name ORDER BY days.date) AS delta
+            FROM apps
+            CROSS JOIN days
+            LEFT JOIN DailyTrialCounts c ON c.app_name = apps.app_name AND c.date = days.date
+        )
+        INSERT INTO TrialTriggerEvents (app, event_time, current_delta)
+        SELECT app_name, date::timestamp, delta
+        FROM daily
+        WHERE date > %(watermark)s
+          AND delta >= %(threshold)s
+          AND NOT EXISTS (
+              SELECT 1 FROM TrialTriggerEvents e WHERE e.app = daily.app_name AND e.event_time = daily.date::timestamp
+          )
+        RETURNING id;
+    """, {"watermark": watermark, "through": through, "threshold": threshold})
+    event_ids = [row[0] for row in cur.fetchall()]
+
+    if event_ids:
+        cur.execute("""
+            WITH events AS (
+                SELECT id, app, event_time FROM TrialTriggerEvents WHERE id = ANY(%(event_ids)s)
+            ),
+            snapshots AS (
+                SELECT e.id AS event_id, e.event_time, d.post_url, d.creator_username, d.marketing_associate,
+                       d.log_time, d.view_count, d.comment_count, d.num_likes,
+                       LAG(d.view_count) OVER w AS old_view_count,
+                       LAG(d.comment_count) OVER w AS old_comment_count,
+                       LAG(d.num_likes) OVER w AS old_likes
+                FROM events e
+                JOIN DailyVideoData d
+                  ON LOWER(d.app) = LOWER(e.app)
+                 AND d.log_time >= e.event_time - make_interval(days => %(window_days)s)
+                 AND d.log_time < e.event_time + interval '1 day'
+                 AND d.create_time >= e.event_time - make_interval(days => %(window_days)s)
+                WHERE d.post_url IS NOT NULL
+                WINDOW w AS (PARTITION BY e.id, d.post_url, d.marketing_associate ORDER BY d.log_time)
+            ),
+            day_snapshots AS (
+                SELECT *,
+                       FIRST_VALUE(old_view_count) OVER p AS day_old_views,
+                       FIRST_VALUE(old_comment_count) OVER p AS day_old_comments,
+                       FIRST_VALUE(old_likes) OVER p AS day_old_likes
+                FROM snapshots
+                WHERE log_time >= event_time
+                WINDOW p AS (PARTITION BY event_id, post_url, marketing_associate ORDER BY log_time)
+            )
+            INSERT INTO VideoMetricDeltas
+                (trial_trigger_event_id, post_url, creator_username, marketing_associate,
+                 old_view_count, new_view_count, delta_views,
+                 old_comment_count, new_comment_count, delta_comments,
+                 old_likes, new_likes, delta_likes)
+            SELECT DISTINCT ON (event_id, post_url, marketing_associate)
+                event_id, post_url, creator_username, marketing_associate,
+                day_old_views, view_count, view_count - COALESCE(day_old_views, 0),
+                day_old_comments, comment_count, comment_count - COALESCE(day_old_comments, 0),
+                day_old_likes, num_likes, num_likes - COALESCE(day_old_likes, 0)
+            FROM day_snapshots
+            ORDER BY event_id, post_url, marketing_associate, log_time DESC;
+        """, {"event_ids": event_ids, "window_days": window_days})
+        print(f"Wrote {cur.rowcount} video metric deltas for {len(event_ids)} trial upticks")
+
+    cur.execute(
+        "UPDATE DeltaEngineWatermarks SET watermark = %s, updated_at = NOW() WHERE name = %s;",
+        (through, TRIAL_UPTICK_WATERMARK)
+    )
+    return event_ids
+
 
-    def ensure_table_exists(self):
-        create_table_query = """
+# ----------------------------
+# LATEST METRICS
+# LatestVideoMetrics holds one row per post and marketing associate (the grain
+# of Posts; a post tracked in two associates' workbooks has a row for each):
+# its latest counts, when it was first and last logged, and the counts of the
+# snapshot before the latest one (delta_* are generated from the two). Posts are
+# identified by the post key of the logged URL
+# (platforms.PlatformRegistry.post_key), so URL variants of a post share a row;
+# a missing associate is stored as ''. insert_rows / insert_row upsert it in the same transaction as
+# the DailyVideoData rows, so readers that only need each post's current state
+# (refresh planning, dashboard search) read one row per post instead of
+# scanning the snapshot log.
+# A scrape is logged once per tab its post appears on; a snapshot less than
+# SAME_SCRAPE_MINUTES after the latest one replaces it rather than becoming
+# the new "previous" snapshot.
+# ----------------------------
+POST_KEYS = PlatformRegistry([TikTokAdapter(), InstagramAdapter(), YouTubeShortsAdapter()])
+SAME_SCRAPE_MINUTES = 30
+
+LATEST_VIDEO_METRICS_TABLE = """
+    CREATE TABLE IF NOT EXISTS LatestVideoMetrics (
+        post_key TEXT NOT NULL,
+        post_url TEXT NOT NULL,
+        creator_username TEXT,
+        marketing_associate TEXT NOT NULL DEFAULT '',
+        app TEXT,
+        caption TEXT,
+        create_time TIMESTAMP,
+        view_count INTEGER,
+        comment_count INTEGER,
+        num_likes INTEGER,
+        first_seen_at TIMESTAMP NOT NULL,
+        last_seen_at TIMESTAMP NOT NULL,
+        previous_view_count INTEGER,
+        previous_comment_count INTEGER,
+        previous_likes INTEGER,
+        previous_seen_at TIMESTAMP,
+        delta_views INTEGER GENERATED ALWAYS AS (view_count - previous_view_count) STORED,
+        delta_comments INTEGER GENERATED ALWAYS AS (comment_count - previous_comment_count) STORED,
+        delta_likes INTEGER GENERATED ALWAYS AS (num_likes - previous_likes) STORED,
+        PRIMARY KEY (post_key, marketing_associate)
+    );
+    -- Same filters as the DailyVideoData search indexes
+    CREATE INDEX IF NOT EXISTS idx_latestvideometrics_post_url ON LatestVideoMetrics (post_url);
+    CREATE INDEX IF NOT EXISTS idx_latestvideometrics_creator_username ON LatestVideoMetrics (creator_username);
+    CREATE INDEX IF NOT EXISTS idx_latestvideometrics_marketing_associate ON LatestVideoMetrics (marketing_associate);
+    CREATE INDEX IF NOT EXISTS idx_latestvideometrics_app ON LatestVideoMetrics (app);
+    CREATE INDEX IF NOT EXISTS idx_latestvideometrics_create_date ON LatestVideoMetrics ((DATE(create_time)));
+    CREATE INDEX IF NOT EXISTS idx_latestvideometrics_last_seen_date ON LatestVideoMetrics ((DATE(last_seen_at)));
+    -- get_refresh_stats(since_days=...)
+    CREATE INDEX IF NOT EXISTS idx_latestvideometrics_last_seen_at ON LatestVideoMetrics (last_seen_at);
+"""
+
+LATEST_VIDEO_METRICS_COLUMNS = (
+    "post_key, post_url, creator_username, marketing_associate, app, caption, create_time, "
+    "view_count, comment_count, num_likes, first_seen_at, last_seen_at"
+)
+
+
+def _shift_previous(column, previous):
+    """SET clause moving the stored latest value into previous when a new scrape (not a repeat) arrives."""
+    return f"""{previous} = CASE
+            WHEN EXCLUDED.last_seen_at >= l.last_seen_at + make_interval(mins => {SAME_SCRAPE_MINUTES})
+            THEN l.{column} ELSE l.{previous} END"""
+
+
+LATEST_VIDEO_METRICS_UPSERT = f"""
+    INSERT INTO LatestVideoMetrics AS l ({LATEST_VIDEO_METRICS_COLUMNS})
+    VALUES %s
+    ON CONFLICT (post_key, marketing_associate) DO UPDATE SET
+        {_shift_previous("view_count", "previous_view_count")},
+        {_shift_previous("comment_count", "previous_comment_count")},
+        {_shift_previous("num_likes", "previous_likes")},
+        {_shift_previous("last_seen_at", "previous_seen_at")},
+        post_url = EXCLUDED.post_url,
+        creator_username = COALESCE(EXCLUDED.creator_username, l.creator_username),
+        app = EXCLUDED.app,
+        caption = COALESCE(EXCLUDED.caption, l.caption),
+        create_time = COALESCE(EXCLUDED.create_time, l.create_time),
+        view_count = EXCLUDED.view_count,
+        comment_count = EXCLUDED.comment_count,
+        num_likes = EXCLUDED.num_likes,
+        first_seen_at = LEAST(l.first_seen_at, EXCLUDED.first_seen_at),
+        last_seen_at = EXCLUDED.last_seen_at
+    -- A snapshot that arrives late never replaces a newer one
+    WHERE EXCLUDED.last_seen_at >= l.last_seen_at;
+"""
+
+
+def upsert_latest_metrics(cur, rows):
+    """
+    Fold DailyVideoData rows (insert_row's column order) into LatestVideoMetrics.
+    Only the newest row per post and associate in the batch is sent: ON CONFLICT can't touch a row twice in one statement.
+    """
+    latest = {}
+    for row in rows:
+        url, associate, log_time = row[0], row[2], row[8]
+        if not url or log_time is None:
+            continue
+        key = (POST_KEYS.post_key(url), associate or "")
+        if key not in latest or log_time >= latest[key][8]:
+            latest[key] = row
+    # Rows are locked in key order so concurrent writers can't deadlock on each other
+    values = [
+        (key, url, username, associate, app, caption, create_time, views, comments, likes, log_time, log_time)
+        for (key, associate), (url, username, _, app, views, comments, caption, create_time, log_time, likes)
+        in sorted(latest.items())
+    ]
+    if values:
+        execute_values(cur, LATEST_VIDEO_METRICS_UPSERT, values, page_size=1000)
+
+
+def _create_latest_video_metrics(cur):
+    """Create LatestVideoMetrics and backfill it from DailyVideoHistory."""
+    cur.execute(LATEST_VIDEO_METRICS_TABLE)
+
+    # Post keys come from platforms' URL patterns, so they're computed here and joined in
+    cur.execute("SELECT DISTINCT post_url FROM DailyVideoHistory WHERE post_url IS NOT NULL;")
+    url_keys = [(url, POST_KEYS.post_key(url)) for (url,) in cur.fetchall()]
+    cur.execute("""
+        CREATE TEMP TABLE latest_post_keys (post_url TEXT PRIMARY KEY, post_key TEXT NOT NULL) ON COMMIT DROP;
+    """)
+    execute_values(cur, "INSERT INTO latest_post_keys (post_url, post_key) VALUES %s;", url_keys, page_size=1000)
+
+    cur.execute(f"""
+        WITH snapshots AS (
+            SELECT k.post_key, h.post_url, h.creator_username, COALESCE(h.marketing_associate, '') AS marketing_associate, h.app, h.caption,
+                   h.create_time, h.view_count, h.comment_count, h.num_likes, h.log_time
+            FROM DailyVideoHistory h
+            JOIN latest_post_keys k ON k.post_url = h.post_url
+            WHERE h.log_time IS NOT NULL
+        ),
+        latest AS (
+            SELECT DISTINCT ON (post_key, marketing_associate) *
+            FROM snapshots
+            ORDER BY post_key, marketing_associate, log_time DESC
+        ),
+        previous AS (
+            SELECT DISTINCT ON (s.post_key, s.marketing_associate)
+                s.post_key, s.marketing_associate, s.view_count, s.comment_count, s.num_likes, s.log_time
+            FROM snapshots s
+            JOIN latest l ON l.post_key = s.post_key AND l.marketing_associate = s.marketing_associate
+            WHERE s.log_time < l.log_time - make_interval(mins => {SAME_SCRAPE_MINUTES})
+            ORDER BY s.post_key, s.marketing_associate, s.log_time DESC
+        ),
+        first_seen AS (
+            SELECT post_key, marketing_associate, MIN(log_time) AS first_seen_at
+            FROM snapshots
+            GROUP BY post_key, marketing_associate
+        )
+        INSERT INTO LatestVideoMetrics ({LATEST_VIDEO_METRICS_COLUMNS},
+            previous_view_count, previous_comment_count, previous_likes, previous_seen_at)
+        SELECT l.post_key, l.post_url, l.creator_username, l.marketing_associate, l.app, l.caption, l.create_time,
+               l.view_count, l.comment_count, l.num_likes, f.first_seen_at, l.log_time,
+               p.view_count, p.comment_count, p.num_likes, p.log_time
+        FROM latest l
+        JOIN first_seen f ON f.post_key = l.post_key AND f.marketing_associate = l.marketing_associate
+        LEFT JOIN previous p ON p.post_key = l.post_key AND p.marketing_associate = l.marketing_associate
+        ON CONFLICT (post_key, marketing_associate) DO NOTHING;
+    """)
+    print(f"Backfilled LatestVideoMetrics: {cur.rowcount} posts")
+
+
+# ----------------------------
+# NORMALIZED STORAGE
+# Only a snapshot's three counters change from one scrape to the next, so a
+# post's identity and slow-changing fields (creator, app, caption, create time)
+# are stored once in Posts and each snapshot is a narrow VideoSnapshots row of
+# (id, post_id, log_time, view_count, comment_count, num_likes).
+# A post is a (post_url, marketing_associate) pair, the grain DailyVideoRollup
+# already uses; a missing url or associate is stored as ''.
+# DailyVideoData is a view joining the two back into the old columns, so
+# readers (the dashboard, DailyVideoHistory, trial upticks) don't change;
+# writes go through insert_snapshots.
+# Migration 13 only renames the old table; `python db_manager.py migrate` then
+# moves its rows over with normalize_snapshots, committing batch by batch, and
+# until it finishes the view reads both tables.
+# ----------------------------
+NORMALIZE_BATCH_SIZE = int(os.environ.get("NORMALIZE_BATCH_SIZE", "50000"))
+
+POSTS_ON_CONFLICT = """
+    ON CONFLICT (post_url, marketing_associate) DO UPDATE SET
+        creator_username = COALESCE(EXCLUDED.creator_username, p.creator_username),
+        app = COALESCE(EXCLUDED.app, p.app),
+        caption = COALESCE(EXCLUDED.caption, p.caption),
+        create_time = COALESCE(EXCLUDED.create_time, p.create_time)
+    -- Most snapshots change none of these; skip the write (and the dead tuple) for those
+    WHERE (p.creator_username, p.app, p.caption, p.create_time) IS DISTINCT FROM (
+        COALESCE(EXCLUDED.creator_username, p.creator_username), COALESCE(EXCLUDED.app, p.app),
+        COALESCE(EXCLUDED.caption, p.caption), COALESCE(EXCLUDED.create_time, p.create_time)
+    )
+"""
+
+DAILY_VIDEO_DATA_VIEW = """
+    -- The pre-normalization DailyVideoData, column for column
+    CREATE OR REPLACE VIEW DailyVideoData AS
+        SELECT s.id, p.post_url, p.creator_username, p.marketing_associate, p.app, s.view_count,
+               s.comment_count, p.caption, p.create_time, s.log_time, s.num_likes
+        FROM VideoSnapshots s
+        JOIN Posts p ON p.id = s.post_id;
+"""
+
+DAILY_VIDEO_DATA_NORMALIZING_VIEW = """
+    -- Until normalize_snapshots has moved every row, the ones still in the old table too
+    CREATE OR REPLACE VIEW DailyVideoData AS
+        SELECT s.id, p.post_url, p.creator_username, p.marketing_associate, p.app, s.view_count,
+               s.comment_count, p.caption, p.create_time, s.log_time, s.num_likes
+        FROM VideoSnapshots s
+        JOIN Posts p ON p.id = s.post_id
+        UNION ALL
+        SELECT id, post_url, creator_username, marketing_associate, app, view_count,
+               comment_count, caption, create_time, log_time, num_likes
+        FROM DailyVideoData_denormalized;
+"""
+
+
+def insert_snapshots(cur, rows):
+    """
+    Store DailyVideoData rows (insert_row's column order) as Posts + VideoSnapshots.
+    Returns the ids of the new snapshots.
+    """
+    # Last row wins per post; ON CONFLICT can't touch a row twice in one statement
+    posts = {}
+    for url, username, associate, app, _, _, caption, create_time, _, _ in rows:
+        posts[(url or "", associate or "")] = (username, app, caption, create_time)
+    # Upserted in key order so concurrent writers lock Posts rows in the same order
+    execute_values(
+        cur,
+        "INSERT INTO Posts AS p (post_url, marketing_associate, creator_username, app, caption, create_time) "
+        "VALUES %s" + POSTS_ON_CONFLICT + ";",
+        [key + fields for key, fields in sorted(posts.items())],
+        page_size=1000
+    )
+    post_ids = {
+        (url, associate): post_id
+        for post_id, url, associate in execute_values(cur, """
+            SELECT p.id, p.post_url, p.marketing_associate
+            FROM Posts p
+            JOIN (VALUES %s) AS batch (post_url, marketing_associate)
+              ON p.post_url = batch.post_url AND p.marketing_associate = batch.marketing_associate;
+        """, list(posts), page_size=1000, fetch=True)
+    }
+    snapshot_ids = execute_values(cur, """
+        INSERT INTO VideoSnapshots (post_id, log_time, view_count, comment_count, num_likes)
+        VALUES %s
+        RETURNING id;
+    """, [
+        (post_ids[(url or "", associate or "")], log_time, views, comments, likes)
+        for url, _, associate, _, views, comments, _, _, log_time, likes in rows
+    ], page_size=1000, fetch=True)
+    return [row[0] for row in snapshot_ids]
+
+
+def _normalize_daily_video_data(cur):
+    """
+    Create Posts + VideoSnapshots and switch DailyVideoData over to the view.
+    The old table is only renamed to DailyVideoData_denormalized and stays
+    visible through the view; normalize_snapshots moves its rows across in
+    batches outside this (single) migration transaction. Snapshot ids (and the
+    id sequence) carry over, so /api/videos cursors stay valid.
+    """
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = 'dailyvideodata';")
+    row = cur.fetchone()
+    if row and row[0] == "v":
+        return
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Posts (
+            id SERIAL PRIMARY KEY,
+            post_url TEXT NOT NULL,
+            marketing_associate TEXT NOT NULL DEFAULT '',
+            creator_username TEXT,
+            app TEXT,
+            caption TEXT,
+            create_time TIMESTAMP,
+            UNIQUE (post_url, marketing_associate)
+        );
+        CREATE INDEX IF NOT EXISTS idx_posts_creator_username ON Posts (creator_username);
+        CREATE INDEX IF NOT EXISTS idx_posts_marketing_associate ON Posts (marketing_associate);
+        CREATE INDEX IF NOT EXISTS idx_posts_app ON Posts (app);
+        CREATE INDEX IF NOT EXISTS idx_posts_create_date ON Posts ((DATE(create_time)));
+
+        CREATE TABLE IF NOT EXISTS VideoSnapshots (
+            id INTEGER NOT NULL DEFAULT nextval('dailyvideodata_id_seq'),
+            post_id INTEGER NOT NULL REFERENCES Posts (id),
+            log_time TIMESTAMP NOT NULL,
+            view_count INTEGER,
+            comment_count INTEGER,
+            num_likes INTEGER,
+            PRIMARY KEY (id, log_time)
+        ) PARTITION BY RANGE (log_time);
+        CREATE TABLE IF NOT EXISTS VideoSnapshots_default PARTITION OF VideoSnapshots DEFAULT;
+        CREATE INDEX IF NOT EXISTS idx_videosnapshots_post_id_log_time ON VideoSnapshots (post_id, log_time);
+        CREATE INDEX IF NOT EXISTS idx_videosnapshots_log_time_id ON VideoSnapshots (log_time, id);
+        CREATE INDEX IF NOT EXISTS idx_videosnapshots_log_date ON VideoSnapshots ((DATE(log_time)));
+    """)
+
+    # DailyVideoHistory depends on the table; it's recreated over the view below
+    cur.execute("DROP VIEW IF EXISTS DailyVideoHistory;")
+    cur.execute("ALTER TABLE DailyVideoData RENAME TO DailyVideoData_denormalized;")
+    # Keep the sequence when the old table goes
+    cur.execute("ALTER SEQUENCE dailyvideodata_id_seq OWNED BY VideoSnapshots.id;")
+
+    cur.execute("SELECT MIN(log_time), MIN(id) FROM DailyVideoData_denormalized;")
+    oldest, low = cur.fetchone()
+    if low is not None:
+        _create_partitions_since(cur, oldest)
+        cur.execute(DAILY_VIDEO_DATA_NORMALIZING_VIEW)
+    else:
+        # Nothing to move (e.g. a new database)
+        cur.execute("DROP TABLE DailyVideoData_denormalized;")
+        cur.execute(DAILY_VIDEO_DATA_VIEW)
+    cur.execute(DAILY_VIDEO_HISTORY_VIEW)
+
+
+def normalize_snapshots(conn, batch_size=NORMALIZE_BATCH_SIZE):
+    """
+    Move the rows left in DailyVideoData_denormalized into Posts + VideoSnapshots,
+    batch_size ids per transaction, then drop it and point the DailyVideoData view
+    at the new tables alone. Each batch deletes the rows it copied in the same
+    commit, so the view never shows a row twice and an interrupted backfill picks
+    up where it stopped. Returns the number of snapshots moved.
+    """
+    with conn.cursor() as cur:
+        # Session lock: batches commit as they go, and only one process may move rows
+        cur.execute("SELECT pg_try_advisory_lock(%s);", (NORMALIZE_LOCK_ID,))
+        locked = cur.fetchone()[0]
+    conn.commit()
+    if not locked:
+        print("DailyVideoData is being normalized by another process")
+        return 0
+
+    moved = 0
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('dailyvideodata_denormalized') IS NOT NULL;")
+                if not cur.fetchone()[0]:
+                    break
+                cur.execute("SELECT MIN(id) FROM DailyVideoData_denormalized;")
+                low = cur.fetchone()[0]
+                if low is None:
+                    cur.execute(DAILY_VIDEO_DATA_VIEW)
+                    cur.execute("DROP TABLE DailyVideoData_denormalized;")
+                    cur.execute("ANALYZE Posts; ANALYZE VideoSnapshots;")
+                    conn.commit()
+                    print("DailyVideoData is fully normalized")
+                    break
+
+                batch = {"start": low, "end": low + batch_size}
+                # A batch's post fields are newer than earlier batches' but older than anything the
+                # live writer stored since migration 13. Its snapshots are the only ones in
+                # VideoSnapshots with ids at or above the batch start (older rows still sit in the
+                # old table), so a post that has one keeps its fields.
+                cur.execute(f"""
+                    INSERT INTO Posts AS p (post_url, marketing_associate, creator_username, app, caption, create_time)
+                    SELECT DISTINCT ON (COALESCE(post_url, ''), COALESCE(marketing_associate, ''))
+                        COALESCE(post_url, ''), COALESCE(marketing_associate, ''), creator_username, app, caption, create_time
+                    FROM DailyVideoData_denormalized
+                    WHERE id >= %(start)s AND id < %(end)s
+                    ORDER BY COALESCE(post_url, ''), COALESCE(marketing_associate, ''), log_time DESC
+                    {POSTS_ON_CONFLICT}
+                    AND NOT EXISTS (SELECT 1 FROM VideoSnapshots s WHERE s.post_id = p.id AND s.id >= %(start)s);
+                """, batch)
+                cur.execute("""
+                    INSERT INTO VideoSnapshots (id, post_id, log_time, view_count, comment_count, num_likes)
+                    SELECT d.id, p.id, d.log_time, d.view_count, d.comment_count, d.num_likes
+                    FROM DailyVideoData_denormalized d
+                    JOIN Posts p
+                      ON p.post_url = COALESCE(d.post_url, '')
+                     AND p.marketing_associate = COALESCE(d.marketing_associate, '')
+                    WHERE d.id >= %(start)s AND d.id < %(end)s AND d.log_time IS NOT NULL;
+                """, batch)
+                copied = cur.rowcount
+                cur.execute("""
+                    DELETE FROM DailyVideoData_denormalized WHERE id >= %(start)s AND id < %(end)s;
+                """, batch)
+                deleted = cur.rowcount
+            conn.commit()
+            moved += copied
+            print(f"Normalized DailyVideoData ids {low}-{batch['end'] - 1}: {copied} snapshots")
+            if deleted > copied:
+                # VideoSnapshots is partitioned on log_time, which can't be NULL
+                print(f"  {deleted - copied} rows without a log_time were not carried over")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s);", (NORMALIZE_LOCK_ID,))
+        conn.commit()
+    return moved
+
+
+# ----------------------------
+# SCHEMA MIGRATIONS
+# Applied in version order, each exactly once, and recorded in SchemaMigrations.
+# Every statement is written to be safe to re-run (IF NOT EXISTS) so a database
+# created before the migration table existed is picked up without errors.
+# A migration is either SQL text or a function taking a cursor.
+# ----------------------------
+MIGRATIONS = [
+    (1, "create DailyVideoData", """
         CREATE TABLE IF NOT EXISTS DailyVideoData (
             id SERIAL PRIMARY KEY,
             post_url TEXT,
@@ -71,38 +887,863 @@ class DailyVideoDataDB:
             log_time TIMESTAMP,
             num_likes INTEGER
         );
-        """
+    """),
+    (2, "index DailyVideoData search and graph columns", DAILY_VIDEO_DATA_INDEXES),
+    (3, "partition DailyVideoData by month on log_time", _partition_daily_video_data),
+    (4, "create DailyVideoRollup and the DailyVideoHistory view", """
+        CREATE TABLE IF NOT EXISTS DailyVideoRollup (
+            post_url TEXT NOT NULL,
+            marketing_associate TEXT NOT NULL,
+            granularity TEXT NOT NULL,
+            bucket DATE NOT NULL,
+            creator_username TEXT,
+            app TEXT,
+            view_count INTEGER,
+            comment_count INTEGER,
+            caption TEXT,
+            create_time TIMESTAMP,
+            log_time TIMESTAMP,
+            num_likes INTEGER,
+            snapshots INTEGER,
+            PRIMARY KEY (post_url, marketing_associate, granularity, bucket)
+        );
+        CREATE INDEX IF NOT EXISTS idx_dailyvideorollup_post_url_log_time ON DailyVideoRollup (post_url, log_time);
+        CREATE INDEX IF NOT EXISTS idx_dailyvideorollup_creator_username ON DailyVideoRollup (creator_username);
+        CREATE INDEX IF NOT EXISTS idx_dailyvideorollup_marketing_associate ON DailyVideoRollup (marketing_associate);
+        CREATE INDEX IF NOT EXISTS idx_dailyvideorollup_app ON DailyVideoRollup (app);
+        CREATE INDEX IF NOT EXISTS idx_dailyvideorollup_create_date ON DailyVideoRollup ((DATE(create_time)));
+        CREATE INDEX IF NOT EXISTS idx_dailyvideorollup_log_date ON DailyVideoRollup ((DATE(log_time)));
+    """ + DAILY_VIDEO_HISTORY_VIEW),
+    (5, "index DailyVideoData for keyset pagination by log_time", """
+        CREATE INDEX IF NOT EXISTS idx_dailyvideodata_log_time_id ON DailyVideoData (log_time, id);
+    """),
+    (6, "create DailyTrialCounts maintained from NewTrials", _create_daily_trial_counts),
+    (7, "create ScrapeDeadLetters", """
+        CREATE TABLE IF NOT EXISTS ScrapeDeadLetters (
+            id SERIAL PRIMARY KEY,
+            post_url TEXT NOT NULL,
+            workbook TEXT NOT NULL,
+            tab TEXT NOT NULL,
+            row_number INTEGER,
+            error_class TEXT,
+            error_message TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            failed_runs INTEGER NOT NULL DEFAULT 1,
+            first_failed_at TIMESTAMP NOT NULL,
+            last_failed_at TIMESTAMP NOT NULL,
+            resolved_at TIMESTAMP
+        );
+        -- At most one open letter per url and tab; repeat failures update it
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_scrapedeadletters_open
+            ON ScrapeDeadLetters (post_url, workbook, tab) WHERE resolved_at IS NULL;
+    """),
+    (8, "create ScrapeRuns and the per-run progress ledger", """
+        CREATE TABLE IF NOT EXISTS ScrapeRuns (
+            id SERIAL PRIMARY KEY,
+            scope TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            finished_at TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_scraperuns_status_scope ON ScrapeRuns (status, scope);
+
+        -- Urls logged during a run, written in the same transaction as their DailyVideoData row
+        CREATE TABLE IF NOT EXISTS ScrapeRunUrls (
+            run_id INTEGER NOT NULL REFERENCES ScrapeRuns (id) ON DELETE CASCADE,
+            post_url TEXT NOT NULL,
+            view_count INTEGER,
+            completed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (run_id, post_url)
+        );
+
+        -- Tabs whose view column has been written back during a run
+        CREATE TABLE IF NOT EXISTS ScrapeRunTabs (
+            run_id INTEGER NOT NULL REFERENCES ScrapeRuns (id) ON DELETE CASCADE,
+            workbook TEXT NOT NULL,
+            tab TEXT NOT NULL,
+            completed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (run_id, workbook, tab)
+        );
+    """),
+    (9, "create ScrapeWorkItems queue for multi-worker runs", """
+        CREATE TABLE IF NOT EXISTS ScrapeWorkItems (
+            id SERIAL PRIMARY KEY,
+            run_id INTEGER NOT NULL REFERENCES ScrapeRuns (id) ON DELETE CASCADE,
+            project TEXT NOT NULL,
+            associate TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            leased_by TEXT,
+            lease_expires_at TIMESTAMP,
+            last_error TEXT,
+            finished_at TIMESTAMP,
+            UNIQUE (run_id, project, associate)
+        );
+        CREATE INDEX IF NOT EXISTS idx_scrapeworkitems_run_status ON ScrapeWorkItems (run_id, status);
+    """),
+    (10, "store the instrumentation summary of each scrape run", """
+        -- {worker id: StageStats.summary()}; one entry per process that worked on the run
+        ALTER TABLE ScrapeRuns ADD COLUMN IF NOT EXISTS summary JSONB;
+        CREATE INDEX IF NOT EXISTS idx_scraperuns_started_at ON ScrapeRuns (started_at);
+    """),
+    (11, "create TrialTriggerEvents, VideoMetricDeltas and the delta engine watermark", """
+        CREATE TABLE IF NOT EXISTS TrialTriggerEvents (
+            id SERIAL PRIMARY KEY,
+            app TEXT NOT NULL,
+            event_time TIMESTAMP NOT NULL,
+            current_delta INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_trialtriggerevents_event_time ON TrialTriggerEvents (event_time);
+        CREATE INDEX IF NOT EXISTS idx_trialtriggerevents_app_event_time ON TrialTriggerEvents (app, event_time);
+
+        CREATE TABLE IF NOT EXISTS VideoMetricDeltas (
+            id SERIAL PRIMARY KEY,
+            trial_trigger_event_id INTEGER NOT NULL REFERENCES TrialTriggerEvents (id) ON DELETE CASCADE,
+            post_url TEXT,
+            creator_username TEXT,
+            marketing_associate TEXT,
+            old_view_count INTEGER,
+            new_view_count INTEGER,
+            delta_views INTEGER,
+            old_comment_count INTEGER,
+            new_comment_count INTEGER,
+            delta_comments INTEGER,
+            old_likes INTEGER,
+            new_likes INTEGER,
+            delta_likes INTEGER
+        );
+        -- /video_metrics/<event_id> sort key, filled in by Postgres for existing rows too,
+        -- so the detail page is one index range read in display order
+        ALTER TABLE VideoMetricDeltas ADD COLUMN IF NOT EXISTS net_delta BIGINT GENERATED ALWAYS AS (
+            COALESCE(delta_views, 0)::BIGINT + COALESCE(delta_comments, 0) + COALESCE(delta_likes, 0)
+        ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_videometricdeltas_event_net_delta
+            ON VideoMetricDeltas (trial_trigger_event_id, net_delta DESC, id);
+
+        -- Last day each incremental job has processed
+        CREATE TABLE IF NOT EXISTS DeltaEngineWatermarks (
+            name TEXT PRIMARY KEY,
+            watermark DATE NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """),
+    (12, "create LatestVideoMetrics and backfill it from the snapshot log", _create_latest_video_metrics),
+    (13, "normalize DailyVideoData into Posts and VideoSnapshots", _normalize_daily_video_data),
+    (14, "index LatestVideoMetrics captions and creators for text search", """
+        -- Dashboard /search: substring (ILIKE) and fuzzy (% / <%) matching
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_latestvideometrics_caption_trgm
+            ON LatestVideoMetrics USING GIN (caption gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_latestvideometrics_creator_username_trgm
+            ON LatestVideoMetrics USING GIN (creator_username gin_trgm_ops);
+
+        -- Dashboard /search: full-text matching on captions, ranked with ts_rank_cd
+        ALTER TABLE LatestVideoMetrics ADD COLUMN IF NOT EXISTS caption_tsv TSVECTOR GENERATED ALWAYS AS (
+            to_tsvector('english', COALESCE(caption, ''))
+        ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_latestvideometrics_caption_tsv ON LatestVideoMetrics USING GIN (caption_tsv);
+    """),
+    (15, "index VideoSnapshots for keyset pagination by counts", """
+        -- /api/videos sort keys: Website/server.py SORT_EXPRESSIONS with id as the tie-breaker
+        -- (id and log_time are covered by the primary key and idx_videosnapshots_log_time_id)
+        CREATE INDEX IF NOT EXISTS idx_videosnapshots_views_id ON VideoSnapshots ((COALESCE(view_count, -1)), id);
+        CREATE INDEX IF NOT EXISTS idx_videosnapshots_comments_id ON VideoSnapshots ((COALESCE(comment_count, -1)), id);
+        CREATE INDEX IF NOT EXISTS idx_videosnapshots_likes_id ON VideoSnapshots ((COALESCE(num_likes, -1)), id);
+    """),
+]
+
+# Arbitrary constants; serialize concurrent workers/dynos running migrations at startup
+# starting (or joining) a scrape run, and normalizing DailyVideoData
+MIGRATION_LOCK_ID = 8174201
+RUN_LOCK_ID = 8174202
+NORMALIZE_LOCK_ID = 8174203
+
+
+def apply_migrations(conn):
+    """
+    Apply any pending MIGRATIONS on conn in one transaction.
+    Returns the list of versions that were applied.
+    """
+    applied_now = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS SchemaMigrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMP DEFAULT NOW()
+                );
+            """)
+            cur.execute("SELECT version FROM SchemaMigrations;")
+            applied = {row[0] for row in cur.fetchall()}
+
+            for version, description, migration in MIGRATIONS:
+                if version in applied:
+                    continue
+                print(f"Applying migration {version}: {description}")
+                if callable(migration):
+                    migration(cur)
+                else:
+                    cur.execute(migration)
+                cur.execute(
+                    "INSERT INTO SchemaMigrations (version, description) VALUES (%s, %s);",
+                    (version, description)
+                )
+                applied_now.append(version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied_now
+
+
+# Database operations class
+class DailyVideoDataDB:
+    # Migrations only need to run once per process
+    _table_ready = False
+    _table_lock = Lock()
+
+    def __init__(self):
+        self.db_pool = DatabasePool()
+
+    def ensure_table_exists(self, force=False):
+        """Create DailyVideoData and apply any pending schema migrations."""
+        with DailyVideoDataDB._table_lock:
+            if DailyVideoDataDB._table_ready and not force:
+                return
+            with self.db_pool.get_connection() as conn:
+                apply_migrations(conn)
+            self.ensure_partitions()
+            DailyVideoDataDB._table_ready = True
+
+    def pending_migrations(self):
+        """Versions in MIGRATIONS not yet applied, read without changing anything."""
         with self.db_pool.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(create_table_query)
-            conn.commit()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass('schemamigrations') IS NOT NULL;")
+                    applied = set()
+                    if cur.fetchone()[0]:
+                        cur.execute("SELECT version FROM SchemaMigrations;")
+                        applied = {row[0] for row in cur.fetchall()}
+            finally:
+                conn.rollback()
+        return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+    def normalize_snapshots(self, batch_size=NORMALIZE_BATCH_SIZE):
+        """Finish moving DailyVideoData rows into Posts + VideoSnapshots; see normalize_snapshots."""
+        with self.db_pool.get_connection() as conn:
+            return normalize_snapshots(conn, batch_size)
+
+    def ensure_partitions(self, months_ahead=2):
+        """Make sure the upcoming monthly partitions exist."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    ensure_partitions(cur, months_ahead)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def refresh_trial_counts(self, days=None):
+        """(Re)install the NewTrials trigger and re-aggregate the last `days` days of trials."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    ensure_trial_count_trigger(cur)
+                    written = refresh_trial_counts(cur, days)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return written
+
+    def compute_trial_upticks(self, threshold, window_days=14, since_days=30):
+        """Detect new trial upticks and write their VideoMetricDeltas; see compute_trial_upticks."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    event_ids = compute_trial_upticks(cur, threshold, window_days, since_days)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return event_ids
+
+    def rollup(self, retention_days=90, granularity="day"):
+        """Compact partitions older than retention_days into DailyVideoRollup; see rollup_partitions."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    dropped = rollup_partitions(cur, retention_days, granularity)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return dropped
 
     def insert_row(self, url, username, associate, app, view_count, comment_count, caption, created_at, insert_time, num_likes):
         """
         Insert a new video record
         Returns: The ID of the inserted record
         """
+        row = (url, username, associate, app, view_count, comment_count, caption, created_at, insert_time, num_likes)
+
+        with self.db_pool.get_connection() as conn:
+            with conn.cursor() as cur:
+                view_id = insert_snapshots(cur, [row])[0]
+                upsert_latest_metrics(cur, [row])
+                conn.commit()
+                return view_id
+
+    def get_refresh_stats(self, urls=None, since_days=None, lookback_days=7):
+        """
+        Latest snapshot and growth window per post, for refresh_policy.
+        Pass urls to look up specific posts, or since_days for every post logged recently.
+        Returns {post_url: {last_log_time, last_views, create_time, past_log_time, past_views}}
+        where past_* is the oldest snapshot within lookback_days of the latest one.
+        The latest snapshot comes from LatestVideoMetrics and the past one from a single
+        (post_url, log_time) index probe, so this reads a few rows per post whatever its history.
+        """
+        if urls is not None:
+            keys_by_url = {url: POST_KEYS.post_key(url) for url in urls if url}
+            where, params = "post_key = ANY(%s)", [list(set(keys_by_url.values()))]
+        else:
+            where, params = "last_seen_at >= NOW() - make_interval(days => %s)", [since_days or 14]
+
+        # A post tracked by several associates has a row each; the most recently logged one wins
+        query = f"""
+        SELECT l.post_key, l.post_url, l.last_seen_at, l.view_count, l.create_time, p.log_time, p.view_count
+        FROM (
+            SELECT DISTINCT ON (post_key) post_key, post_url, last_seen_at, view_count, create_time
+            FROM LatestVideoMetrics
+            WHERE {where}
+            ORDER BY post_key, last_seen_at DESC
+        ) l
+        LEFT JOIN LATERAL (
+            SELECT d.log_time, d.view_count
+            FROM DailyVideoData d
+            WHERE d.post_url = l.post_url
+              AND d.log_time >= l.last_seen_at - make_interval(days => %s)
+            ORDER BY d.log_time ASC
+            LIMIT 1
+        ) p ON TRUE;
+        """
+
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query, params + [lookback_days])
+                    rows = cur.fetchall()
+            finally:
+                conn.rollback()
+
+        stats_by_key = {
+            row[0]: (row[1], {
+                "last_log_time": row[2],
+                "last_views": row[3],
+                "create_time": row[4],
+                "past_log_time": row[5],
+                "past_views": row[6]
+            })
+            for row in rows
+        }
+        if urls is None:
+            return dict(stats_by_key.values())
+        # Keyed by the urls asked for, which may be other variants of the stored post_url
+        return {
+            url: stats_by_key[key][1]
+            for url, key in keys_by_url.items()
+            if key in stats_by_key
+        }
+
+    def get_latest_metrics(self, urls):
+        """
+        LatestVideoMetrics rows for urls, matched by post key so any variant of a post's url finds it.
+        Returns {url: [{column: value}, one per associate tracking the post, most recently logged first]}.
+        """
+        keys_by_url = {url: POST_KEYS.post_key(url) for url in urls if url}
+        rows_by_key = {}
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT * FROM LatestVideoMetrics WHERE post_key = ANY(%s) ORDER BY last_seen_at DESC;",
+                        (list(set(keys_by_url.values())),)
+                    )
+                    columns = [desc[0] for desc in cur.description]
+                    for row in cur.fetchall():
+                        record = dict(zip(columns, row))
+                        rows_by_key.setdefault(record["post_key"], []).append(record)
+            finally:
+                conn.rollback()
+        return {url: rows_by_key[key] for url, key in keys_by_url.items() if key in rows_by_key}
+
+    def insert_rows(self, rows, run_id=None):
+        """
+        Insert many video records (Posts + VideoSnapshots, see insert_snapshots) with one commit.
+        rows: tuples in the same column order as insert_row's arguments
+        run_id: also checkpoint the urls in that run's ScrapeRunUrls ledger, in the same transaction
+        LatestVideoMetrics is upserted in the same transaction too.
+        """
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    insert_snapshots(cur, rows)
+                    upsert_latest_metrics(cur, rows)
+                    if run_id is not None:
+                        # Last row wins if a url was logged twice in the batch
+                        views_by_url = {row[0]: row[4] for row in rows}
+                        execute_values(cur, """
+                            INSERT INTO ScrapeRunUrls (run_id, post_url, view_count) VALUES %s
+                            ON CONFLICT (run_id, post_url) DO UPDATE SET view_count = EXCLUDED.view_count;
+                        """, [(run_id, url, views) for url, views in views_by_url.items()], page_size=1000)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+
+    # ----------------------------
+    # DEAD LETTERS: urls whose scrape failed after retries
+    # ----------------------------
+    def add_dead_letters(self, rows):
+        """
+        rows: (post_url, workbook, tab, row_number, error_class, error_message, attempts, failed_at)
+        A url that is already dead-lettered for the tab has its error and counts updated.
+        """
         query = """
-        INSERT INTO DailyVideoData 
-        (post_url, creator_username, marketing_associate, app, view_count, comment_count, caption, create_time, log_time, num_likes)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        RETURNING id;
+        INSERT INTO ScrapeDeadLetters
+        (post_url, workbook, tab, row_number, error_class, error_message, attempts, first_failed_at, last_failed_at)
+        VALUES %s
+        ON CONFLICT (post_url, workbook, tab) WHERE resolved_at IS NULL DO UPDATE SET
+            row_number = EXCLUDED.row_number,
+            error_class = EXCLUDED.error_class,
+            error_message = EXCLUDED.error_message,
+            attempts = ScrapeDeadLetters.attempts + EXCLUDED.attempts,
+            failed_runs = ScrapeDeadLetters.failed_runs + 1,
+            last_failed_at = EXCLUDED.last_failed_at;
         """
-        
+        values = [row[:7] + (row[7], row[7]) for row in rows]
+
         with self.db_pool.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (
-                    url,
-                    username,
-                    associate,
-                    app,
-                    view_count,
-                    comment_count,
-                    caption,
-                    created_at,
-                    insert_time,
-                    num_likes
-                ))
-                view_id = cur.fetchone()[0]
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, query, values)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def resolve_dead_letters(self):
+        """
+        Close every open letter whose url has been logged since it last failed.
+        Returns the number of letters resolved.
+        """
+        query = """
+        UPDATE ScrapeDeadLetters d
+        SET resolved_at = NOW()
+        WHERE d.resolved_at IS NULL
+          AND EXISTS (
+              SELECT 1 FROM DailyVideoData v
+              WHERE v.post_url = d.post_url AND v.log_time >= d.last_failed_at
+          );
+        """
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+                    resolved = cur.rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return resolved
+
+    def get_dead_letters(self, workbook=None):
+        """Open dead letters, optionally for one workbook title."""
+        query = """
+        SELECT post_url, workbook, tab, row_number, error_class, error_message, attempts, failed_runs, last_failed_at
+        FROM ScrapeDeadLetters
+        WHERE resolved_at IS NULL AND (%s IS NULL OR workbook = %s)
+        ORDER BY workbook, tab, row_number;
+        """
+        columns = ["post_url", "workbook", "tab", "row_number", "error_class", "error_message",
+                   "attempts", "failed_runs", "last_failed_at"]
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query, (workbook, workbook))
+                    rows = cur.fetchall()
+            finally:
+                conn.rollback()
+        return [dict(zip(columns, row)) for row in rows]
+
+
+    # ----------------------------
+    # SCRAPE RUNS AND THEIR PROGRESS LEDGER
+    # ----------------------------
+    def start_run(self, scope, resume_within_hours=20):
+        """
+        Resume the latest unfinished run with the same scope started within
+        resume_within_hours, or start a new one (resume_within_hours=0 always starts new).
+        Older unfinished runs for the scope are marked abandoned.
+        Returns (run_id, resumed).
+        """
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    # Workers starting together must all join the same run
+                    cur.execute("SELECT pg_advisory_xact_lock(%s);", (RUN_LOCK_ID,))
+                    cur.execute("""
+                        UPDATE ScrapeRuns SET status = 'abandoned'
+                        WHERE status = 'running' AND scope = %s
+                          AND started_at < NOW() - make_interval(hours => %s);
+                    """, (scope, resume_within_hours))
+                    cur.execute("""
+                        SELECT id FROM ScrapeRuns
+                        WHERE status = 'running' AND scope = %s
+                        ORDER BY id DESC LIMIT 1;
+                    """, (scope,))
+                    row = cur.fetchone()
+                    if row:
+                        run_id, resumed = row[0], True
+                    else:
+                        cur.execute("INSERT INTO ScrapeRuns (scope) VALUES (%s) RETURNING id;", (scope,))
+                        run_id, resumed = cur.fetchone()[0], False
                 conn.commit()
-                return view_id
\ No newline at end of file
+            except Exception:
+                conn.rollback()
+                raise
+        return run_id, resumed
+
+    def get_run_progress(self, run_id):
+        """Returns ({(workbook, tab)} written back, {post_url: view_count} logged) for a run."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT workbook, tab FROM ScrapeRunTabs WHERE run_id = %s;", (run_id,))
+                    tabs = {(row[0], row[1]) for row in cur.fetchall()}
+                    cur.execute("SELECT post_url, view_count FROM ScrapeRunUrls WHERE run_id = %s;", (run_id,))
+                    urls = dict(cur.fetchall())
+            finally:
+                conn.rollback()
+        return tabs, urls
+
+    def record_run_tabs(self, run_id, workbook, tabs):
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, """
+                        INSERT INTO ScrapeRunTabs (run_id, workbook, tab) VALUES %s
+                        ON CONFLICT DO NOTHING;
+                    """, [(run_id, workbook, tab) for tab in tabs])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def finish_run(self, run_id, worker_id=None, summary=None):
+        """Mark a run finished, merging this worker's instrumentation summary into ScrapeRuns.summary."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE ScrapeRuns
+                        SET status = 'finished', finished_at = NOW(),
+                            summary = CASE WHEN %s::jsonb IS NULL THEN summary
+                                           ELSE COALESCE(summary, '{}'::jsonb) || jsonb_build_object(%s::text, %s::jsonb)
+                                      END
+                        WHERE id = %s;
+                    """, (summary, worker_id, summary, run_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+
+    # ----------------------------
+    # WORK QUEUE: (project, associate) workbooks of a run, leased to workers
+    # ----------------------------
+    def enqueue_work_items(self, run_id, workbooks):
+        """workbooks: [(project, associate)]. Items already queued for the run are left alone."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, """
+                        INSERT INTO ScrapeWorkItems (run_id, project, associate) VALUES %s
+                        ON CONFLICT (run_id, project, associate) DO NOTHING;
+                    """, [(run_id, project, associate) for project, associate in workbooks])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def claim_work_item(self, run_id, worker_id, lease_seconds, max_attempts):
+        """
+        Lease the next pending item, or one whose lease expired (its worker died).
+        SKIP LOCKED lets concurrent workers claim different items without waiting on each other.
+        Returns {id, project, associate, attempts} or None when nothing is claimable.
+        """
+        query = """
+        UPDATE ScrapeWorkItems
+        SET status = 'leased', leased_by = %s, attempts = attempts + 1,
+            lease_expires_at = NOW() + make_interval(secs => %s)
+        WHERE id = (
+            SELECT id FROM ScrapeWorkItems
+            WHERE run_id = %s
+              AND attempts < %s
+              AND (status = 'pending' OR (status = 'leased' AND lease_expires_at < NOW()))
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, project, associate, attempts;
+        """
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    # A lease that expired on its last attempt won't be claimed again
+                    cur.execute("""
+                        UPDATE ScrapeWorkItems
+                        SET status = 'failed', finished_at = NOW(),
+                            last_error = COALESCE(last_error, 'lease expired')
+                        WHERE run_id = %s AND status = 'leased'
+                          AND lease_expires_at < NOW() AND attempts >= %s;
+                    """, (run_id, max_attempts))
+                    cur.execute(query, (worker_id, lease_seconds, run_id, max_attempts))
+                    row = cur.fetchone()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "project": row[1], "associate": row[2], "attempts": row[3]}
+
+    def renew_work_item(self, item_id, worker_id, lease_seconds):
+        """Extend a lease this worker still holds. Returns False if it was lost."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE ScrapeWorkItems SET lease_expires_at = NOW() + make_interval(secs => %s)
+                        WHERE id = %s AND leased_by = %s AND status = 'leased';
+                    """, (lease_seconds, item_id, worker_id))
+                    renewed = cur.rowcount == 1
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return renewed
+
+    def finish_work_item(self, item_id, worker_id, error=None, max_attempts=3):
+        """
+        Mark an item done, or on error put it back for another attempt
+        ('failed' once it has used max_attempts).
+        """
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    if error is None:
+                        cur.execute("""
+                            UPDATE ScrapeWorkItems
+                            SET status = 'done', finished_at = NOW(), lease_expires_at = NULL
+                            WHERE id = %s AND leased_by = %s;
+                        """, (item_id, worker_id))
+                    else:
+                        cur.execute("""
+                            UPDATE ScrapeWorkItems
+                            SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                                last_error = %s, lease_expires_at = NULL,
+                                finished_at = CASE WHEN attempts >= %s THEN NOW() END
+                            WHERE id = %s AND leased_by = %s;
+                        """, (max_attempts, error, max_attempts, item_id, worker_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def count_open_work_items(self, run_id, max_attempts):
+        """Items of a run that are pending, leased, or expired and still retryable."""
+        with self.db_pool.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT COUNT(*) FROM ScrapeWorkItems
+                        WHERE run_id = %s
+                          AND (status = 'leased' OR (status = 'pending' AND attempts < %s));
+                    """, (run_id, max_attempts))
+                    count = cur.fetchone()[0]
+            finally:
+                conn.rollback()
+        return count
+
+
+# Buffered writer for the scraper
+class DailyVideoDataWriter:
+    """
+    Accumulates DailyVideoData rows and writes them with insert_rows once
+    batch_size rows are buffered or flush_interval seconds have passed.
+    Thread-safe; call flush() before the process exits.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=30, stats=None):
+        self.db = None  # created on first flush so constructing a writer doesn't open the pool
+        self.stats = stats  # optional scheduler.StageStats; inserts are recorded as "db_insert"
+        self.run_id = None  # when set, flushed urls are checkpointed in that run's ledger
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._last_flush = time.monotonic()
+        self.rows_written = 0
+        self.rows_dropped = 0
+
+    @property
+    def pending(self):
+        """Rows buffered but not yet stored, including any a failed flush put back."""
+        with self._lock:
+            return len(self._rows)
+
+    def ensure_schema(self):
+        if self.db is None:
+            self.db = DailyVideoDataDB()
+        self.db.ensure_table_exists()
+
+    def add(self, url, username, associate, app, view_count, comment_count, caption, created_at, insert_time, num_likes):
+        with self._lock:
+            self._rows.append((
+                url,
+                username,
+                associate,
+                app,
+                view_count,
+                comment_count,
+                caption,
+                created_at,
+                insert_time,
+                num_likes
+            ))
+            due = (
+                len(self._rows) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self, timeout=None):
+        """
+        Write every buffered row. Rows that fail on their own (see _write) are
+        dropped; on any other failure they go back into the buffer so the next
+        flush (or the exit flush) retries them.
+        timeout: give up (returning 0) if another flush is still running after
+        this many seconds, e.g. from a signal handler that may have interrupted it.
+        Returns the number of rows written.
+        """
+        if not self._flush_lock.acquire(timeout=-1 if timeout is None else timeout):
+            print(f"Skipped flushing {self.pending} rows: another flush is still running")
+            return 0
+        try:
+            return self._flush_buffered()
+        finally:
+            self._flush_lock.release()
+
+    def _flush_buffered(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._last_flush = time.monotonic()
+        if not rows:
+            return 0
+
+        start = time.monotonic()
+        dropped = self.rows_dropped
+        try:
+            self.ensure_schema()
+            unwritten = self._write(rows)
+        except Exception as e:
+            print(f"Error flushing {len(rows)} rows into DailyVideoData: {e}")
+            unwritten = rows
+        if unwritten:
+            with self._lock:
+                self._rows = unwritten + self._rows
+
+        written = len(rows) - len(unwritten) - (self.rows_dropped - dropped)
+        if self.stats is not None:
+            failed = bool(unwritten) or self.rows_dropped > dropped
+            self.stats.record("db_insert", time.monotonic() - start, items=len(rows), error=failed)
+
+        self.rows_written += written
+        if written:
+            print(f"Inserted {written} records into DailyVideoData")
+        return written
+
+    def _write(self, rows):
+        """
+        insert_rows, splitting the batch in half on an error caused by the data
+        itself (a NUL in a caption, a count out of INTEGER range) so a bad row
+        only costs itself; a row that still fails alone is dropped.
+        Returns the rows left unwritten by any other error (e.g. a lost connection).
+        """
+        try:
+            self.db.insert_rows(rows, run_id=self.run_id)
+            return []
+        except (DataError, IntegrityError, ValueError) as e:
+            if len(rows) == 1:
+                print(f"Dropping DailyVideoData row for {rows[0][0]}: {e}")
+                self.rows_dropped += 1
+                return []
+            middle = len(rows) // 2
+            return self._write(rows[:middle]) + self._write(rows[middle:])
+        except Exception as e:
+            print(f"Error writing {len(rows)} rows into DailyVideoData: {e}")
+            return rows
+
+
+# ----------------------------
+# MAINTENANCE COMMANDS
+# python db_manager.py migrate [--batch-size 50000]   (also finishes normalizing DailyVideoData)
+# python db_manager.py partitions [--months-ahead 2]
+# python db_manager.py rollup [--retention-days 90] [--granularity day|week]
+# python db_manager.py trials [--days 3]
+# python db_manager.py deltas [--threshold 20] [--window-days 14] [--since-days 30]
+# ----------------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DailyVideoData maintenance")
+    parser.add_argument("command", choices=["migrate", "partitions", "rollup", "trials", "deltas"])
+    parser.add_argument("--months-ahead", type=int, default=2)
+    parser.add_argument("--retention-days", type=int, default=int(os.getenv("RAW_RETENTION_DAYS", "90")))
+    parser.add_argument("--granularity", choices=ROLLUP_GRANULARITIES, default=os.getenv("ROLLUP_GRANULARITY", "day"))
+    parser.add_argument("--days", type=int, default=None, help="trials: only re-aggregate the last N days")
+    parser.add_argument("--threshold", type=int, default=int(os.getenv("TRIAL_UPTICK_THRESHOLD", "20")),
+                        help="deltas: day-over-day rise in trials that counts as an uptick")
+    parser.add_argument("--window-days", type=int, default=int(os.getenv("TRIAL_UPTICK_WINDOW_DAYS", "14")),
+                        help="deltas: posts created this many days before an uptick are considered")
+    parser.add_argument("--since-days", type=int, default=30, help="deltas: where the first run starts")
+    parser.add_argument("--batch-size", type=int, default=NORMALIZE_BATCH_SIZE,
+                        help="migrate: DailyVideoData ids moved into Posts + VideoSnapshots per transaction")
+    args = parser.parse_args()
+
+    db = DailyVideoDataDB()
+    db.ensure_table_exists()
+
+    if args.command == "migrate":
+        moved = db.normalize_snapshots(args.batch_size)
+        print(f"Schema is up to date ({moved} snapshots normalized)")
+    elif args.command == "partitions":
+        db.ensure_partitions(args.months_ahead)
+        print(f"Partitions exist through {args.months_ahead} months ahead")
+    elif args.command == "rollup":
+        dropped = db.rollup(args.retention_days, args.granularity)
+        print(f"Rolled up and dropped {len(dropped)} partitions: {dropped}")
+    elif args.command == "trials":
+        written = db.refresh_trial_counts(args.days)
+        print(f"Refreshed {written} daily trial counts")
+    elif args.command == "deltas":
+        event_ids = db.compute_trial_upticks(args.threshold, args.window_days, args.since_days)
+        print(f"Recorded {len(event_ids)} new trial upticks")
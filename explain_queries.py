@@ -0,0 +1,114 @@
+"""
+Report EXPLAIN plans for the dashboard's (Website/server.py) DailyVideoData queries
+
+Each query is planned twice:
+  before -> index scans disabled for the transaction, i.e. the plan the table had
+            before the migration indexes existed
+  after  -> the planner's normal choice with the current indexes
+
+Usage:
+  python explain_queries.py            # EXPLAIN only
+  python explain_queries.py --analyze  # EXPLAIN (ANALYZE, BUFFERS), actually runs the queries
+"""
+
+import argparse
+import os
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables from a .env file
+load_dotenv()
+
+# (name, query, sample value key) -- kept in sync with Website/server.py
+SERVER_QUERIES = [
+    ("search_data post_url", "SELECT * FROM DailyVideoHistory WHERE post_url = %s ORDER BY log_time DESC LIMIT 51;", "post_url"),
+    ("graph (get_time_series, day)",
+     "SELECT DISTINCT ON (date_trunc('day', log_time)) date_trunc('day', log_time), view_count, num_likes, comment_count "
+     "FROM DailyVideoHistory WHERE post_url = %s ORDER BY date_trunc('day', log_time), log_time DESC;",
+     "post_url"),
+    ("search_data creator_username", "SELECT * FROM DailyVideoHistory WHERE creator_username = %s ORDER BY log_time DESC LIMIT 51;", "creator_username"),
+    ("search_data marketing_associate", "SELECT * FROM DailyVideoHistory WHERE marketing_associate = %s ORDER BY log_time DESC LIMIT 51;", "marketing_associate"),
+    ("search_data app", "SELECT * FROM DailyVideoHistory WHERE app = %s ORDER BY log_time DESC LIMIT 51;", "app"),
+    ("search_data create_time", "SELECT * FROM DailyVideoHistory WHERE DATE(create_time) = %s ORDER BY log_time DESC LIMIT 51;", "create_date"),
+    ("search_data log_time", "SELECT * FROM DailyVideoHistory WHERE DATE(log_time) = %s ORDER BY log_time DESC LIMIT 51;", "log_date"),
+    ("search_data latest post_url", "SELECT * FROM LatestVideoMetrics WHERE post_url = %s ORDER BY last_seen_at DESC LIMIT 51;", "post_url"),
+    ("search_data latest creator_username", "SELECT * FROM LatestVideoMetrics WHERE creator_username = %s ORDER BY last_seen_at DESC LIMIT 51;", "creator_username"),
+    ("search_data latest log_time", "SELECT * FROM LatestVideoMetrics WHERE DATE(last_seen_at) = %s ORDER BY last_seen_at DESC LIMIT 51;", "log_date"),
+    ("search_text creator_username contains",
+     "SELECT * FROM LatestVideoMetrics WHERE creator_username ILIKE '%%' || %s || '%%' LIMIT 51;", "creator_username"),
+    ("search_text creator_username fuzzy",
+     "SELECT * FROM LatestVideoMetrics WHERE creator_username %% %s LIMIT 51;", "creator_username"),
+    ("search_text caption fulltext",
+     "SELECT * FROM LatestVideoMetrics WHERE caption_tsv @@ websearch_to_tsquery('english', %s) LIMIT 51;",
+     "caption_word"),
+    ("api/videos sort view_count (next page)",
+     "SELECT * FROM DailyVideoData WHERE (COALESCE(view_count, -1), id) < (%s, 2147483647) "
+     "ORDER BY COALESCE(view_count, -1) DESC, id DESC LIMIT 51;",
+     "view_count"),
+]
+
+
+def sample_values(cur):
+    """Take realistic parameter values from the newest row."""
+    cur.execute("""
+        SELECT post_url, creator_username, marketing_associate, app, DATE(create_time), DATE(log_time),
+               COALESCE(view_count, -1), caption
+        FROM DailyVideoData
+        ORDER BY id DESC
+        LIMIT 1;
+    """)
+    row = cur.fetchone()
+    if row is None:
+        return None
+    keys = ["post_url", "creator_username", "marketing_associate", "app", "create_date", "log_date", "view_count"]
+    values = dict(zip(keys, row))
+    # Longest word of the caption, for the full-text search
+    values["caption_word"] = max((row[7] or "").split(), key=len, default="")
+    return values
+
+
+def explain(conn, query, params, analyze, disable_indexes):
+    prefix = "EXPLAIN (ANALYZE, BUFFERS)" if analyze else "EXPLAIN"
+    try:
+        with conn.cursor() as cur:
+            if disable_indexes:
+                cur.execute("SET LOCAL enable_indexscan = off;")
+                cur.execute("SET LOCAL enable_bitmapscan = off;")
+                cur.execute("SET LOCAL enable_indexonlyscan = off;")
+            cur.execute(f"{prefix} {query}", params)
+            return "\n".join(row[0] for row in cur.fetchall())
+    finally:
+        # Never keep anything an ANALYZE run may have touched, and drop the SET LOCALs
+        conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the dashboard queries before/after indexes")
+    parser.add_argument("--analyze", action="store_true", help="run EXPLAIN ANALYZE (executes the queries)")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+    try:
+        with conn.cursor() as cur:
+            values = sample_values(cur)
+        conn.rollback()
+        if values is None:
+            print("DailyVideoData is empty; nothing to plan.")
+            return
+
+        for name, query, value_key in SERVER_QUERIES:
+            params = (values[value_key],)
+            print(f"========== {name} ==========")
+            print(f"{query}  -- {params[0]!r}")
+            print("---- before (no index scans) ----")
+            print(explain(conn, query, params, args.analyze, disable_indexes=True))
+            print("---- after ----")
+            print(explain(conn, query, params, args.analyze, disable_indexes=False))
+            print()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Platform adapters
+
+Everything platform-specific about scraping a post lives on one adapter:
+  host_pattern / post_id_regex   precompiled URL matchers
+  actor_id                       the Apify actor that scrapes the platform
+  build_run_input(urls)          actor input for a batch of post URLs
+  parse_item(item)               dataset item -> the record we log
+  item_post_id / item_urls       what an item can be matched back to its input URL by
+
+PlatformRegistry picks the adapter for a URL with one precompiled alternation
+over every registered host pattern, resolves short links, and builds the
+canonical "<platform>:<post id>" key that batching, the scrape cache, dedup
+and dead letters all key on. Lookups are memoized per URL, since the same URL
+is looked up at every stage of a run.
+
+A new platform is a PlatformAdapter subclass plus PlatformRegistry.register
+(see YouTubeShortsAdapter).
+"""
+
+import re
+from datetime import datetime
+from threading import Lock
+from zoneinfo import ZoneInfo
+
+import requests
+
+
+def reformat_date_to_est(date_str, fmt="%Y-%m-%d %H:%M:%S"):
+    """
+    Converts an ISO 8601 UTC date string (ending in 'Z') into an EST formatted string.
+
+    Example:
+      "2024-10-22T18:09:31.000Z" -> "2024-10-22 14:09:31" (if EST is UTC-4 at that date)
+    """
+    if not date_str:
+        return None
+    # Replace trailing "Z" with "+00:00" so that Python can parse it as UTC.
+    if date_str.endswith("Z"):
+        date_str = date_str.replace("Z", "+00:00")
+    # Parse the ISO date (it will be timezone-aware)
+    dt = datetime.fromisoformat(date_str)
+    # Convert to Eastern Time
+    dt_est = dt.astimezone(ZoneInfo("America/New_York"))
+    return dt_est.strftime(fmt)
+
+
+SCHEME_REGEX = re.compile(r"^https?://", re.IGNORECASE)
+
+
+def normalize_post_url(url):
+    """
+    Normalizes a post URL so the same post compares equal regardless of
+    scheme, www./m. prefixes, query strings, fragments or trailing slashes.
+
+    Example:
+      "https://www.tiktok.com/@user/video/123?lang=en" -> "tiktok.com/@user/video/123"
+    """
+    if not url:
+        return ""
+    url = SCHEME_REGEX.sub("", url.strip())
+    url = url.split("#", 1)[0].split("?", 1)[0]
+    host, _, path = url.partition("/")
+    host = host.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = path.rstrip("/")
+    return f"{host}/{path}" if path else host
+
+
+# ----------------------------
+# ADAPTERS
+# ----------------------------
+class PlatformAdapter:
+    name = None                # "tiktok"; also the prefix of canonical keys
+    label = None               # "TikTok", for messages
+    actor_id = None
+    host_pattern = None        # regex source, searched anywhere in the URL
+    short_link_pattern = None  # regex source, matched at the start of the URL (scheme optional)
+    post_id_regex = None       # compiled; group 1 is the post ID
+
+    # Dataset item field -> record field
+    field_keys = {
+        "view_count": None,
+        "comment_count": None,
+        "likes_count": None,
+        "caption": None,
+        "created_at": None
+    }
+
+    def post_id(self, url):
+        """The post ID a URL carries, or None (e.g. for a short link)."""
+        if not url:
+            return None
+        match = self.post_id_regex.search(url)
+        return match.group(1) if match else None
+
+    def build_run_input(self, urls):
+        raise NotImplementedError
+
+    def item_post_id(self, item):
+        raise NotImplementedError
+
+    def item_urls(self, item):
+        raise NotImplementedError
+
+    def item_username(self, item):
+        raise NotImplementedError
+
+    def parse_item(self, item):
+        """
+        Pulls the fields we log out of a dataset item.
+        Returns a dict with view_count, comment_count, likes_count, caption, created_at and username.
+        """
+        keys = self.field_keys
+
+        caption = item.get(keys["caption"], None)
+        if caption is not None:
+            caption = caption.replace("\n", " ").replace("\r", " ")
+
+        return {
+            "view_count": item.get(keys["view_count"], 0),
+            "comment_count": item.get(keys["comment_count"], None),
+            "likes_count": item.get(keys["likes_count"], 0),
+            "caption": caption,
+            # Convert to EST with a consistent format
+            "created_at": reformat_date_to_est(item.get(keys["created_at"], None)),
+            "username": self.item_username(item)
+        }
+
+
+class TikTokAdapter(PlatformAdapter):
+    name = "tiktok"
+    label = "TikTok"
+    actor_id = "clockworks/free-tiktok-scraper"
+    host_pattern = r"tiktok"
+    short_link_pattern = r"vm\.tiktok\.com|vt\.tiktok\.com|(?:www\.)?tiktok\.com/t/"
+    post_id_regex = re.compile(r"/(?:video|photo)/(\d+)")
+    field_keys = {
+        "view_count": "playCount",
+        "comment_count": "commentCount",
+        "likes_count": "diggCount",
+        "caption": "text",
+        "created_at": "createTimeISO"
+    }
+
+    def build_run_input(self, urls):
+        return {
+            "excludePinnedPosts": True,
+            "postURLs": urls,
+            "resultsPerPage": 1,
+            "shouldDownloadCovers": False,
+            "shouldDownloadSlideshowImages": False,
+            "shouldDownloadSubtitles": False,
+            "shouldDownloadVideos": False,
+            "searchSection": "",
+            "maxProfilesPerQuery": 10
+        }
+
+    def item_post_id(self, item):
+        return item.get("id")
+
+    def item_urls(self, item):
+        return [item.get("webVideoUrl"), item.get("submittedVideoUrl"), item.get("inputUrl")]
+
+    def item_username(self, item):
+        return (item.get("authorMeta", {}) or {}).get("name", None)
+
+
+class InstagramAdapter(PlatformAdapter):
+    name = "instagram"
+    label = "Instagram"
+    actor_id = "apify/instagram-scraper"
+    host_pattern = r"instagram|instagr\.am"
+    short_link_pattern = r"instagr\.am"
+    post_id_regex = re.compile(r"/(?:p|reel|reels|tv)/([A-Za-z0-9_-]+)")
+    field_keys = {
+        "view_count": "videoPlayCount",
+        "comment_count": "commentsCount",
+        "likes_count": "likesCount",
+        "caption": "caption",
+        "created_at": "timestamp"
+    }
+
+    def build_run_input(self, urls):
+        return {
+            "addParentData": False,
+            "directUrls": urls,
+            "enhanceUserSearchWithFacebookPage": False,
+            "isUserReelFeedURL": False,
+            "isUserTaggedFeedURL": False,
+            "resultsLimit": 1,
+            "resultsType": "details",
+            "searchLimit": 1,
+            "searchType": "hashtag"
+        }
+
+    def item_post_id(self, item):
+        return item.get("shortCode")
+
+    def item_urls(self, item):
+        return [item.get("url"), item.get("inputUrl")]
+
+    def item_username(self, item):
+        return item.get("ownerUsername", None)
+
+
+class YouTubeShortsAdapter(PlatformAdapter):
+    """
+    Not registered by default (set YOUTUBE_SHORTS_ACTOR to enable it). Input and
+    field names follow streamers/youtube-scraper's output; check them against the
+    actor that is configured before turning it on.
+    """
+    name = "youtube"
+    label = "YouTube Shorts"
+    host_pattern = r"youtube\.com/shorts/|youtu\.be/"
+    post_id_regex = re.compile(r"(?:/shorts/|youtu\.be/)([A-Za-z0-9_-]{11})")
+    field_keys = {
+        "view_count": "viewCount",
+        "comment_count": "commentsCount",
+        "likes_count": "likes",
+        "caption": "title",
+        "created_at": "date"
+    }
+
+    def __init__(self, actor_id="streamers/youtube-scraper"):
+        self.actor_id = actor_id
+
+    def build_run_input(self, urls):
+        return {
+            "startUrls": [{"url": url} for url in urls],
+            "maxResults": 1,
+            "maxResultsShorts": 1
+        }
+
+    def item_post_id(self, item):
+        return item.get("id")
+
+    def item_urls(self, item):
+        return [item.get("url"), item.get("input")]
+
+    def item_username(self, item):
+        return item.get("channelUsername") or item.get("channelName")
+
+
+# ----------------------------
+# REGISTRY
+# ----------------------------
+class PlatformRegistry:
+    def __init__(self, adapters=()):
+        self._adapters = {}
+        self._lock = Lock()
+        # Memoized per URL; a URL's platform and key never change within a run
+        self._detected = {}
+        self._resolved = {}
+        self._canonical = {}
+        self._host_regex = None
+        self._short_link_regex = None
+        for adapter in adapters:
+            self.register(adapter)
+
+    def register(self, adapter):
+        with self._lock:
+            self._adapters[adapter.name] = adapter
+            # One alternation over every platform, the matching group names the platform
+            self._host_regex = re.compile(
+                "|".join(f"(?P<{a.name}>{a.host_pattern})" for a in self._adapters.values()),
+                re.IGNORECASE
+            )
+            short_links = [a.short_link_pattern for a in self._adapters.values() if a.short_link_pattern]
+            self._short_link_regex = (
+                re.compile(r"^(?:https?://)?(?:" + "|".join(short_links) + ")", re.IGNORECASE)
+                if short_links else None
+            )
+            self._detected.clear()
+            self._canonical.clear()
+
+    @property
+    def labels(self):
+        return " / ".join(adapter.label for adapter in self._adapters.values())
+
+    def get(self, name):
+        return self._adapters[name]
+
+    # ----------------------------
+    # URLS
+    # ----------------------------
+    def detect(self, url):
+        """The adapter for a URL, or None for an unsupported URL."""
+        try:
+            return self._detected[url]
+        except KeyError:
+            pass
+        match = self._host_regex.search(url) if url and self._host_regex else None
+        adapter = self._adapters[match.lastgroup] if match else None
+        self._detected[url] = adapter
+        return adapter
+
+    def group(self, urls):
+        """
+        Splits urls by platform in one pass, keeping their order.
+        Returns ({adapter: [urls]}, [unsupported urls]).
+        """
+        by_platform, unsupported = {}, []
+        for url in urls:
+            adapter = self.detect(url)
+            if adapter is None:
+                unsupported.append(url)
+            else:
+                by_platform.setdefault(adapter, []).append(url)
+        return by_platform, unsupported
+
+    def resolve(self, url):
+        """
+        Follows short links (vm./vt.tiktok.com, tiktok.com/t/, instagr.am) to the post URL.
+        Other URLs (and links that fail to resolve) come back unchanged. Resolutions are memoized.
+        """
+        if not url or self._short_link_regex is None or not self._short_link_regex.match(url):
+            return url
+        with self._lock:
+            if url in self._resolved:
+                return self._resolved[url]
+        try:
+            response = requests.get(url, allow_redirects=True, timeout=10, stream=True)
+            resolved = response.url
+            response.close()
+        except requests.RequestException as e:
+            print(f"Could not resolve short link {url}: {e}")
+            resolved = url
+        with self._lock:
+            self._resolved[url] = resolved
+        return resolved
+
+    def canonical_key(self, url):
+        """
+        Cache / dedup key for a post: "<platform>:<post id>" when the (resolved) URL
+        carries one, else its normalized URL.
+        """
+        try:
+            return self._canonical[url]
+        except KeyError:
+            pass
+        key = self.post_key(self.resolve(url), self.detect(url))
+        self._canonical[url] = key
+        return key
+
+    def post_key(self, url, adapter=None):
+        """
+        canonical_key without following short links, i.e. from the URL as given (no network).
+        This is the key stored in the database (LatestVideoMetrics.post_key).
+        """
+        adapter = adapter or self.detect(url)
+        post_id = adapter.post_id(url) if adapter else None
+        return f"{adapter.name}:{post_id}" if post_id else normalize_post_url(url)
+
+    # ----------------------------
+    # MATCHING DATASET ITEMS BACK TO INPUT URLS
+    # (actors don't preserve input order)
+    # ----------------------------
+    def url_match_keys(self, url, adapter):
+        """The keys an input URL (and its short-link resolution) can be matched on."""
+        keys = set()
+        for candidate in dict.fromkeys((url, self.resolve(url))):
+            keys.add(("url", normalize_post_url(candidate)))
+            post_id = adapter.post_id(candidate)
+            if post_id:
+                keys.add(("id", post_id))
+        return keys
+
+    def item_match_keys(self, item, adapter):
+        """
+        Every key a dataset item can be matched back to an input URL by:
+        its post ID and the normalized forms of the URLs the actor reports for it.
+        """
+        keys = set()
+        post_id = adapter.item_post_id(item)
+        if post_id:
+            keys.add(("id", str(post_id)))
+        for candidate in adapter.item_urls(item):
+            if candidate:
+                keys.add(("url", normalize_post_url(candidate)))
+                candidate_id = adapter.post_id(candidate)
+                if candidate_id:
+                    keys.add(("id", candidate_id))
+        return keys
+
+
+def default_registry(youtube_shorts_actor=None):
+    """TikTok and Instagram, plus YouTube Shorts when an actor for it is configured."""
+    adapters = [TikTokAdapter(), InstagramAdapter()]
+    if youtube_shorts_actor:
+        adapters.append(YouTubeShortsAdapter(youtube_shorts_actor))
+    return PlatformRegistry(adapters)
@@ -0,0 +1,144 @@
+"""
+Adaptive refresh policy for the scraper
+
+Decides from a post's DailyVideoData history whether it is worth another
+Apify actor run yet:
+  new        -> no history, always scraped
+  fresh      -> posted within fresh_age_hours, scraped every fresh_interval_hours
+  active     -> still growing (relative or absolute), scraped every active_interval_hours
+  plateaued  -> everything else, scraped every plateau_interval_hours
+
+Skipped rows get their last known view count written back to the sheet.
+
+Dry-run report of what a policy would save, from the posts logged recently:
+  python refresh_policy.py --report [--runs-per-day 1] [--plateau-interval-hours 168] ...
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+TIERS = ("new", "fresh", "active", "plateaued")
+
+
+class RefreshPolicy:
+    def __init__(self, fresh_age_hours=72, fresh_interval_hours=1, active_interval_hours=24,
+                 plateau_interval_hours=168, active_growth_rate=0.01, active_min_daily_views=100,
+                 slack_hours=2):
+        self.fresh_age = timedelta(hours=fresh_age_hours)
+        self.intervals = {
+            "new": timedelta(0),
+            "fresh": timedelta(hours=fresh_interval_hours),
+            "active": timedelta(hours=active_interval_hours),
+            "plateaued": timedelta(hours=plateau_interval_hours)
+        }
+        self.active_growth_rate = active_growth_rate
+        self.active_min_daily_views = active_min_daily_views
+        # Runs don't start at exactly the same time each day; without slack a
+        # daily post scraped at 02:05 yesterday would be skipped at 02:00 today
+        self.slack = timedelta(hours=slack_hours)
+
+    def daily_growth(self, stats):
+        """Views gained per day over the lookback window, or None without two snapshots."""
+        if not stats.get("past_log_time") or stats["past_log_time"] >= stats["last_log_time"]:
+            return None
+        days = (stats["last_log_time"] - stats["past_log_time"]).total_seconds() / 86400
+        return ((stats["last_views"] or 0) - (stats["past_views"] or 0)) / days
+
+    def tier(self, stats, now):
+        if not stats or not stats.get("last_log_time"):
+            return "new"
+
+        create_time = stats.get("create_time")
+        if create_time and now - create_time < self.fresh_age:
+            return "fresh"
+
+        growth = self.daily_growth(stats)
+        if growth is None:
+            # Only one snapshot to go on; keep it on the daily cadence until we know more
+            return "active"
+        last_views = stats["last_views"] or 0
+        if growth >= self.active_min_daily_views or (last_views and growth / last_views >= self.active_growth_rate):
+            return "active"
+        return "plateaued"
+
+    def should_refresh(self, stats, now):
+        """Returns (refresh?, tier)."""
+        tier = self.tier(stats, now)
+        if tier == "new":
+            return True, tier
+        return now - stats["last_log_time"] >= self.intervals[tier] - self.slack, tier
+
+    def calls_per_day(self, tier, runs_per_day):
+        """Actor calls per day for a post in `tier` when the scraper runs runs_per_day times."""
+        interval_hours = self.intervals[tier].total_seconds() / 3600
+        if interval_hours == 0:
+            return runs_per_day
+        return min(runs_per_day, 24 / interval_hours)
+
+
+def now_est():
+    """log_time is stored as naive Eastern time; compare against the same."""
+    return datetime.now(ZoneInfo("America/New_York")).replace(tzinfo=None)
+
+
+def plan(policy, urls, stats_by_url, now=None):
+    """
+    Split urls into (to_scrape, {skipped url: last known views}, {tier: count}).
+    """
+    now = now or now_est()
+    to_scrape, skipped = [], {}
+    tiers = dict.fromkeys(TIERS, 0)
+    for url in urls:
+        stats = stats_by_url.get(url)
+        refresh, tier = policy.should_refresh(stats, now)
+        tiers[tier] += 1
+        if refresh:
+            to_scrape.append(url)
+        else:
+            skipped[url] = stats["last_views"]
+    return to_scrape, skipped, tiers
+
+
+def report(policy, stats_by_url, runs_per_day=1, now=None):
+    """Print how many actor calls the policy would make vs scraping every post every run."""
+    now = now or now_est()
+    _, skipped, tiers = plan(policy, list(stats_by_url), stats_by_url, now)
+    baseline = len(stats_by_url) * runs_per_day
+    per_day = sum(policy.calls_per_day(tier, runs_per_day) * count for tier, count in tiers.items())
+
+    print("========== REFRESH POLICY DRY RUN ==========")
+    print(f"Posts considered: {len(stats_by_url)}")
+    for tier in TIERS:
+        print(f"  {tier:<10} {tiers[tier]}")
+    print(f"Next run: {len(stats_by_url) - len(skipped)} actor calls, {len(skipped)} skipped")
+    print(f"Per day at {runs_per_day} run(s)/day: ~{per_day:.0f} calls vs {baseline} today "
+          f"({(1 - per_day / baseline) * 100 if baseline else 0:.1f}% saved)")
+    print("============================================")
+
+
+if __name__ == "__main__":
+    from db_manager import DailyVideoDataDB
+
+    parser = argparse.ArgumentParser(description="Dry-run an adaptive refresh policy")
+    parser.add_argument("--report", action="store_true", required=True)
+    parser.add_argument("--since-days", type=int, default=14, help="posts logged in the last N days")
+    parser.add_argument("--runs-per-day", type=float, default=1)
+    parser.add_argument("--fresh-age-hours", type=float, default=72)
+    parser.add_argument("--fresh-interval-hours", type=float, default=1)
+    parser.add_argument("--active-interval-hours", type=float, default=24)
+    parser.add_argument("--plateau-interval-hours", type=float, default=168)
+    parser.add_argument("--active-growth-rate", type=float, default=0.01)
+    parser.add_argument("--active-min-daily-views", type=float, default=100)
+    args = parser.parse_args()
+
+    policy = RefreshPolicy(
+        fresh_age_hours=args.fresh_age_hours,
+        fresh_interval_hours=args.fresh_interval_hours,
+        active_interval_hours=args.active_interval_hours,
+        plateau_interval_hours=args.plateau_interval_hours,
+        active_growth_rate=args.active_growth_rate,
+        active_min_daily_views=args.active_min_daily_views
+    )
+    db = DailyVideoDataDB()
+    report(policy, db.get_refresh_stats(since_days=args.since_days), args.runs_per_day)
@@ -0,0 +1,94 @@
+"""
+Retry policy for Apify actor runs
+
+apify_client already retries individual HTTP requests; this covers the
+scrape as a whole, which can still fail after that (a run that ends
+FAILED / TIMED-OUT / ABORTED, a 429 or 5xx that outlasts the client's own
+retries, a dropped connection while streaming the dataset).
+
+Transient failures are retried with exponential backoff and full jitter.
+Anything else, or a transient failure on the last attempt, raises
+ScrapeFailed carrying the error class and attempt count, which is what ends
+up in the ScrapeDeadLetters table.
+"""
+
+import asyncio
+import random
+import time
+
+import httpx
+import requests
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ActorRunFailed(Exception):
+    """An actor run that finished without SUCCEEDED."""
+
+    def __init__(self, run):
+        self.status = (run or {}).get("status")
+        super().__init__(f"actor run {(run or {}).get('id')} finished with status {self.status}")
+
+
+class PostNotReturned(Exception):
+    """The actor run succeeded but returned nothing for the post (deleted, private, bad URL)."""
+
+
+class ScrapeFailed(Exception):
+    """A scrape that failed after retries."""
+
+    def __init__(self, error, attempts):
+        super().__init__(f"{type(error).__name__}: {error}")
+        self.error = error
+        self.error_class = type(error).__name__
+        self.attempts = attempts
+
+
+def is_transient(error):
+    if isinstance(error, ActorRunFailed):
+        return True
+    if isinstance(error, (httpx.TransportError, requests.ConnectionError, requests.Timeout)):
+        return True
+    # ApifyApiError (and gspread's APIError via .response) carry the HTTP status
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status in TRANSIENT_STATUS:
+        return True
+    # Partial JSON body from the API; apify_client retries these too
+    return type(error).__name__ == "InvalidResponseBodyError"
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=4, base_delay=5.0, max_delay=120.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """Full jitter: uniform over [0, min(max_delay, base_delay * 2^(attempt-1))]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, fn, description=""):
+        """Returns fn(), retrying transient errors. Raises ScrapeFailed once out of attempts."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if not is_transient(e) or attempt == self.max_attempts:
+                    raise ScrapeFailed(e, attempt) from e
+                delay = self.delay(attempt)
+                print(f"Transient error on {description} ({type(e).__name__}: {e}), "
+                      f"attempt {attempt}/{self.max_attempts}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def call_async(self, fn, description=""):
+        """call() for a coroutine function; sleeps without blocking the event loop."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await fn()
+            except Exception as e:
+                if not is_transient(e) or attempt == self.max_attempts:
+                    raise ScrapeFailed(e, attempt) from e
+                delay = self.delay(attempt)
+                print(f"Transient error on {description} ({type(e).__name__}: {e}), "
+                      f"attempt {attempt}/{self.max_attempts}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
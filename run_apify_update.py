@@ -1,45 +1,114 @@
+import argparse
+import asyncio
+import atexit
 import os
+import signal
+import subprocess
+import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import re
 from apify_client import ApifyClient
 import gspread
 from google.oauth2.service_account import Credentials
 from dotenv import load_dotenv
 from datetime import datetime
+from threading import Lock
 from zoneinfo import ZoneInfo
 
-from db_manager import DailyVideoDataDB
+from db_manager import DailyVideoDataDB, DailyVideoDataWriter, DatabasePool
+from platforms import default_registry
+from refresh_policy import RefreshPolicy, plan
+from run_ledger import RunLedger
+from retry_policy import ActorRunFailed, PostNotReturned, RetryPolicy, ScrapeFailed, is_transient
+from scheduler import ScrapeScheduler, StageStats, report_failed_writes
+from scrape_cache import ScrapeCache
+from sheets_io import SheetsIO
+from work_queue import WorkQueue, default_worker_id
 
 # Load environment variables from a .env file
 load_dotenv()
 
 # ----------------------------
 # Environment & Credentials Setup
+# Clients are built on first use, so importing this module (tests, the
+# benchmark, a single-url refresh) needs no credentials and opens no connections
 # ----------------------------
 
-SERVICE_ACCOUNT_INFO = {
-    "type": "service_account",
-    "project_id": os.environ.get("GCLOUD_PROJECT_ID"),
-    "private_key_id": os.environ.get("GCLOUD_PRIVATE_KEY_ID"),
-    "private_key": os.environ.get("GCLOUD_PRIVATE_KEY").replace("\\n", "\n"),
-    "client_email": os.environ.get("GCLOUD_CLIENT_EMAIL"),
-    "client_id": os.environ.get("GCLOUD_CLIENT_ID"),
-    "auth_uri": os.environ.get("GCLOUD_AUTH_URI"),
-    "token_uri": os.environ.get("GCLOUD_TOKEN_URI"),
-    "auth_provider_x509_cert_url": os.environ.get("GCLOUD_AUTH_PROVIDER_X509_CERT_URL"),
-    "client_x509_cert_url": os.environ.get("GCLOUD_CLIENT_X509_CERT_URL")
-}
+def service_account_info():
+    return {
+        "type": "service_account",
+        "project_id": os.environ.get("GCLOUD_PROJECT_ID"),
+        "private_key_id": os.environ.get("GCLOUD_PRIVATE_KEY_ID"),
+        "private_key": (os.environ.get("GCLOUD_PRIVATE_KEY") or "").replace("\\n", "\n"),
+        "client_email": os.environ.get("GCLOUD_CLIENT_EMAIL"),
+        "client_id": os.environ.get("GCLOUD_CLIENT_ID"),
+        "auth_uri": os.environ.get("GCLOUD_AUTH_URI"),
+        "token_uri": os.environ.get("GCLOUD_TOKEN_URI"),
+        "auth_provider_x509_cert_url": os.environ.get("GCLOUD_AUTH_PROVIDER_X509_CERT_URL"),
+        "client_x509_cert_url": os.environ.get("GCLOUD_CLIENT_X509_CERT_URL")
+    }
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive"
 ]
 
-credentials = Credentials.from_service_account_info(SERVICE_ACCOUNT_INFO, scopes=SCOPES)
-gs_client = gspread.authorize(credentials)
-
 APIFY_API_KEY = os.environ.get("APIFY_API_KEY")
-APIFY_CLIENT = ApifyClient(APIFY_API_KEY)
+
+_CLIENTS = {}
+_CLIENTS_LOCK = Lock()
+
+
+def _client(name, build):
+    with _CLIENTS_LOCK:
+        if name not in _CLIENTS:
+            _CLIENTS[name] = build()
+        return _CLIENTS[name]
+
+
+def get_sheets_client():
+    """The gspread client for the service account, authorized on first use."""
+    return _client("sheets", lambda: gspread.authorize(
+        Credentials.from_service_account_info(service_account_info(), scopes=SCOPES)
+    ))
+
+
+def get_apify_client():
+    return _client("apify", lambda: ApifyClient(APIFY_API_KEY))
+
+# RUN INSTRUMENTATION (see scheduler.StageStats)
+# Per-stage counts, error rates and p50/p95/max latencies for Apify, Sheets and DB calls,
+# printed at the end of a run and stored as JSON on its ScrapeRuns row
+RUN_STATS = StageStats()
+
+# BUFFERED DAILYVIDEODATA WRITES, flushed by size / age and once more on exit
+DB_BATCH_SIZE = int(os.environ.get("DB_BATCH_SIZE", "500"))
+DB_FLUSH_SECONDS = float(os.environ.get("DB_FLUSH_SECONDS", "30"))
+DB_WRITER = DailyVideoDataWriter(batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_SECONDS, stats=RUN_STATS)
+atexit.register(DB_WRITER.flush)
+
+# SCRAPE RESULT CACHE (see scrape_cache.py)
+# The same post in several workbooks/tabs is scraped once per SCRAPE_CACHE_TTL seconds;
+# set SCRAPE_CACHE_PATH to a SQLite file to keep results across restarts
+SCRAPE_CACHE = ScrapeCache(
+    ttl=float(os.environ.get("SCRAPE_CACHE_TTL", str(6 * 3600))),
+    sqlite_path=os.environ.get("SCRAPE_CACHE_PATH") or None
+)
+
+# ADAPTIVE REFRESH (see refresh_policy.py)
+# "adaptive" -> skip posts whose history says they don't need scraping yet
+# "all"      -> scrape every URL on every run
+REFRESH_MODE = os.environ.get("REFRESH_MODE", "adaptive").lower()
+REFRESH_POLICY = RefreshPolicy(
+    fresh_age_hours=float(os.environ.get("REFRESH_FRESH_AGE_HOURS", "72")),
+    fresh_interval_hours=float(os.environ.get("REFRESH_FRESH_INTERVAL_HOURS", "1")),
+    active_interval_hours=float(os.environ.get("REFRESH_ACTIVE_INTERVAL_HOURS", "24")),
+    plateau_interval_hours=float(os.environ.get("REFRESH_PLATEAU_INTERVAL_HOURS", "168"))
+)
+
+# PLATFORMS (see platforms.py)
+# URL matching, actor input and item parsing per platform; YouTube Shorts is
+# scraped only once YOUTUBE_SHORTS_ACTOR names an actor for it
+PLATFORMS = default_registry(youtube_shorts_actor=os.environ.get("YOUTUBE_SHORTS_ACTOR") or None)
 
 # APPS AND THE ASSOCIATED ASSOCIATES WITH INFLUENCER MANAGEMENT PAGES
 
@@ -75,45 +144,69 @@ URL_COL_LETTER = "G"
 URL_COL_NUM = 7
 
 VIEW_COL_LETTER = "H"
-
-# ----------------------------
-# HELPER FUNCTIONS
-# ----------------------------
-def reformat_date_to_est(date_str, fmt="%Y-%m-%d %H:%M:%S"):
-    """
-    Converts an ISO 8601 UTC date string (ending in 'Z') into an EST formatted string.
-    
-    Example:
-      "2024-10-22T18:09:31.000Z" -> "2024-10-22 14:09:31" (if EST is UTC-4 at that date)
-    """
-    if not date_str:
-        return None
-    # Replace trailing "Z" with "+00:00" so that Python can parse it as UTC.
-    if date_str.endswith("Z"):
-        date_str = date_str.replace("Z", "+00:00")
-    # Parse the ISO date (it will be timezone-aware)
-    dt = datetime.fromisoformat(date_str)
-    # Convert to Eastern Time
-    dt_est = dt.astimezone(ZoneInfo("America/New_York"))
-    return dt_est.strftime(fmt)
-# ----------------------------
-# ----------------------------
-
+VIEW_COL_NUM = 8
+
+# "Last updated" note goes on the view column header cell (H5)
+NOTE_ROW = START_ROW - 1
+
+# APIFY BATCHING
+# "off"      -> one actor run per URL
+# "tab"      -> one actor run per platform per BATCH_SIZE urls within a tab
+# "workbook" -> same, but URLs from every tab of a workbook are pooled together
+BATCH_MODE = os.environ.get("APIFY_BATCH_MODE", "tab").lower()
+BATCH_SIZE = int(os.environ.get("APIFY_BATCH_SIZE", "50"))
+
+# GLOBAL SCHEDULER CONCURRENCY
+# Sheets calls are bounded by the per-user quota, Apify calls by the account's concurrent run allowance
+SHEETS_CONCURRENCY = int(os.environ.get("SHEETS_CONCURRENCY", "4"))
+APIFY_CONCURRENCY = int(os.environ.get("APIFY_CONCURRENCY", "25"))
+
+# APIFY RETRIES (see retry_policy.py)
+# Transient failures (failed/timed-out runs, 429/5xx, dropped connections) are retried with
+# jittered exponential backoff; urls that still fail go to the ScrapeDeadLetters table
+APIFY_MAX_ATTEMPTS = int(os.environ.get("APIFY_MAX_ATTEMPTS", "4"))
+RETRY_POLICY = RetryPolicy(
+    max_attempts=APIFY_MAX_ATTEMPTS,
+    base_delay=float(os.environ.get("APIFY_RETRY_BASE_SECONDS", "5")),
+    max_delay=float(os.environ.get("APIFY_RETRY_MAX_SECONDS", "120"))
+)
+
+# CHECKPOINTED RUNS (see run_ledger.py)
+# An unfinished run started within RUN_RESUME_HOURS is resumed instead of starting over
+RUN_RESUME_HOURS = float(os.environ.get("RUN_RESUME_HOURS", "20"))
+RUN_LEDGER = None  # set by start_run for the orchestrated (all-workbook) runs
+
+# MULTI-WORKER RUNS (see work_queue.py)
+# A worker renews its lease while it works; an item whose lease lapses is handed to another worker
+WORK_LEASE_SECONDS = int(os.environ.get("WORK_LEASE_SECONDS", "600"))
+WORK_MAX_ATTEMPTS = int(os.environ.get("WORK_MAX_ATTEMPTS", "3"))
+WORK_POLL_SECONDS = float(os.environ.get("WORK_POLL_SECONDS", "15"))
+
+# SHEETS RATE LIMITING (see sheets_io.py)
+# The Sheets API allows 60 requests/minute per user; stay under it and back off on 429/5xx
+SHEETS_REQUESTS_PER_MINUTE = int(os.environ.get("SHEETS_REQUESTS_PER_MINUTE", "55"))
+SHEETS_MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", "6"))
+SHEETS = SheetsIO(requests_per_minute=SHEETS_REQUESTS_PER_MINUTE, max_retries=SHEETS_MAX_RETRIES, stats=RUN_STATS)
 
 # ----------------------------
 # Core Functionality
 #
-# orchestrate_all_scraping -> 
+# orchestrate_all_scraping -> ScrapeScheduler (scheduler.py) ->
+#   open_workbook -> list_tabs -> read_tabs -> hit_apify_many -> write_tab_results
+# (all Sheets calls go through SHEETS, see sheets_io.py)
+#
+# Single workbook:
 # run_individual_scrape ->
 # iterate_over_tabs ->
 # process_tab ->
-# hit_apify -> log
+# hit_apify_many -> hit_apify_batch / hit_apify -> log
 # ----------------------------
 
 
 # ----------------------------
 # LOGS DATA TO DATABASE
 # ----------------------------
+@RUN_STATS.timed("log")
 def log(url, username, associate, app, view_count, comment_count, caption, created_at, insert_time, likes_count):
     
     # log_message = (
@@ -131,383 +224,924 @@ def log(url, username, associate, app, view_count, comment_count, caption, creat
     # )
     # print(log_message)
 
-    db = DailyVideoDataDB()
-    db.ensure_table_exists()  # Make sure your table now includes a 'num_likes' column
+    # Rows are buffered and written in batches; see DailyVideoDataWriter
+    DB_WRITER.add(
+        url,
+        username,
+        associate,
+        app,
+        view_count,
+        comment_count,
+        caption,
+        created_at,
+        insert_time,
+        likes_count
+    )
+
+
+# ----------------------------
+# LOGS A PARSED RECORD FOR A URL UNDER A WORKBOOK'S APP / ASSOCIATE
+# ----------------------------
+def log_record(workbook, url, record):
+    parts = workbook.title.split()
+    log_record_as(parts[0] if parts else "", parts[-1] if parts else "", url, record)
+
+
+def log_record_as(app, associate, url, record):
+    insert_time = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
+
+    log(
+        url,
+        record["username"],
+        associate,
+        app,
+        record["view_count"],
+        record["comment_count"],
+        record["caption"],
+        record["created_at"],
+        insert_time,
+        record["likes_count"]
+    )
+
+
+# ----------------------------
+# SCRAPE FAILURES OF THIS RUN, BY CANONICAL POST KEY
+# Read back when the tab is written so the dead letter carries the error class and attempts
+# ----------------------------
+SCRAPE_FAILURES = {}
+SCRAPE_FAILURES_LOCK = Lock()
+
+
+def record_failure(url, failure):
+    with SCRAPE_FAILURES_LOCK:
+        SCRAPE_FAILURES[PLATFORMS.canonical_key(url)] = failure
+
+
+def scrape_failure(url):
+    with SCRAPE_FAILURES_LOCK:
+        return SCRAPE_FAILURES.get(PLATFORMS.canonical_key(url))
+
+
+# ----------------------------
+# RUNS THE ACTOR ONCE FOR A LIST OF URLS OF ONE PLATFORM
+# RETURNS THE DATASET ITEMS, RAISES ActorRunFailed IF THE RUN DIDN'T SUCCEED
+# ----------------------------
+def run_actor(platform, urls):
+    with RUN_STATS.timed("apify_actor", items=len(urls)):
+        run = get_apify_client().actor(platform.actor_id).call(run_input=platform.build_run_input(urls))
+        if not run or run.get("status") != "SUCCEEDED":
+            raise ActorRunFailed(run)
+    with RUN_STATS.timed("apify_dataset"):
+        return list(get_apify_client().dataset(run["defaultDatasetId"]).iterate_items())
+
+
+# ----------------------------
+# HITS APIFY API FOR MULTIPLE URLS OF ONE PLATFORM (see platforms.py)
+# RETURNS {url: views}, views is None FOR A URL WHOSE SCRAPE FAILED
+# RESULTS ARE MATCHED BACK TO THE INPUT URLS BY POST ID / NORMALIZED URL (the actor
+# does not preserve input order), URLS MISSING FROM A BATCH FALL BACK TO A SINGLE RUN
+# (unless the batch itself failed on a transient error after retries)
+# POSTS ALREADY IN SCRAPE_CACHE (or being fetched by another tab) ARE NOT RE-SCRAPED
+# ----------------------------
+def hit_apify_batch(workbook, urls, platform):
+    results = {}
+
+    def use_record(url, record):
+        log_record(workbook, url, record)
+        results[url] = record["view_count"]
+
+    # Split into cache hits, keys this call now owns, and keys another thread is fetching
+    owned = {}     # url -> cache key
+    waiting = []   # (url, future)
+    for url in dict.fromkeys(urls):
+        key = PLATFORMS.canonical_key(url)
+        record, future, owner = SCRAPE_CACHE.claim(key)
+        if record is not None:
+            use_record(url, record)
+        elif owner:
+            owned[url] = key
+        else:
+            waiting.append((url, future))
+
+    to_fetch = list(owned)
     try:
-        view_id = db.insert_row(
-            url, 
-            username, 
-            associate, 
-            app, 
-            view_count, 
-            comment_count, 
-            caption, 
-            created_at, 
-            insert_time,
-            likes_count   # New parameter for likes count
-        )
-        print(f"Inserted record with id: {view_id}")
-    except Exception as e:
-        print(f"Error inserting record into DailyVideoData: {e}")
-
-
-# ----------------------------
-# HITS APIFY API FOR MULTIPLE URLS (exlusively tiktok or exclusively insta)
-# RETURNS THE NUMBER OF VIEWS (list)
-# CALLS FUNCTION TO LOG FURTHER DATA TO DB FOR EACH
-# ----------------------------
-# def hit_apify_batch(workbook, urls, url_type):
-#     print("BATCH PROCESSING")
-#     try:
-#         # Prepare the actor input and select the actor based on URL type.
-#         if url_type == "tiktok":
-#             run_input = {
-#                 "excludePinnedPosts": True,
-#                 "postURLs": urls,  # Batch processing: list of URLs
-#                 "resultsPerPage": 1,
-#                 "shouldDownloadCovers": False,
-#                 "shouldDownloadSlideshowImages": False,
-#                 "shouldDownloadSubtitles": False,
-#                 "shouldDownloadVideos": False,
-#                 "searchSection": "",
-#                 "maxProfilesPerQuery": 10
-#             }
-#             actor_link = "clockworks/free-tiktok-scraper"
-#         elif url_type == "instagram":
-#             run_input = {
-#                 "addParentData": False,
-#                 "directUrls": urls,  # Batch processing: list of URLs
-#                 "enhanceUserSearchWithFacebookPage": False,
-#                 "isUserReelFeedURL": False,
-#                 "isUserTaggedFeedURL": False,
-#                 "resultsLimit": 1,
-#                 "resultsType": "details",
-#                 "searchLimit": 1,
-#                 "searchType": "hashtag"
-#             }
-#             actor_link = "apify/instagram-scraper"
-#         else:
-#             print(f"Unsupported url_type: {url_type}")
-#             return {url: 0 for url in urls}
-
-#         # Set keys based on URL type.
-#         if url_type == "tiktok":
-#             view_key = "playCount"
-#             timestamp_key = "createTimeISO"
-#             comment_key = "commentCount"
-#             caption_key = "text"
-#         elif url_type == "instagram":
-#             view_key = "videoPlayCount"
-#             timestamp_key = "timestamp"
-#             comment_key = "commentsCount"
-#             caption_key = "caption"
-
-#         # Run the actor with the batch input.
-#         run = APIFY_CLIENT.actor(actor_link).call(run_input=run_input)
-#         dataset_id = run.get("defaultDatasetId")
-        
-#         # Convert the dataset items into a list to preserve order.
-#         items = list(APIFY_CLIENT.dataset(dataset_id).iterate_items())
-#         results = {}
-        
-#         # Iterate over each input URL using its index.
-#         for idx, input_url in enumerate(urls):
-#             # Default values if no corresponding item is returned.
-#             view_count = 0
-#             created_at = None
-#             comment_count = None
-#             caption = None
-#             username = None
-
-#             # If an item exists at this index, extract the values.
-#             if idx < len(items):
-#                 item = items[idx]
-#                 view_count = item.get(view_key, 0)
-#                 raw_created_at = item.get(timestamp_key, None)
-#                 created_at = reformat_date_to_est(raw_created_at) if raw_created_at else None
-#                 comment_count = item.get(comment_key, None)
-#                 caption = item.get(caption_key, None)
-#                 if caption is not None:
-#                     caption = caption.replace("\n", " ").replace("\r", " ")
-#                 # Extract username.
-#                 if url_type == "tiktok":
-#                     author_meta = item.get("authorMeta", {})
-#                     username = author_meta.get("name", None)
-#                 else:
-#                     username = item.get("ownerUsername", None)
-
-#             # Extract app and associate from workbook.title.
-#             parts = workbook.title.split()
-#             app = parts[0] if parts else ""
-#             associate = parts[-1] if parts else ""
-#             insert_time = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
-
-#             # Log the details using the input URL.
-#             log(input_url, username, associate, app, view_count, comment_count, caption, created_at, insert_time)
-
-#             # Save the view count result keyed by the input URL.
-#             results[input_url] = view_count
-
-#         # Ensure every input URL is represented in the results.
-#         for url in urls:
-#             if url not in results:
-#                 results[url] = 0
-
-#         return results
-
-#     except Exception as e:
-#         print(f"Error processing batch for {url_type}: {str(e)}")
-#         return {url: 0 for url in urls}
-
-
-# ----------------------------
-# HITS APIFY API FOR A URL (for tiktok or insta)
-# RETURNS THE NUMBER OF VIEWS
+        for start in range(0, len(to_fetch), BATCH_SIZE):
+            chunk = to_fetch[start:start + BATCH_SIZE]
+            print(f"Batch of {len(chunk)} {platform.name} urls for {workbook.title}")
+
+            items, batch_failure = [], None
+            try:
+                items = RETRY_POLICY.call(
+                    lambda: run_actor(platform, chunk), f"{platform.name} batch for {workbook.title}"
+                )
+            except ScrapeFailed as e:
+                print(f"Error processing {platform.name} batch for {workbook.title} after {e.attempts} attempt(s): {e}")
+                batch_failure = e
+
+            # Index the returned items by every key they can be matched on
+            items_by_key = {}
+            for item in items:
+                for key in PLATFORMS.item_match_keys(item, platform):
+                    items_by_key.setdefault(key, item)
+
+            for url in chunk:
+                match_keys = PLATFORMS.url_match_keys(url, platform)
+                item = next((items_by_key[key] for key in match_keys if key in items_by_key), None)
+                if item is not None:
+                    record = platform.parse_item(item)
+                elif batch_failure is not None and is_transient(batch_failure.error):
+                    # Single runs would hit the same outage; leave it to the re-drive
+                    record_failure(url, batch_failure)
+                    record = None
+                else:
+                    # Anything the batch didn't return (deleted posts, rejected input) goes one by one
+                    print(f"No batch result for {url}, falling back to a single scrape")
+                    record = fetch_record(url, platform)
+
+                SCRAPE_CACHE.resolve(owned.pop(url), record)
+                if record is not None:
+                    use_record(url, record)
+                else:
+                    results[url] = None
+    finally:
+        # Never leave a claimed key unresolved, or other tabs would wait on it forever
+        for url, key in owned.items():
+            SCRAPE_CACHE.resolve(key, None)
+
+    for url, future in waiting:
+        record = future.result()
+        if record is not None:
+            use_record(url, record)
+        else:
+            # The fetching call already retried; its failure is recorded under the same post key
+            results[url] = None
+
+    return results
+
+
+# ----------------------------
+# SCRAPES A LIST OF URLS, BATCHING PER PLATFORM WHEN BATCH_MODE IS ON
+# RETURNS {url: views}
+# ----------------------------
+def hit_apify_many(workbook, urls):
+    if BATCH_MODE == "off":
+        return {url: hit_apify(workbook, url) for url in dict.fromkeys(urls)}
+
+    results = {}
+    urls_by_platform, unsupported = PLATFORMS.group(dict.fromkeys(urls))
+    for url in unsupported:
+        print(f"URL '{url}' does not match {PLATFORMS.labels}. Skipping.")
+        results[url] = 0
+
+    for platform, platform_urls in urls_by_platform.items():
+        results.update(hit_apify_batch(workbook, platform_urls, platform))
+
+    return results
+
+
+# ----------------------------
+# RUNS THE ACTOR FOR A SINGLE URL, RETRYING TRANSIENT FAILURES
+# RETURNS THE PARSED RECORD, OR None (and records the failure) IF IT STILL FAILED
+# ----------------------------
+def fetch_record(url, platform):
+    def fetch():
+        # Retrieve the first (only) item for the URL
+        items = run_actor(platform, [url])
+        if not items:
+            raise PostNotReturned(url)
+        return platform.parse_item(items[0])
+
+    try:
+        return RETRY_POLICY.call(fetch, url)
+    except ScrapeFailed as e:
+        print(f"Error processing url {url} after {e.attempts} attempt(s): {e}")
+        record_failure(url, e)
+        return None
+
+
+# ----------------------------
+# HITS APIFY API FOR A URL (any supported platform), THROUGH SCRAPE_CACHE
+# RETURNS THE NUMBER OF VIEWS, OR None IF THE SCRAPE FAILED
 # CALLS FUNCTION TO LOG FURTHER DATA TO DB
 # ----------------------------
+@RUN_STATS.timed("hit_apify")
 def hit_apify(workbook, url):
 
-    tiktok_regex = r"tiktok"
-    instagram_regex = r"instagram"
+    platform = PLATFORMS.detect(url)
+    if platform is None:
+        print(f"URL '{url}' does not match {PLATFORMS.labels}. Skipping.")
+        return 0
 
-    if re.search(tiktok_regex, url):
-        url_type = "tiktok"
-    elif re.search(instagram_regex, url):
-        url_type = "instagram"
-    else:
-        print(f"URL '{url}' does not match TikTok or Instagram. Skipping.")
-        return 0    
+    record = SCRAPE_CACHE.get_or_fetch(PLATFORMS.canonical_key(url), lambda: fetch_record(url, platform))
+    if record is None:
+        return None
 
-    try:
-        # Prepare the Actor input based on URL type
-        if url_type == "tiktok":  # TikTok  
-            run_input = {
-                "excludePinnedPosts": True,
-                "postURLs": [url],
-                "resultsPerPage": 1,
-                "shouldDownloadCovers": False,
-                "shouldDownloadSlideshowImages": False,
-                "shouldDownloadSubtitles": False,
-                "shouldDownloadVideos": False,
-                "searchSection": "",
-                "maxProfilesPerQuery": 10
-            }
-        elif url_type == "instagram":  # Instagram
-            run_input = {
-                "addParentData": False,
-                "directUrls": [url],
-                "enhanceUserSearchWithFacebookPage": False,
-                "isUserReelFeedURL": False,
-                "isUserTaggedFeedURL": False,
-                "resultsLimit": 1,
-                "resultsType": "details",
-                "searchLimit": 1,
-                "searchType": "hashtag"
-            }
+    log_record(workbook, url, record)
+    return record["view_count"]
 
-        # Choose the correct actor based on URL type
-        if url_type == "tiktok":
-            actor_link = "clockworks/free-tiktok-scraper"
-        elif url_type == "instagram":
-            actor_link = "apify/instagram-scraper"
-
-        # Set keys based on URL type
-        if url_type == "tiktok":
-            view_key = "playCount"
-            timestamp_key = "createTimeISO"
-            comment_key = "commentCount"
-            caption_key = "text"
-        elif url_type == "instagram":
-            view_key = "videoPlayCount"
-            timestamp_key = "timestamp"
-            comment_key = "commentsCount"
-            caption_key = "caption"
-
-        # Run the Actor for the single URL and wait for it to finish
-        run = APIFY_CLIENT.actor(actor_link).call(run_input=run_input)
-
-        # Retrieve and update the view count for the current URL
-        item = next(APIFY_CLIENT.dataset(run["defaultDatasetId"]).iterate_items(), None)
-
-        if item:
-            view_count = item.get(view_key, 0)
-            comment_count = item.get(comment_key, None)
-            
-            # Retrieve the likes count based on platform
-            if url_type == "tiktok":
-                likes_count = item.get("diggCount", 0)
-            elif url_type == "instagram":
-                likes_count = item.get("likesCount", 0)
-
-            # Convert to EST with a consistent format
-            raw_created_at = item.get(timestamp_key, None)
-            created_at = reformat_date_to_est(raw_created_at)
-    
-            caption = item.get(caption_key, None)
-            if caption is not None:
-                caption = caption.replace("\n", " ").replace("\r", " ")
-
-            # Extract the username based on platform
-            if url_type == "tiktok":
-                author_meta = item.get("authorMeta", {})
-                username = author_meta.get("name", None)
-            elif url_type == "instagram":
-                username = item.get("ownerUsername", None)
-
-            parts = workbook.title.split()
-            app = parts[0] if parts else ""
-            associate = parts[-1] if parts else ""
-            insert_time = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
-
-            # Pass the likes_count to the log function
-            log(url, username, associate, app, view_count, comment_count, caption, created_at, insert_time, likes_count)
-
-            return view_count
-        
-        else:
-            return 0
 
+# ----------------------------
+# DECIDES WHICH URLS NEED AN ACTOR RUN THIS TIME
+# RETURNS (urls to scrape, {skipped url: last known views})
+# migrate=False reads the history as is (dry runs must not change the schema)
+# ----------------------------
+def plan_refresh(urls, migrate=True):
+    # Urls already logged earlier in a resumed run keep the views recorded then
+    done = RUN_LEDGER.done_views(urls) if RUN_LEDGER else {}
+    if done:
+        urls = [url for url in urls if url not in done]
+
+    if REFRESH_MODE == "all" or not urls:
+        return urls, done
+
+    try:
+        if migrate:
+            DB_WRITER.ensure_schema()
+        with RUN_STATS.timed("db_refresh_stats", items=len(urls)):
+            stats_by_url = DB_WRITER.db.get_refresh_stats(urls=urls)
     except Exception as e:
-        print(f"Error processing url {url}: {str(e)}")
-        return 0
+        print(f"Error reading refresh history, scraping everything: {e}")
+        return urls, done
+
+    to_scrape, skipped, tiers = plan(REFRESH_POLICY, urls, stats_by_url)
+    if skipped:
+        print(f"Refresh policy skipping {len(skipped)} of {len(urls)} urls ({tiers})")
+    skipped.update(done)
+    return to_scrape, skipped
+
 
 # ----------------------------
-# PROCESSES A SINGLE TAB IN AN ASSOCIATES GOOGLE SHEET
-# WRITES THE UPDATED VIEW FOR EACH URL BACK TO THE TAB
+# READS THE URL AND VIEW COLUMNS OF EVERY TAB IN ONE REQUEST
+# RETURNS {sheet title: (urls_data, last_filled_row)}, EACH ROW IS [url, current views]
+# (views are read unformatted so a failed scrape can write the same value back)
 # ----------------------------
-def process_tab(workbook, sheet):
-    print(f"Beginning to process {sheet} in {workbook.title}")
-    # Determine the last row in column G by getting all values.
-    col_values = sheet.col_values(URL_COL_NUM)
-    last_filled_row = max(START_ROW, len(col_values))
+def read_tabs(workbook, sheets):
+    rows_by_title = SHEETS.batch_get(
+        workbook, sheets, f"{URL_COL_LETTER}{START_ROW}:{VIEW_COL_LETTER}", value_render_option="UNFORMATTED_VALUE"
+    )
+    tab_rows = {}
+    for title, urls_data in rows_by_title.items():
+        # Stop at the last row with a URL; view cells below it are left alone
+        while urls_data and not (urls_data[-1] and urls_data[-1][0]):
+            urls_data.pop()
+        last_filled_row = max(START_ROW, START_ROW + len(urls_data) - 1)
+        tab_rows[title] = (urls_data, last_filled_row)
+    return tab_rows
 
-    # Retrieve all cells in that range in one API call
-    read_range = f"{URL_COL_LETTER}{START_ROW}:{URL_COL_LETTER}{last_filled_row}"
-    urls_data = sheet.get(read_range)
 
-    # # Categorize URLs by platform
-    # tiktok_urls = []
-    # instagram_urls = []
-    # row_numbers = []  # store original row positions for individual processing
-    
-    # for idx, row in enumerate(urls_data):
-    #     if row and row[0]:
-    #         url = row[0]
-    #         row_numbers.append(idx)
-    #         if "tiktok.com" in url.lower():
-    #             tiktok_urls.append(url)
-    #         elif "instagram.com" in url.lower():
-    #             instagram_urls.append(url)
-    #         else:
-    #             # If URL doesn't match TikTok or Instagram, treat it as "other"
-    #             # so that we fall back to individual processing
-    #             tiktok_urls.append(url)  # Force individual processing
-    #             instagram_urls.append(url)  # (by ensuring both lists are non-empty)
-    
-    view_counts = [[""] for _ in urls_data]  # default empty results
+# ----------------------------
+# WRITES THE VIEW COLUMN OF EVERY TAB AND STAMPS THE LAST UPDATE NOTES
+# tab_views: [(sheet, view_counts, last_filled_row)]
+# One values_batch_update for the views, one batch_update for the notes.
+# Raises if the write-back fails after retries.
+# ----------------------------
+def write_tabs(workbook, tab_views):
+    update_time = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
+    note_text = f"Last updated: {update_time}"
+
+    writes, notes = [], []
+    for sheet, view_counts, last_filled_row in tab_views:
+        if view_counts:
+            writes.append((sheet, f"{VIEW_COL_LETTER}{START_ROW}:{VIEW_COL_LETTER}{last_filled_row}", view_counts))
+        # Hover note on the cell above the first view count (H5)
+        notes.append((sheet, NOTE_ROW - 1, VIEW_COL_NUM - 1, note_text))
+
+    SHEETS.batch_write(workbook, writes, notes)
+    for sheet, view_counts, last_filled_row in tab_views:
+        print(f"{sheet} range {VIEW_COL_LETTER}{START_ROW}:{VIEW_COL_LETTER}{last_filled_row} updated with view counts: {view_counts}")
+
 
-    # # Check if all URLs are from a single platform:
-    # if tiktok_urls and not instagram_urls:
-    #     # All URLs are TikTok
-    #     results = hit_apify_batch(workbook, tiktok_urls, "tiktok")
-    #     # Populate view_counts for TikTok URLs in order
-    #     for i, url in enumerate(urls_data):
-    #         if url and url[0] in results:
-    #             view_counts[i] = [results[url[0]]]
-    # elif instagram_urls and not tiktok_urls:
-    #     # All URLs are Instagram
-    #     results = hit_apify_batch(workbook, instagram_urls, "instagram")
-    #     # Populate view_counts for Instagram URLs in order
-    #     for i, url in enumerate(urls_data):
-    #         if url and url[0] in results:
-    #             view_counts[i] = [results[url[0]]]
-    # else:
-
-    # Mixed platforms or non-standard URLs; process individually.
+def view_counts_for_rows(urls_data, results):
+    """
+    Maps {url: views} back onto the rows read from a tab.
+    Rows without a result (failed or not scraped) keep the value already in the sheet.
+    """
+    view_counts = [[""] for _ in urls_data]  # default empty results
     for i, row in enumerate(urls_data):
-        if row and row[0]:
-            count = hit_apify(workbook, row[0])
-            view_counts[i] = [count]
+        if not row or not row[0]:
+            continue
+        views = results.get(row[0])
+        if views is None:
+            views = row[1] if len(row) > 1 else ""
+        view_counts[i] = [views]
+    return view_counts
 
-    # Write all view counts back to column I in one API call
-    update_range = f"{VIEW_COL_LETTER}{START_ROW}:{VIEW_COL_LETTER}{last_filled_row}"
+
+# ----------------------------
+# RECORDS THE ROWS OF A WORKBOOK WHOSE SCRAPE FAILED IN ScrapeDeadLetters
+# ----------------------------
+def record_dead_letters(workbook, tab_results):
+    failed_at = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
+    rows = []
+    for sheet, urls_data, results, _ in tab_results:
+        for i, row in enumerate(urls_data):
+            if not row or not row[0] or row[0] not in results or results[row[0]] is not None:
+                continue
+            failure = scrape_failure(row[0])
+            rows.append((
+                row[0],
+                workbook.title,
+                sheet.title,
+                START_ROW + i,
+                failure.error_class if failure else "Unknown",
+                str(failure) if failure else None,
+                failure.attempts if failure else 0,
+                failed_at
+            ))
+    if not rows:
+        return
 
     try:
-        sheet.update(values=view_counts, range_name=update_range)
+        DB_WRITER.ensure_schema()
+        DB_WRITER.db.add_dead_letters(rows)
+        print(f"Dead-lettered {len(rows)} failed urls for {workbook.title}")
     except Exception as e:
-        print("ERROR writing to sheet: ", e)
+        print(f"Error recording {len(rows)} dead letters for {workbook.title}: {e}")
 
-    print(f"{sheet} range {update_range} updated with view counts: {view_counts}")
 
-    # After processing the tab, update cell H5 with a hover note that shows the last update time
-    update_time = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
-    note_text = f"Last updated: {update_time}"
+# ----------------------------
+# CLOSES DEAD LETTERS FOR URLS THAT HAVE SINCE BEEN LOGGED
+# (call after DB_WRITER.flush so this run's rows are in DailyVideoData)
+# ----------------------------
+def resolve_dead_letters():
     try:
-        sheet.update_note("H5", note_text)
+        resolved = DB_WRITER.db.resolve_dead_letters() if DB_WRITER.db else 0
     except Exception as e:
-        print(f"Error updating note on cell H5 in sheet '{sheet.title}': {e}")
+        print(f"Error resolving dead letters: {e}")
+        return
+    if resolved:
+        print(f"Resolved {resolved} dead letters")
+
+
+def write_tab_results(workbook, tab_results):
+    """
+    tab_results: [(sheet, urls_data, {url: views}, last_filled_row)] for one workbook.
+    """
+    record_dead_letters(workbook, tab_results)
+    write_tabs(workbook, [
+        (sheet, view_counts_for_rows(urls_data, results), last_filled_row)
+        for sheet, urls_data, results, last_filled_row in tab_results
+    ])
+    checkpoint_tabs(workbook, [sheet.title for sheet, _, _, _ in tab_results])
+
+
+# ----------------------------
+# MARKS TABS AS DONE IN THE RUN LEDGER
+# Buffered rows are flushed first so a resumed run never skips a tab whose
+# snapshots were lost with the old worker; if any are still unwritten the
+# tabs stay open and a resumed run scrapes them again
+# ----------------------------
+def checkpoint_tabs(workbook, tab_titles):
+    if RUN_LEDGER is None or not tab_titles:
+        return
+    try:
+        DB_WRITER.flush()
+        if DB_WRITER.pending:
+            print(f"Not checkpointing {len(tab_titles)} tabs of {workbook.title}: "
+                  f"{DB_WRITER.pending} snapshots are not stored yet")
+            return
+        RUN_LEDGER.record_tabs(workbook.title, tab_titles)
+    except Exception as e:
+        print(f"Error checkpointing {len(tab_titles)} tabs of {workbook.title}: {e}")
+
+
+# ----------------------------
+# SCRAPES THE URLS READ FROM A SINGLE TAB
+# RETURNS {url: views}
+# ----------------------------
+@RUN_STATS.timed("process_tab")
+def process_tab(workbook, urls_data):
+    urls = [row[0] for row in urls_data if row and row[0]]
+    to_scrape, results = plan_refresh(urls)
+    results.update(hit_apify_many(workbook, to_scrape))
+    return results
+
+
+# ----------------------------
+# RETURNS THE TABS OF A WORKBOOK THAT SHOULD BE PROCESSED
+# ----------------------------
+def list_tabs(workbook):
+    return [
+        sheet for sheet in SHEETS.worksheets(workbook)
+        if sheet.title.lower() not in SKIP_TABS
+    ]
+
+
+# ----------------------------
+# TABS OF A WORKBOOK STILL TO DO IN THIS RUN (--tab subset, not already written back)
+# ----------------------------
+def run_tabs(workbook):
+    sheets = list_tabs(workbook)
+    if RUN_LEDGER is None:
+        return sheets
+    return [sheet for sheet in sheets if RUN_LEDGER.wants_tab(workbook.title, sheet.title)]
 
 
 # ----------------------------
 # ITERATES OVER ALL TABS IN AN ASSOCIATES GOOGLE SHEET
+# Reads every tab in one request and writes them all back in one request
 # ----------------------------
 def iterate_over_tabs(workbook):
     # Filter out sheets that should be skipped
-    sheets_to_process = [
-        sheet for sheet in workbook.worksheets()
-        if sheet.title.lower() not in SKIP_TABS
-    ]
+    sheets_to_process = list_tabs(workbook)
+    tab_rows = read_tabs(workbook, sheets_to_process)
+    sheets_by_title = {sheet.title: sheet for sheet in sheets_to_process}
+
+    results_by_title = {}
+    if BATCH_MODE == "workbook":
+        # One set of batches per platform across every tab
+        all_urls = [
+            row[0]
+            for urls_data, _ in tab_rows.values()
+            for row in urls_data if row and row[0]
+        ]
+        to_scrape, results = plan_refresh(list(dict.fromkeys(all_urls)))
+        results.update(hit_apify_many(workbook, to_scrape))
+        results_by_title = dict.fromkeys(tab_rows, results)
+    else:
+        # Process each sheet concurrently
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            future_to_title = {
+                executor.submit(process_tab, workbook, urls_data): title
+                for title, (urls_data, _) in tab_rows.items()
+            }
+            for future in as_completed(future_to_title):
+                title = future_to_title[future]
+                try:
+                    results_by_title[title] = future.result()
+                except Exception as e:
+                    print(f"Error processing tab {title}: {e}")
 
-    # Process each sheet concurrently
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        future_to_sheet = {
-            executor.submit(process_tab, workbook, sheet): sheet
-            for sheet in sheets_to_process
-        }
-        for future in as_completed(future_to_sheet):
-            sheet = future_to_sheet[future]
-            try:
-                future.result()
-                print(f"Finished processing tab: {sheet.title}")
-            except Exception as e:
-                print(f"Error processing tab {sheet.title}: {e}")
+    try:
+        write_tab_results(workbook, [
+            (sheets_by_title[title], tab_rows[title][0], results, tab_rows[title][1])
+            for title, results in results_by_title.items()
+        ])
+    except Exception as e:
+        print(f"ERROR: write-back failed for {workbook.title} ({len(results_by_title)} tabs): {e}")
+        raise
+    for title in results_by_title:
+        print(f"Finished processing tab: {title}")
 
 
 # ----------------------------
-# SCRAPE A SPECIFIC ASSOCIATE FOR AN APP
+# OPENS AN ASSOCIATES WORKBOOK FOR AN APP
+# RETURNS None IF IT DOESN'T EXIST
 # ----------------------------
-def run_individual_scrape(name, project, client):
+def open_workbook(name, project, client):
 
     # Try to open the google sheet
     workbook_name = f"{project} - Influencer Management - {name}"
     try:
-        workbook = client.open(workbook_name)
+        workbook = SHEETS.open(client, workbook_name)
     except gspread.exceptions.SpreadsheetNotFound:
         print(f"ERROR: Workbook '{workbook_name}' not found. Skipping.")
-        return
+        return None
 
-    # Make it here => successfully accessed the google sheet3
+    # Make it here => successfully accessed the google sheet
     print(f"Successfully accessed the associate workbook: {workbook.title}")
+    return workbook
+
+
+# ----------------------------
+# SCRAPE A SPECIFIC ASSOCIATE FOR AN APP
+# ----------------------------
+def run_individual_scrape(name, project, client):
+    workbook = open_workbook(name, project, client)
+    if workbook is None:
+        return
 
     iterate_over_tabs(workbook)
 
 
+# ----------------------------
+# SPLITS A TAB'S URLS INTO SCHEDULER UNITS
+# ONE URL PER UNIT, OR PER-PLATFORM CHUNKS OF BATCH_SIZE WHEN BATCHING
+# (the scheduler batches per tab, so "workbook" behaves like "tab" here)
+# ----------------------------
+def chunk_urls(urls):
+    if BATCH_MODE == "off":
+        return [[url] for url in urls]
+
+    urls_by_platform, unsupported = PLATFORMS.group(urls)
+    chunks = [[url] for url in unsupported]
+    for platform_urls in urls_by_platform.values():
+        for start in range(0, len(platform_urls), BATCH_SIZE):
+            chunks.append(platform_urls[start:start + BATCH_SIZE])
+    return chunks
+
+
+# ----------------------------
+# ONE OPENER PER (project, associate) WORKBOOK
+# ----------------------------
+def build_workbook_openers(client):
+    return [
+        (lambda employee=employee, project=project: open_workbook(employee, project, client))
+        for project, employees in PROJECTS.items()
+        for employee in employees
+        if RUN_LEDGER is None or RUN_LEDGER.wants_workbook(project, employee)
+    ]
+
+
+# ----------------------------
+# STARTS (OR RESUMES) THE RUN LEDGER FOR AN ORCHESTRATED RUN
+# ----------------------------
+def start_run(projects=None, associates=None, tabs=None, resume=True):
+    global RUN_LEDGER
+
+    DB_WRITER.ensure_schema()
+    ledger = RunLedger(
+        DB_WRITER.db, projects=projects, associates=associates, tabs=tabs,
+        resume_within_hours=RUN_RESUME_HOURS, worker_id=default_worker_id()
+    )
+    try:
+        ledger.start(resume=resume)
+    except Exception as e:
+        print(f"Error starting run ledger, running without checkpoints: {e}")
+        return None
+
+    RUN_LEDGER = ledger
+    DB_WRITER.run_id = ledger.run_id
+    return ledger
+
+
+def finish_run():
+    DB_WRITER.flush()
+    resolve_dead_letters()
+    if RUN_LEDGER is not None:
+        try:
+            RUN_LEDGER.finish(RUN_STATS.summary())
+        except Exception as e:
+            print(f"Error marking run {RUN_LEDGER.run_id} finished: {e}")
+
+
+def build_scheduler():
+    return ScrapeScheduler(
+        list_tabs=run_tabs,
+        read_tabs=read_tabs,
+        plan=plan_refresh,
+        chunk_urls=chunk_urls,
+        scrape=hit_apify_many,
+        write_tabs=write_tab_results,
+        sheets_concurrency=SHEETS_CONCURRENCY,
+        apify_concurrency=APIFY_CONCURRENCY,
+        stats=RUN_STATS
+    )
+
+
 # ----------------------------
 # START HERE
 # ----------------------------
-def orchestrate_all_scraping():
+def orchestrate_all_scraping(projects=None, associates=None, tabs=None, resume=True):
 
-    client = gspread.authorize(credentials)
+    client = get_sheets_client()
+
+    # Apply pending schema migrations before any rows are written, then pick up
+    # an unfinished run of the same scope if the worker was restarted
+    start_run(projects, associates, tabs, resume)
+
+    # Everything after opening the workbooks is scheduled globally
+    scheduler = build_scheduler()
+    scheduler.run(build_workbook_openers(client))
+    SCRAPE_CACHE.report()
+    print(f"Sheets API: {SHEETS.counters}")
+    finish_run()
+
+
+# ----------------------------
+# START HERE (asyncio mode, see async_pipeline.py)
+# ----------------------------
+def orchestrate_all_scraping_async(projects=None, associates=None, tabs=None, resume=True):
+    from async_pipeline import AsyncScrapeRun
+
+    client = get_sheets_client()
+    start_run(projects, associates, tabs, resume)
+
+    async def run():
+        scrape_run = AsyncScrapeRun(
+            sys.modules[__name__],
+            APIFY_API_KEY,
+            apify_concurrency=APIFY_CONCURRENCY,
+            sheets_concurrency=SHEETS_CONCURRENCY,
+            stats=RUN_STATS
+        )
+        await scrape_run.run(build_workbook_openers(client))
+
+    asyncio.run(run())
+    SCRAPE_CACHE.report()
+    print(f"Sheets API: {SHEETS.counters}")
+    finish_run()
 
-    # Iterate through each project, associates dictionary
-    for project, employees in PROJECTS.items():
 
-        # Iterate over each associate within a specific project
+# ----------------------------
+# START HERE (one of several workers sharing a run, see work_queue.py)
+# Workbooks are claimed from ScrapeWorkItems one at a time; each is run through
+# the same scheduler as a single-process run
+# ----------------------------
+def run_worker(projects=None, associates=None, tabs=None, resume=True):
+    client = get_sheets_client()
+    ledger = start_run(projects, associates, tabs, resume)
+    if ledger is None:
+        print("ERROR: worker mode needs the ScrapeRuns tables; is the database reachable?")
+        return
+
+    queue = WorkQueue(
+        DB_WRITER.db, ledger.run_id, worker_id=ledger.worker_id,
+        lease_seconds=WORK_LEASE_SECONDS, max_attempts=WORK_MAX_ATTEMPTS, poll_seconds=WORK_POLL_SECONDS
+    )
+    queue.enqueue([
+        (project, employee)
+        for project, employees in PROJECTS.items()
+        for employee in employees
+        if ledger.wants_workbook(project, employee)
+    ])
+
+    scheduler = build_scheduler()
+
+    def stage_errors():
+        # Only the scheduler's own stages; a Sheets request that succeeded on retry still logs an error
+        snapshot = scheduler.stats.snapshot()
+        return sum(snapshot[stage]["errors"] for stage in ScrapeScheduler.STAGES if stage in snapshot)
+
+    def process(project, associate):
+        # Pick up tabs/urls another worker finished before its lease lapsed
+        ledger.refresh()
+        errors_before, failed_writes_before = stage_errors(), len(scheduler.failed_writes)
+
+        workbook = open_workbook(associate, project, client)
+        if workbook is None:
+            return
+        scheduler.run([lambda: workbook], report=False)
+
+        # The item is only done once its snapshots are stored
+        DB_WRITER.flush()
+        if DB_WRITER.pending:
+            raise RuntimeError(f"{DB_WRITER.pending} snapshots of {workbook.title} could not be stored")
+        if len(scheduler.failed_writes) > failed_writes_before or stage_errors() > errors_before:
+            raise RuntimeError(f"errors while processing {workbook.title}")
+
+    queue.run(process)
+    scheduler.stats.report()
+    report_failed_writes(scheduler.failed_writes)
+    SCRAPE_CACHE.report()
+    print(f"Sheets API: {SHEETS.counters}")
+    finish_run()
+
+
+# ----------------------------
+# LOCAL MULTI-WORKER TESTING: START (OR RESUME) THE RUN, THEN N WORKER PROCESSES
+# ----------------------------
+def spawn_workers(count, projects=None, associates=None, tabs=None, resume=True):
+    # Created here so the workers all join this run rather than racing to start their own
+    start_run(projects, associates, tabs, resume)
+
+    worker_args = [sys.executable, os.path.abspath(__file__), "--worker"]
+    for flag, values in (("--project", projects), ("--associate", associates), ("--tab", tabs)):
+        for value in values or []:
+            worker_args += [flag, value]
+
+    # --concurrency / --pool-size carry over to the workers
+    env = dict(os.environ, APIFY_CONCURRENCY=str(APIFY_CONCURRENCY), DB_POOL_SIZE=str(DatabasePool.maxconn))
+    workers = [subprocess.Popen(worker_args, env=env) for _ in range(count)]
+    print(f"Spawned {count} workers: {[worker.pid for worker in workers]}")
+    return max(worker.wait() for worker in workers)
+
+
+# ----------------------------
+# RE-DRIVE: RE-SCRAPES ONLY THE URLS IN ScrapeDeadLetters
+# Each affected tab is re-read (rows may have moved) and written back; rows that
+# still fail keep their previous value and stay dead-lettered
+# ----------------------------
+def redrive_dead_letters(workbook_title=None):
+    client = get_sheets_client()
+    DB_WRITER.ensure_schema()
+
+    urls_by_tab = {}
+    for letter in DB_WRITER.db.get_dead_letters(workbook_title):
+        urls_by_tab.setdefault(letter["workbook"], {}).setdefault(letter["tab"], set()).add(letter["post_url"])
+    print(f"Re-driving dead letters for {len(urls_by_tab)} workbooks")
+
+    for title, tabs in urls_by_tab.items():
+        try:
+            workbook = SHEETS.open(client, title)
+        except gspread.exceptions.SpreadsheetNotFound:
+            print(f"ERROR: Workbook '{title}' not found. Skipping.")
+            continue
+
+        sheets = [sheet for sheet in list_tabs(workbook) if sheet.title in tabs]
+        tab_rows = read_tabs(workbook, sheets)
+        urls = list(dict.fromkeys(url for tab_urls in tabs.values() for url in tab_urls))
+        results = hit_apify_many(workbook, urls)
+
+        write_tab_results(workbook, [
+            (sheet, tab_rows[sheet.title][0],
+             {url: results.get(url) for url in tabs[sheet.title]}, tab_rows[sheet.title][1])
+            for sheet in sheets if sheet.title in tab_rows
+        ])
+        print(f"Re-drove {len(urls)} urls for {title}")
+
+    DB_WRITER.flush()
+    resolve_dead_letters()
+
+
+# ----------------------------
+# AD-HOC REFRESH OF ONE POST (python run_apify_update.py url <post url>)
+# Logged under --project / --associate, else under the app of every associate already tracking the post.
+# The sheet is left alone; its next run picks the new count up
+# RETURNS THE PARSED RECORD, OR None IF THE SCRAPE FAILED
+# ----------------------------
+def refresh_url(url, project=None, associate=None, dry_run=False):
+    platform = PLATFORMS.detect(url)
+    if platform is None:
+        print(f"URL '{url}' does not match {PLATFORMS.labels}.")
+        return None
+
+    record = fetch_record(url, platform)
+    if record is None:
+        return None
+    print(f"{url}: {record['view_count']} views, {record['comment_count']} comments, "
+          f"{record['likes_count']} likes (@{record['username']})")
+    if dry_run:
+        return record
+
+    targets = [(project, associate)]
+    if project is None or associate is None:
+        try:
+            DB_WRITER.ensure_schema()
+            tracked = DB_WRITER.db.get_latest_metrics([url]).get(url)
+        except Exception as e:
+            print(f"Error looking up {url}: {e}")
+            return record
+        if not tracked:
+            print(f"{url} has not been logged before; pass --project and --associate to log it")
+            return record
+        if associate is not None:
+            tracked = [latest for latest in tracked if latest["marketing_associate"] == associate] or tracked[:1]
+        targets = list(dict.fromkeys(
+            (project or latest["app"], associate or latest["marketing_associate"]) for latest in tracked
+        ))
+
+    for app, associate in targets:
+        log_record_as(app, associate, url, record)
+    DB_WRITER.flush()
+    return record
+
+
+# ----------------------------
+# DRY RUN: READS THE TABS IN SCOPE AND PRINTS HOW MANY URLS A RUN WOULD SCRAPE
+# No actor runs, no sheet writes, no run ledger, no migrations (refresh history is still read)
+# RETURNS THE TOTALS, OR None IF THE DATABASE SCHEMA IS NOT CURRENT
+# ----------------------------
+def dry_run(projects=None, associates=None, tabs=None):
+    if REFRESH_MODE != "all":
+        DB_WRITER.db = DB_WRITER.db or DailyVideoDataDB()
+        try:
+            pending = DB_WRITER.db.pending_migrations()
+        except Exception as e:
+            print(f"Dry run aborted, cannot read the schema version: {e}")
+            return None
+        if pending:
+            print(f"Dry run aborted: migrations {pending} have not been applied; "
+                  f"run `python db_manager.py migrate` first")
+            return None
+
+    client = get_sheets_client()
+    # Only for its scope filters; never started, so nothing is recorded
+    scope = RunLedger(None, projects=projects, associates=associates, tabs=tabs)
+
+    totals = {"workbooks": 0, "tabs": 0, "urls": 0, "to_scrape": 0}
+    for project, employees in PROJECTS.items():
         for employee in employees:
-            run_individual_scrape(employee, project, client)
+            if not scope.wants_workbook(project, employee):
+                continue
+            workbook = open_workbook(employee, project, client)
+            if workbook is None:
+                continue
+
+            sheets = [sheet for sheet in list_tabs(workbook) if scope.wants_tab(workbook.title, sheet.title)]
+            tab_rows = read_tabs(workbook, sheets)
+            urls = list(dict.fromkeys(
+                row[0] for urls_data, _ in tab_rows.values() for row in urls_data if row and row[0]
+            ))
+            to_scrape, _ = plan_refresh(urls, migrate=False)
+            print(f"{workbook.title}: {len(sheets)} tabs, {len(urls)} urls, {len(to_scrape)} to scrape")
+
+            totals["workbooks"] += 1
+            totals["tabs"] += len(sheets)
+            totals["urls"] += len(urls)
+            totals["to_scrape"] += len(to_scrape)
+
+    print(f"Dry run: {totals}")
+    return totals
+
+
+# ----------------------------
+# HEROKU SENDS SIGTERM BEFORE CYCLING A DYNO
+# Flush buffered rows (and with them the run's url checkpoints) before going down;
+# Heroku sends SIGKILL 30 seconds after SIGTERM
+# ----------------------------
+SIGTERM_FLUSH_TIMEOUT = int(os.environ.get("SIGTERM_FLUSH_TIMEOUT", "20"))
+
+
+def flush_on_sigterm(signum, frame):
+    print("SIGTERM received, flushing buffered rows before exit")
+    # The handler runs on the main thread, which may itself be inside flush();
+    # waiting on the lock forever would hang until Heroku's SIGKILL
+    DB_WRITER.flush(timeout=SIGTERM_FLUSH_TIMEOUT)
+    os._exit(1)
 
 
 # ----------------------------
 # MAIN, kickoff
+# python run_apify_update.py [all] [--mode threaded|async]
+# python run_apify_update.py workbook <project> <associate>
+# python run_apify_update.py url <post url> [--project Astra --associate Jake]
+# python run_apify_update.py [--project Astra] [--associate Jake] [--tab "<tab>"] [--new-run]
+# python run_apify_update.py --worker | --spawn N   (same subset flags)
+# python run_apify_update.py --redrive [--workbook "<workbook title>"]
+# Any of them: [--concurrency N] [--pool-size N] [--dry-run]
 # ----------------------------
-orchestrate_all_scraping()
\ No newline at end of file
+def main(argv=None):
+    global APIFY_CONCURRENCY
+
+    parser = argparse.ArgumentParser(description="Scrape every influencer workbook and update view counts")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["all", "workbook", "url"],
+        default="all",
+        help="all: every workbook (default); workbook <project> <associate>; url <post url>: scrape and log one post"
+    )
+    parser.add_argument("target", nargs="*", help="workbook: <project> <associate>; url: <post url>")
+    parser.add_argument(
+        "--mode",
+        choices=["threaded", "async"],
+        default=os.environ.get("SCRAPE_MODE", "threaded"),
+        help="threaded: ScrapeScheduler thread pools; async: ApifyClientAsync under a semaphore"
+    )
+    parser.add_argument("--redrive", action="store_true", help="re-scrape only the urls in ScrapeDeadLetters")
+    parser.add_argument("--workbook", help="--redrive: only this workbook title")
+    parser.add_argument("--project", action="append", help="only these projects (repeatable)")
+    parser.add_argument("--associate", action="append", help="only these associates (repeatable)")
+    parser.add_argument("--tab", action="append", help="only tabs with these titles (repeatable)")
+    parser.add_argument("--new-run", action="store_true", help="start a new run instead of resuming an unfinished one")
+    parser.add_argument("--worker", action="store_true", help="claim workbooks of the run from the shared work queue")
+    parser.add_argument("--spawn", type=int, metavar="N", help="start the run, then N local --worker processes")
+    parser.add_argument("--concurrency", type=int, metavar="N",
+                        help=f"concurrent Apify calls (APIFY_CONCURRENCY, now {APIFY_CONCURRENCY})")
+    parser.add_argument("--pool-size", type=int, metavar="N",
+                        help=f"max database connections (DB_POOL_SIZE, now {DatabasePool.maxconn})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="url: scrape without logging; otherwise read the tabs and report what would be scraped")
+    args = parser.parse_args(argv)
+
+    if args.command == "workbook":
+        if len(args.target) != 2:
+            parser.error("workbook takes <project> <associate>")
+        args.project, args.associate = [args.target[0]], [args.target[1]]
+    elif args.command == "url" and len(args.target) != 1:
+        parser.error("url takes one <post url>")
+    elif args.command == "all" and args.target:
+        parser.error(f"unexpected arguments: {' '.join(args.target)}")
+    if args.dry_run and (args.redrive or args.worker or args.spawn):
+        parser.error("--dry-run only applies to all, workbook and url")
+
+    unknown = {project.lower() for project in args.project or []} - {project.lower() for project in PROJECTS}
+    if unknown and args.command != "url":
+        parser.error(f"unknown project(s): {', '.join(sorted(unknown))}")
+
+    if args.concurrency:
+        APIFY_CONCURRENCY = args.concurrency
+    if args.pool_size:
+        DatabasePool.configure(maxconn=args.pool_size)
+
+    signal.signal(signal.SIGTERM, flush_on_sigterm)
+
+    if args.command == "url":
+        record = refresh_url(
+            args.target[0],
+            project=(args.project or [None])[0],
+            associate=(args.associate or [None])[0],
+            dry_run=args.dry_run
+        )
+        return 0 if record is not None else 1
+
+    scope = dict(projects=args.project, associates=args.associate, tabs=args.tab, resume=not args.new_run)
+    if args.dry_run:
+        if dry_run(args.project, args.associate, args.tab) is None:
+            return 1
+    elif args.redrive:
+        redrive_dead_letters(args.workbook)
+    elif args.spawn:
+        return spawn_workers(args.spawn, **scope)
+    elif args.worker:
+        run_worker(**scope)
+    elif args.mode == "async":
+        orchestrate_all_scraping_async(**scope)
+    else:
+        orchestrate_all_scraping(**scope)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
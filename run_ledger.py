@@ -0,0 +1,104 @@
+"""
+Checkpointed scrape runs
+
+Each run of run_apify_update gets a row in ScrapeRuns and a progress ledger:
+  ScrapeRunUrls  urls logged during the run with their view count, written in
+                 the same transaction as the DailyVideoData rows (see
+                 DailyVideoDataWriter.run_id), so a url is only "done" once its
+                 snapshot is stored
+  ScrapeRunTabs  tabs whose view column has been written back
+
+A worker restarted mid-run (Heroku cycles dynos daily) picks up the unfinished
+run with the same scope: finished tabs are skipped and urls already logged get
+their recorded view count instead of another actor run.
+
+The scope is the --project / --associate / --tab subset of the run; a subset
+run only resumes a run over the same subset.
+"""
+
+import json
+from threading import Lock
+
+
+def _lower_set(values):
+    return {value.lower() for value in values} if values else None
+
+
+class RunLedger:
+    def __init__(self, db, projects=None, associates=None, tabs=None, resume_within_hours=20, worker_id=None):
+        self.db = db
+        self.worker_id = worker_id
+        self.projects = _lower_set(projects)
+        self.associates = _lower_set(associates)
+        self.tabs = _lower_set(tabs)
+        self.resume_within_hours = resume_within_hours
+        self.run_id = None
+        self.resumed = False
+        self._lock = Lock()
+        self._done_tabs = set()   # (workbook title, tab title)
+        self._url_views = {}      # post_url -> view_count
+
+    @property
+    def scope(self):
+        """Stable text key for the subset this run covers."""
+        return json.dumps({
+            "projects": sorted(self.projects or []),
+            "associates": sorted(self.associates or []),
+            "tabs": sorted(self.tabs or [])
+        }, sort_keys=True)
+
+    def start(self, resume=True):
+        self.run_id, self.resumed = self.db.start_run(
+            self.scope, self.resume_within_hours if resume else 0
+        )
+        if self.resumed:
+            self.refresh()
+            print(f"Resuming scrape run {self.run_id}: {len(self._done_tabs)} tabs and "
+                  f"{len(self._url_views)} urls already done")
+        else:
+            print(f"Starting scrape run {self.run_id} ({self.scope})")
+        return self.run_id
+
+    def refresh(self):
+        """Reload progress, e.g. written by other workers of the same run."""
+        done_tabs, url_views = self.db.get_run_progress(self.run_id)
+        with self._lock:
+            self._done_tabs, self._url_views = done_tabs, url_views
+
+    # ----------------------------
+    # SCOPE
+    # ----------------------------
+    def wants_workbook(self, project, associate):
+        return (
+            (self.projects is None or project.lower() in self.projects)
+            and (self.associates is None or associate.lower() in self.associates)
+        )
+
+    def wants_tab(self, workbook_title, tab_title):
+        if self.tabs is not None and tab_title.lower() not in self.tabs:
+            return False
+        with self._lock:
+            return (workbook_title, tab_title) not in self._done_tabs
+
+    # ----------------------------
+    # PROGRESS
+    # ----------------------------
+    def done_views(self, urls):
+        """
+        {url: view_count} for the urls logged before this run was resumed.
+        (Within one process SCRAPE_CACHE already stops repeats.)
+        """
+        with self._lock:
+            return {url: self._url_views[url] for url in urls if url in self._url_views}
+
+    def record_tabs(self, workbook_title, tab_titles):
+        self.db.record_run_tabs(self.run_id, workbook_title, tab_titles)
+        with self._lock:
+            self._done_tabs.update((workbook_title, title) for title in tab_titles)
+
+    def finish(self, summary=None):
+        """Mark the run finished and store this process's instrumentation summary under its worker id."""
+        self.db.finish_run(
+            self.run_id, self.worker_id, json.dumps(summary, sort_keys=True) if summary is not None else None
+        )
+        print(f"Finished scrape run {self.run_id}")
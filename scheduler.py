@@ -0,0 +1,328 @@
+"""
+Global scrape scheduler
+
+Feeds every (workbook, tab, url) unit of a run through one pair of bounded
+worker pools: one for Google Sheets calls and one for Apify calls, so the
+run is limited by those two concurrency allowances instead of by the shape
+of any single workbook.
+
+    open workbook -> list tabs -> read tabs        (sheets pool)
+    scrape url chunk                               (apify pool)
+    write tabs once every tab's chunks are done    (sheets pool)
+
+Reads and writes are per workbook (one batched request each) to keep the
+run inside the Sheets quota. A failed write-back is counted as an error on
+the write_tabs stage and listed in failed_writes rather than dropped.
+"""
+
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ContextDecorator
+from threading import Condition, Lock
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class _Timer(ContextDecorator):
+    """with stats.timed("stage"): ... / @stats.timed("stage") -- records duration and errors."""
+
+    def __init__(self, stats, stage, items):
+        self.stats = stats
+        self.stage = stage
+        self.items = items
+
+    def _recreate_cm(self):
+        # Used as a decorator the timer is entered from many threads at once
+        return _Timer(self.stats, self.stage, self.items)
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.record(self.stage, time.monotonic() - self._start, items=self.items, error=exc_type is not None)
+        return False
+
+
+class StageStats:
+    """
+    Thread-safe per-stage call counts, item counts, errors and latencies,
+    plus wall clock per workbook. summary() is the JSON persisted with the run.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stages = {}
+        self._durations = {}   # stage -> [seconds per call]
+        self._workbooks = {}   # workbook title -> seconds from open to write-back
+        self.started_at = time.monotonic()
+
+    def record(self, stage, seconds, items=1, error=False):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"calls": 0, "items": 0, "errors": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["items"] += items
+            stats["seconds"] += seconds
+            if error:
+                stats["errors"] += 1
+            self._durations.setdefault(stage, []).append(seconds)
+
+    def timed(self, stage, items=1):
+        return _Timer(self, stage, items)
+
+    def record_workbook(self, title, seconds):
+        with self._lock:
+            self._workbooks[title] = self._workbooks.get(title, 0.0) + seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: dict(stats) for stage, stats in self._stages.items()}
+
+    def summary(self):
+        """Run summary: wall clock, per-stage counts / error rate / p50 / p95 / max, per-workbook wall clock."""
+        with self._lock:
+            stages = {}
+            for stage, stats in self._stages.items():
+                durations = sorted(self._durations.get(stage, []))
+                stages[stage] = {
+                    "calls": stats["calls"],
+                    "items": stats["items"],
+                    "errors": stats["errors"],
+                    "error_rate": round(stats["errors"] / stats["calls"], 4) if stats["calls"] else 0.0,
+                    "total_seconds": round(stats["seconds"], 3),
+                    "p50": round(percentile(durations, 0.50), 3),
+                    "p95": round(percentile(durations, 0.95), 3),
+                    "max": round(durations[-1], 3) if durations else 0.0
+                }
+            workbooks = {title: round(seconds, 3) for title, seconds in self._workbooks.items()}
+        return {
+            "wall_clock_seconds": round(time.monotonic() - self.started_at, 3),
+            "stages": stages,
+            "workbooks": workbooks
+        }
+
+    def report(self):
+        """Print per-stage throughput and latencies over the wall clock of the run, then the JSON summary."""
+        summary = self.summary()
+        wall_clock = max(summary["wall_clock_seconds"], 1e-9)
+        print("========== RUN THROUGHPUT ==========")
+        print(f"Wall clock: {wall_clock:.1f}s")
+        for stage, stats in summary["stages"].items():
+            print(
+                f"{stage:<26} calls={stats['calls']:<6} items={stats['items']:<6} "
+                f"errors={stats['errors']:<4} p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s "
+                f"max={stats['max']:.2f}s throughput={stats['items'] / wall_clock:.2f} items/s"
+            )
+        for title, seconds in sorted(summary["workbooks"].items(), key=lambda item: -item[1]):
+            print(f"{title:<50} {seconds:.1f}s")
+        print("====================================")
+        print("RUN SUMMARY " + json.dumps(summary, sort_keys=True))
+        return summary
+
+
+def report_failed_writes(failed_writes):
+    """Print the workbooks whose sheet write-back failed so they aren't silently stale."""
+    if not failed_writes:
+        return
+    print("========== FAILED WRITE-BACKS ==========")
+    for workbook_title, tab_titles, error in failed_writes:
+        print(f"{workbook_title}: {', '.join(tab_titles)} ({error})")
+    print("========================================")
+
+
+class _WorkbookJob:
+    """Counts down the tabs of a workbook until every one has its results."""
+
+    def __init__(self, workbook, pending, started_at):
+        self.workbook = workbook
+        self.pending = pending
+        self.started_at = started_at
+        self.tabs = []
+        self.lock = Lock()
+
+    def tab_done(self, tab):
+        """Returns True once the last tab is in."""
+        with self.lock:
+            self.tabs.append(tab)
+            self.pending -= 1
+            return self.pending == 0
+
+
+class _TabJob:
+    """Collects scrape results for one tab until every chunk has reported back."""
+
+    def __init__(self, workbook_job, sheet, urls_data, last_filled_row, pending):
+        self.workbook_job = workbook_job
+        self.workbook = workbook_job.workbook
+        self.sheet = sheet
+        self.urls_data = urls_data
+        self.last_filled_row = last_filled_row
+        self.pending = pending
+        self.results = {}
+        self.lock = Lock()
+
+    def add_results(self, results):
+        """Merge a chunk's results; returns True once the last chunk is in."""
+        with self.lock:
+            self.results.update(results)
+            self.pending -= 1
+            return self.pending == 0
+
+
+class ScrapeScheduler:
+    """
+    Runs a whole scrape as one work queue.
+
+    The scheduler is agnostic of gspread/Apify; it is wired up with callables:
+      list_tabs(workbook)                    -> [sheet]
+      read_tabs(workbook, sheets)            -> {sheet title: (urls_data, last_filled_row)}
+      plan(urls)                             -> (urls to scrape, {skipped url: views})
+      chunk_urls(urls)                       -> [[url]]   (one unit per list)
+      scrape(workbook, urls)                 -> {url: views}
+      write_tabs(workbook, [(sheet, urls_data, results, last_filled_row)])
+    """
+
+    STAGES = ("open_workbook", "read_tabs", "scrape", "write_tabs")
+
+    def __init__(self, list_tabs, read_tabs, chunk_urls, scrape, write_tabs,
+                 sheets_concurrency=4, apify_concurrency=25, stats=None, plan=None):
+        self.list_tabs = list_tabs
+        self.read_tabs = read_tabs
+        self.plan = plan or (lambda urls: (urls, {}))
+        self.chunk_urls = chunk_urls
+        self.scrape = scrape
+        self.write_tabs = write_tabs
+        self.sheets_concurrency = sheets_concurrency
+        self.apify_concurrency = apify_concurrency
+        self.stats = stats or StageStats()
+        self.failed_writes = []   # (workbook title, [tab titles], error)
+
+        self._outstanding = 0
+        self._done = Condition()
+        self._sheets_pool = None
+        self._apify_pool = None
+
+    # ----------------------------
+    # TASK BOOKKEEPING
+    # ----------------------------
+    def _submit(self, pool, stage, fn, *args):
+        with self._done:
+            self._outstanding += 1
+        pool.submit(self._run_task, stage, fn, *args)
+
+    def _run_task(self, stage, fn, *args):
+        start = time.monotonic()
+        error = False
+        items = 0
+        try:
+            handled = fn(*args)
+            items = 1 if handled is None else handled
+        except Exception as e:
+            error = True
+            print(f"Error in {stage} stage: {e}")
+        finally:
+            self.stats.record(stage, time.monotonic() - start, items=items, error=error)
+            with self._done:
+                self._outstanding -= 1
+                if self._outstanding == 0:
+                    self._done.notify_all()
+
+    # ----------------------------
+    # STAGES (each returns the number of items it handled)
+    # ----------------------------
+    def _open_workbook(self, open_fn):
+        started_at = time.monotonic()
+        workbook = open_fn()
+        if workbook is None:
+            return 0
+        sheets = self.list_tabs(workbook)
+        if sheets:
+            self._submit(self._sheets_pool, "read_tabs", self._read_tabs, workbook, sheets, started_at)
+        return 1
+
+    def _read_tabs(self, workbook, sheets, started_at):
+        tab_rows = self.read_tabs(workbook, sheets)
+        sheets = [sheet for sheet in sheets if sheet.title in tab_rows]
+        workbook_job = _WorkbookJob(workbook, pending=len(sheets), started_at=started_at)
+
+        for sheet in sheets:
+            urls_data, last_filled_row = tab_rows[sheet.title]
+            urls = list(dict.fromkeys(row[0] for row in urls_data if row and row[0]))
+            to_scrape, skipped = self.plan(urls)
+            chunks = self.chunk_urls(to_scrape)
+
+            job = _TabJob(workbook_job, sheet, urls_data, last_filled_row, pending=len(chunks))
+            job.results.update(skipped)
+            if skipped:
+                self.stats.record("skipped", 0, items=len(skipped))
+            if not chunks:
+                self._tab_done(job)
+            for chunk in chunks:
+                self._submit(self._apify_pool, "scrape", self._scrape, job, chunk)
+        return len(sheets)
+
+    def _scrape(self, job, urls):
+        try:
+            results = self.scrape(job.workbook, urls)
+        except Exception as e:
+            print(f"Error scraping {len(urls)} urls for {job.sheet.title}: {e}")
+            results = {}
+        if job.add_results(results):
+            self._tab_done(job)
+        return len(urls)
+
+    def _tab_done(self, job):
+        if job.workbook_job.tab_done(job):
+            self._submit(self._sheets_pool, "write_tabs", self._write_tabs, job.workbook_job)
+
+    def _write_tabs(self, workbook_job):
+        tabs = workbook_job.tabs
+        try:
+            self.write_tabs(workbook_job.workbook, [
+                (job.sheet, job.urls_data, job.results, job.last_filled_row) for job in tabs
+            ])
+        except Exception as e:
+            titles = [job.sheet.title for job in tabs]
+            with self._done:
+                self.failed_writes.append((workbook_job.workbook.title, titles, e))
+            print(f"ERROR: write-back failed for {workbook_job.workbook.title} tabs {titles}: {e}")
+            raise
+        finally:
+            self.stats.record_workbook(workbook_job.workbook.title, time.monotonic() - workbook_job.started_at)
+        for job in tabs:
+            print(f"Finished processing tab: {job.sheet.title}")
+        return len(tabs)
+
+    # ----------------------------
+    # ENTRY POINT
+    # ----------------------------
+    def run(self, workbook_openers, report=True):
+        """
+        workbook_openers: zero-argument callables that each return a workbook (or None to skip).
+        Blocks until every unit has been scraped and written back.
+        May be called repeatedly (e.g. once per work item); stats and failed_writes accumulate.
+        """
+        with ThreadPoolExecutor(max_workers=self.sheets_concurrency) as sheets_pool, \
+                ThreadPoolExecutor(max_workers=self.apify_concurrency) as apify_pool:
+            self._sheets_pool = sheets_pool
+            self._apify_pool = apify_pool
+
+            for open_fn in workbook_openers:
+                self._submit(sheets_pool, "open_workbook", self._open_workbook, open_fn)
+
+            with self._done:
+                while self._outstanding > 0:
+                    self._done.wait()
+
+        if report:
+            self.stats.report()
+            report_failed_writes(self.failed_writes)
+        return self.stats
@@ -0,0 +1,127 @@
+"""
+Result cache in front of the Apify actor calls
+
+Keyed by a canonical post key (see platforms.PlatformRegistry.canonical_key), so the
+same post found in several workbooks/tabs is only scraped once per TTL:
+  - in-memory entries expire after ttl seconds
+  - concurrent lookups of a key that is already being fetched wait for that
+    fetch instead of starting their own (in-flight coalescing)
+  - optionally backed by a SQLite file so a restarted worker within the TTL
+    doesn't re-scrape
+
+Failed fetches (None) are never cached.
+"""
+
+import json
+import sqlite3
+import time
+from concurrent.futures import Future
+from threading import Lock
+
+
+class ScrapeCache:
+    def __init__(self, ttl=6 * 3600, sqlite_path=None):
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries = {}    # key -> (fetched_at, record)
+        self._inflight = {}   # key -> Future
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+
+        self._db = None
+        self._db_lock = Lock()
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS scrape_cache (key TEXT PRIMARY KEY, record TEXT, fetched_at REAL)"
+            )
+            self._db.commit()
+
+    # ----------------------------
+    # STORAGE
+    # ----------------------------
+    def _fresh(self, fetched_at):
+        return time.time() - fetched_at < self.ttl
+
+    def _load(self, key):
+        """Memory first, then disk. Caller holds self._lock."""
+        entry = self._entries.get(key)
+        if entry and self._fresh(entry[0]):
+            self.counters["hits"] += 1
+            return entry[1]
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT record, fetched_at FROM scrape_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row and self._fresh(row[1]):
+            record = json.loads(row[0])
+            self._entries[key] = (row[1], record)
+            self.counters["disk_hits"] += 1
+            return record
+        return None
+
+    def _store(self, key, record):
+        fetched_at = time.time()
+        with self._lock:
+            self._entries[key] = (fetched_at, record)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO scrape_cache (key, record, fetched_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(record), fetched_at)
+                )
+                self._db.commit()
+
+    # ----------------------------
+    # LOOKUPS
+    # ----------------------------
+    def claim(self, key):
+        """
+        Returns (record, future, owner):
+          record set         -> cache hit, nothing else to do
+          owner True         -> caller must fetch and then call resolve(key, record)
+          owner False        -> another caller is fetching; wait on future.result()
+        """
+        with self._lock:
+            record = self._load(key)
+            if record is not None:
+                return record, None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                return None, future, False
+            future = Future()
+            self._inflight[key] = future
+            self.counters["misses"] += 1
+            return None, future, True
+
+    def resolve(self, key, record):
+        """Publish the result of a claimed fetch (None for a failure) and wake any waiters."""
+        if record is not None:
+            self._store(key, record)
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(record)
+
+    def get_or_fetch(self, key, fetch):
+        """Cached record for key, calling fetch() at most once across concurrent callers."""
+        record, future, owner = self.claim(key)
+        if record is not None:
+            return record
+        if not owner:
+            return future.result()
+
+        record = None
+        try:
+            record = fetch()
+        finally:
+            self.resolve(key, record)
+        return record
+
+    def report(self):
+        print("========== SCRAPE CACHE ==========")
+        for name, count in self.counters.items():
+            print(f"{name:<10} {count}")
+        print("==================================")
@@ -0,0 +1,160 @@
+"""
+Rate-limit-aware Google Sheets access
+
+Every Sheets call the scraper makes goes through SheetsIO.call, which
+  - takes a token from a process-wide token bucket sized to the per-user
+    quota (60 requests/minute by default, we stay a little under it)
+  - retries 429s, 5xx responses and connection errors with exponential
+    backoff plus jitter, and raises once retries are exhausted instead of
+    swallowing the error
+
+On top of that, a workbook's tabs are read with one values_batch_get and
+written back (values + notes) with one values_batch_update + one batch_update.
+"""
+
+import random
+import time
+from threading import Lock
+
+import requests
+from gspread.exceptions import APIError
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allows `rate` calls per `per` seconds with bursts of up to `capacity`."""
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        self.rate = rate
+        self.per = per
+        self.capacity = capacity or rate
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.per / self.rate
+            time.sleep(wait)
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(error):
+    if isinstance(error, APIError):
+        return _status_code(error) in RETRYABLE_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def quote_title(title):
+    """A1 notation sheet name: wrap in single quotes, doubling any inside."""
+    return "'" + title.replace("'", "''") + "'"
+
+
+class SheetsIO:
+    def __init__(self, requests_per_minute=55, burst=10, max_retries=6, base_delay=1.0, max_delay=64.0, stats=None):
+        self.bucket = TokenBucket(requests_per_minute, per=60.0, capacity=burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = Lock()
+        self.counters = {"calls": 0, "retries": 0, "failures": 0}
+        self.stats = stats  # optional scheduler.StageStats; each request is recorded as "sheets_<method>"
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def call(self, fn, *args, **kwargs):
+        """Rate-limited call with exponential backoff on 429 / 5xx / connection errors."""
+        stage = f"sheets_{getattr(fn, '__name__', 'call')}"
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._count("calls")
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+                if self.stats is not None:
+                    self.stats.record(stage, time.monotonic() - start)
+                return result
+            except Exception as e:
+                if self.stats is not None:
+                    self.stats.record(stage, time.monotonic() - start, error=True)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                # Full jitter: a burst of 429s from concurrent tabs shouldn't retry in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                self._count("retries")
+                print(f"Sheets call failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    # ----------------------------
+    # WORKBOOK-LEVEL BATCHED OPERATIONS
+    # ----------------------------
+    def open(self, client, name):
+        return self.call(client.open, name)
+
+    def worksheets(self, workbook):
+        return self.call(workbook.worksheets)
+
+    def batch_get(self, workbook, sheets, column_range, value_render_option="FORMATTED_VALUE"):
+        """
+        Read column_range (e.g. "G6:G") from every sheet in one request.
+        Returns {sheet title: rows}.
+        """
+        if not sheets:
+            return {}
+        ranges = [f"{quote_title(sheet.title)}!{column_range}" for sheet in sheets]
+        response = self.call(workbook.values_batch_get, ranges, params={"valueRenderOption": value_render_option})
+        value_ranges = response.get("valueRanges", [])
+        # valueRanges come back in request order
+        return {
+            sheet.title: value_range.get("values", [])
+            for sheet, value_range in zip(sheets, value_ranges)
+        }
+
+    def batch_write(self, workbook, writes, notes):
+        """
+        writes: [(sheet, a1 range, values)] written with one values_batch_update
+        notes:  [(sheet, row index, column index, text)] (0-based) set with one batch_update
+        """
+        if writes:
+            self.call(workbook.values_batch_update, {
+                "valueInputOption": "RAW",
+                "data": [
+                    {"range": f"{quote_title(sheet.title)}!{a1_range}", "values": values}
+                    for sheet, a1_range, values in writes
+                ]
+            })
+        if notes:
+            self.call(workbook.batch_update, {
+                "requests": [
+                    {
+                        "updateCells": {
+                            "range": {
+                                "sheetId": sheet.id,
+                                "startRowIndex": row,
+                                "endRowIndex": row + 1,
+                                "startColumnIndex": col,
+                                "endColumnIndex": col + 1
+                            },
+                            "rows": [{"values": [{"note": text}]}],
+                            "fields": "note"
+                        }
+                    }
+                    for sheet, row, col, text in notes
+                ]
+            })
@@ -0,0 +1,96 @@
+"""
+Postgres-backed work queue for running one scrape across several workers
+
+    python run_apify_update.py --worker           # one worker (scale the dyno count)
+    python run_apify_update.py --spawn 4          # four local worker processes
+
+Every worker joins the same ScrapeRuns row (see run_ledger.py), enqueues the
+run's (project, associate) workbooks into ScrapeWorkItems (idempotent), then
+claims them one at a time with SELECT ... FOR UPDATE SKIP LOCKED.
+
+A claim is a lease: the worker renews it from a background thread while it
+works, so a crashed or cycled worker's item becomes claimable again once the
+lease runs out. Items that fail are retried up to max_attempts times.
+Workbooks are the unit because Sheets reads and writes are batched per
+workbook (see sheets_io.py).
+"""
+
+import os
+import socket
+import time
+from threading import Event, Thread
+
+
+def default_worker_id():
+    # Heroku sets DYNO (e.g. "worker.2"); locally fall back to host:pid
+    return f"{os.environ.get('DYNO') or socket.gethostname()}:{os.getpid()}"
+
+
+class _LeaseKeeper:
+    """Renews a work item's lease every lease_seconds / 3 until stopped."""
+
+    def __init__(self, queue, item):
+        self.queue = queue
+        self.item = item
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.db.renew_work_item(self.item["id"], self.queue.worker_id, self.queue.lease_seconds):
+                    print(f"WARNING: lost the lease on {self.item['project']} / {self.item['associate']}")
+                    return
+            except Exception as e:
+                print(f"Error renewing lease on work item {self.item['id']}: {e}")
+
+
+class WorkQueue:
+    def __init__(self, db, run_id, worker_id=None, lease_seconds=600, max_attempts=3, poll_seconds=15):
+        self.db = db
+        self.run_id = run_id
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.counters = {"done": 0, "failed": 0}
+
+    def enqueue(self, workbooks):
+        self.db.enqueue_work_items(self.run_id, workbooks)
+
+    def run(self, process):
+        """
+        Claim and process items until the run has none left open.
+        process(project, associate) raises to mark the item failed.
+        While other workers still hold leases, wait for them (or for the leases to expire).
+        """
+        while True:
+            item = self.db.claim_work_item(self.run_id, self.worker_id, self.lease_seconds, self.max_attempts)
+            if item is None:
+                if self.db.count_open_work_items(self.run_id, self.max_attempts) == 0:
+                    break
+                time.sleep(self.poll_seconds)
+                continue
+
+            print(f"[{self.worker_id}] claimed {item['project']} / {item['associate']} (attempt {item['attempts']})")
+            error = None
+            with _LeaseKeeper(self, item):
+                try:
+                    process(item["project"], item["associate"])
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    print(f"[{self.worker_id}] {item['project']} / {item['associate']} failed: {error}")
+
+            self.db.finish_work_item(item["id"], self.worker_id, error, self.max_attempts)
+            self.counters["failed" if error else "done"] += 1
+
+        print(f"[{self.worker_id}] queue drained: {self.counters}")
+        return self.counters